@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Agregação das leituras de sensores em janelas deslizantes, antes do motor.
+
+Regras como `temperatura_ar > 35` disparam com uma única leitura, e um
+sensor ruidoso faz o alerta aparecer e sumir a cada leitura. Aqui cada
+sensor de um campo tem uma janela (por tempo, num buffer circular) com
+mínimo, máximo, média e o tempo acima de cada limite usado pelas regras,
+todos atualizados em O(1) por leitura. O valor declarado como `Condicao`
+é um agregado da janela (a média, por padrão), e o motor só é acionado de
+novo quando esse agregado cruza um limite de alguma regra (muda o conjunto
+de faixas do `INDICE_FAIXAS` que ele satisfaz).
+
+Modelo de tempo: cada leitura vale até a próxima; a janela guarda as
+leituras dos últimos `segundos` (e no máximo `capacidade` delas).
+"""
+
+import time
+from collections import deque, namedtuple
+
+from faixas import INDICE_FAIXAS
+
+ESTATISTICAS = ('media', 'minimo', 'maximo', 'ultimo')
+
+
+class ConfigJanela(namedtuple('ConfigJanela', ['segundos', 'estatistica', 'fracao_minima'])):
+    """
+    Janela de um sensor: duração em segundos, agregado declarado ao motor e
+    fração mínima do tempo da janela que as leituras precisam ter passado do
+    lado novo de cada faixa que muda para o cruzamento valer (0 desliga;
+    acima de 0.5 cria uma faixa de histerese em volta de cada limite).
+    """
+
+    def __new__(cls, segundos=300.0, estatistica='media', fracao_minima=0.0):
+        if estatistica not in ESTATISTICAS:
+            raise ValueError(f"Estatística '{estatistica}' inválida (use {', '.join(ESTATISTICAS)}).")
+        return super().__new__(cls, float(segundos), estatistica, float(fracao_minima))
+
+
+def janelas_do_ambiente(texto):
+    """
+    Converte 'temperatura_ar:600:ultimo:0.7,umidade_ar:900' em
+    {'temperatura_ar': ConfigJanela(600, 'ultimo', 0.7), 'umidade_ar': ConfigJanela(900)}.
+    """
+    janelas = {}
+    for item in filter(None, (parte.strip() for parte in (texto or '').split(','))):
+        sensor, *opcoes = item.split(':')
+        janelas[sensor.strip()] = ConfigJanela(*opcoes)
+    return janelas
+
+
+class JanelaSensor:
+    """
+    Janela deslizante das leituras de um sensor.
+
+    As leituras ficam num buffer circular (posições pela sequência da
+    leitura); mínimo e máximo vêm de filas monotônicas, a média de uma soma
+    corrente, e o tempo acima de cada limite do tempo acumulado por trecho
+    do índice de faixas do campo. Cada leitura entra e sai uma vez só.
+    """
+
+    __slots__ = ('indice', 'segundos', 'capacidade', '_momentos', '_valores', '_trechos',
+                 '_inicio', '_fim', '_soma', '_minimos', '_maximos', '_tempo_por_trecho', '_saidas')
+
+    def __init__(self, indice_campo, segundos=300.0, capacidade=1024):
+        self.indice = indice_campo
+        self.segundos = segundos
+        self.capacidade = capacidade
+        self._momentos = [0.0] * capacidade
+        self._valores = [0.0] * capacidade
+        self._trechos = [0] * capacidade
+        self._inicio = 0  # Sequência da leitura mais antiga
+        self._fim = 0  # Sequência da próxima leitura
+        self._soma = 0.0
+        self._minimos = deque()  # Sequências com valores crescentes
+        self._maximos = deque()  # Sequências com valores decrescentes
+        self._tempo_por_trecho = [0.0] * (2 * len(indice_campo.pontos) + 1)
+        self._saidas = 0
+
+    def __len__(self):
+        return self._fim - self._inicio
+
+    def adicionar(self, momento, valor):
+        """Inclui uma leitura (momentos fora de ordem contam como o último) e descarta as que saíram."""
+        capacidade = self.capacidade
+        if self._fim > self._inicio:
+            momento = max(momento, self._momentos[(self._fim - 1) % capacidade])
+        if self._fim - self._inicio == capacidade:
+            self._remover_mais_antiga()
+        if self._fim > self._inicio:
+            # A leitura anterior valeu até agora
+            anterior = (self._fim - 1) % capacidade
+            self._tempo_por_trecho[self._trechos[anterior]] += momento - self._momentos[anterior]
+
+        sequencia = self._fim
+        posicao = sequencia % capacidade
+        self._momentos[posicao] = momento
+        self._valores[posicao] = valor
+        self._trechos[posicao] = self.indice.trecho(valor)
+        self._fim += 1
+        self._soma += valor
+
+        valores = self._valores
+        while self._minimos and valores[self._minimos[-1] % capacidade] >= valor:
+            self._minimos.pop()
+        self._minimos.append(sequencia)
+        while self._maximos and valores[self._maximos[-1] % capacidade] <= valor:
+            self._maximos.pop()
+        self._maximos.append(sequencia)
+
+        limite = momento - self.segundos
+        while self._fim - self._inicio > 1 and self._momentos[self._inicio % capacidade] < limite:
+            self._remover_mais_antiga()
+
+    def _remover_mais_antiga(self):
+        capacidade = self.capacidade
+        sequencia = self._inicio
+        posicao = sequencia % capacidade
+        if sequencia + 1 < self._fim:
+            duracao = self._momentos[(sequencia + 1) % capacidade] - self._momentos[posicao]
+            self._tempo_por_trecho[self._trechos[posicao]] -= duracao
+        self._soma -= self._valores[posicao]
+        self._inicio += 1
+        if self._minimos[0] == sequencia:
+            self._minimos.popleft()
+        if self._maximos[0] == sequencia:
+            self._maximos.popleft()
+        # Somas correntes acumulam erro de arredondamento: refeitas a cada `capacidade` saídas
+        self._saidas += 1
+        if self._saidas >= capacidade:
+            self._recalcular()
+
+    def _recalcular(self):
+        capacidade = self.capacidade
+        sequencias = range(self._inicio, self._fim)
+        self._soma = sum(self._valores[s % capacidade] for s in sequencias)
+        self._tempo_por_trecho = [0.0] * len(self._tempo_por_trecho)
+        for s in sequencias[:-1]:
+            self._tempo_por_trecho[self._trechos[s % capacidade]] += (
+                self._momentos[(s + 1) % capacidade] - self._momentos[s % capacidade])
+        self._saidas = 0
+
+    @property
+    def minimo(self):
+        return self._valores[self._minimos[0] % self.capacidade] if self._minimos else None
+
+    @property
+    def maximo(self):
+        return self._valores[self._maximos[0] % self.capacidade] if self._maximos else None
+
+    @property
+    def media(self):
+        return self._soma / len(self) if len(self) else None
+
+    @property
+    def ultimo(self):
+        return self._valores[(self._fim - 1) % self.capacidade] if len(self) else None
+
+    def tempo_total(self):
+        """Segundos cobertos pelas leituras da janela (da mais antiga à mais recente)."""
+        if not len(self):
+            return 0.0
+        return self._momentos[(self._fim - 1) % self.capacidade] - self._momentos[self._inicio % self.capacidade]
+
+    def tempo_acima(self, limite):
+        """Segundos na janela com leitura acima de `limite` (um dos limites das regras)."""
+        trecho = self.indice.trecho(limite)
+        if trecho is None or trecho % 2 == 0:
+            raise ValueError(f"{limite} não é um limite das regras deste sensor.")
+        return sum(self._tempo_por_trecho[trecho + 1:])
+
+    def tempo_abaixo(self, limite):
+        """Segundos na janela com leitura abaixo de `limite` (um dos limites das regras)."""
+        trecho = self.indice.trecho(limite)
+        if trecho is None or trecho % 2 == 0:
+            raise ValueError(f"{limite} não é um limite das regras deste sensor.")
+        return sum(self._tempo_por_trecho[:trecho])
+
+    def tempo_na_faixa(self, posicao, dentro=True):
+        """Segundos na janela com leitura dentro (ou fora) da faixa `posicao` do índice do campo."""
+        return sum(tempo for faixas, tempo in zip(self.indice.trechos, self._tempo_por_trecho)
+                   if (posicao in faixas) == dentro)
+
+    def resumo(self):
+        return {
+            'leituras': len(self),
+            'minimo': self.minimo,
+            'maximo': self.maximo,
+            'media': self.media,
+            'segundos': self.tempo_total(),
+            'tempo_acima': {limite: self.tempo_acima(limite) for limite in self.indice.pontos},
+        }
+
+
+class AgregadorCampo:
+    """
+    Janelas dos sensores de um campo e os valores declarados ao motor.
+
+    `registrar` recebe leituras e retorna os fatos `Condicao` a declarar
+    (todos os agregados do campo, para o motor ficar consistente mesmo se o
+    campo tiver sido recriado) ou uma lista vazia quando nenhum agregado
+    cruzou um limite das regras.
+    """
+
+    def __init__(self, janelas=None, padrao=ConfigJanela(), capacidade=1024, indice=INDICE_FAIXAS):
+        self.janelas = janelas or {}
+        self.padrao = padrao
+        self.capacidade = capacidade
+        self.indice = indice
+        self._sensores = {}  # sensor -> JanelaSensor
+        self.declarados = {}  # sensor -> valor declarado ao motor
+
+    def _conferir_sensor(self, sensor):
+        if sensor not in self._sensores and sensor not in self.indice.campos():
+            raise ValueError(f"Sensor '{sensor}' não tem faixas nas regras.")
+
+    def _janela(self, sensor):
+        janela = self._sensores.get(sensor)
+        if janela is None:
+            self._conferir_sensor(sensor)
+            config = self.janelas.get(sensor, self.padrao)
+            janela = self._sensores[sensor] = JanelaSensor(self.indice.campo(sensor), config.segundos,
+                                                           self.capacidade)
+        return janela
+
+    def _cruzou(self, sensor, janela, valor):
+        """O agregado `valor` muda alguma regra em relação ao valor declarado (respeitando a fração mínima)?"""
+        indice_campo = janela.indice
+        declarado = self.declarados.get(sensor)
+        faixas = indice_campo.faixas_de(valor)
+        if declarado is not None and faixas == indice_campo.faixas_de(declarado):
+            return False
+        fracao_minima = self.janelas.get(sensor, self.padrao).fracao_minima
+        if declarado is None or not fracao_minima:
+            return True
+        # Cada faixa que muda (pelos limites inclusivos/exclusivos do Intervalo, como nas regras)
+        # precisa ter passado a fração mínima da janela do lado novo
+        minimo = fracao_minima * janela.tempo_total()
+        for posicao in faixas ^ indice_campo.faixas_de(declarado):
+            tempo = janela.tempo_na_faixa(posicao, dentro=posicao in faixas)
+            if not tempo or tempo < minimo:
+                return False
+        return True
+
+    def registrar(self, leituras, agora=None):
+        """leituras: [{sensor, valor, momento (opcional, segundos)}]."""
+        agora = time.time() if agora is None else agora
+        # Todas as leituras são conferidas antes: um erro não deixa parte das janelas atualizada
+        validas = []
+        for leitura in leituras:
+            sensor = leitura['sensor']
+            valor = float(leitura['valor'])
+            momento = float(leitura.get('momento', agora))
+            self._conferir_sensor(sensor)
+            if valor != valor:
+                continue  # NaN: leitura inválida do sensor
+            validas.append((sensor, momento, valor))
+
+        tocados = {}
+        for sensor, momento, valor in validas:
+            janela = self._janela(sensor)
+            janela.adicionar(momento, valor)
+            tocados[sensor] = janela
+
+        mudou = False
+        for sensor, janela in tocados.items():
+            valor = getattr(janela, self.janelas.get(sensor, self.padrao).estatistica)
+            if self._cruzou(sensor, janela, valor):
+                self.declarados[sensor] = valor
+                mudou = True
+        if not mudou:
+            return []
+        return [{'tipo': 'Condicao', 'dados': {sensor: valor}} for sensor, valor in self.declarados.items()]
+
+    def resumo(self):
+        return {sensor: dict(janela.resumo(), declarado=self.declarados.get(sensor))
+                for sensor, janela in self._sensores.items()}
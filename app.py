@@ -1,28 +1,110 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import datetime
+import atexit
 import json
-from flask import Flask, request, jsonify, render_template
-from motor_diagnostico import MotorDiagnosticoAgricola, Sintoma, Condicao, Diagnostico, Fact
+import os
+import time
+from functools import partial
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
+from motor_diagnostico import (CAMINHO_BASE_REGRAS, INDICE_DEPENDENCIAS, DiagnosticoLote, ResultadosFormatados,
+                               criar_motor, diagnosticar_fatos)
+from pool_motores import PoolMotores, PoolOcupado
+from cache_resultados import CacheResultados, faixas_do_ambiente
+from auditoria import EscritorAuditoria
+from auditoria_colunar import ConsultaAuditoria, DIRETORIO_COLUNAR, interpretar_momento
+from monitoramento_campos import MonitoramentoCampos
+from agregacao_sensores import janelas_do_ambiente
+from metricas import MetricasMotor, MetricasWorkers, RegistroMetricas, somar_estatisticas
 
 # Inicializa o aplicativo Flask
 app = Flask(__name__)
 
-# --- Helper de Formatação ---
-def formatar_texto(texto):
-    """
-    Formata o texto interno do motor para algo legível.
-    Ex: 'deficiencia_de_magnesio_(Mg)' vira 'Deficiencia de magnesio (mg)'
-    """
-    if not texto:
-        return None # Retorna None se o texto for vazio
-    
-    # Primeiro, substitui underscores
-    texto_formatado = texto.replace('_', ' ')
-    
-    # Coloca em maiúscula apenas a primeira letra da string inteira
-    return texto_formatado.capitalize()
+# Métricas expostas em /metrics (formato Prometheus)
+registro_metricas = RegistroMetricas()
+metricas_motor = MetricasMotor(registro_metricas) if os.environ.get('METRICAS_MOTOR', '1') != '0' else None
+latencia_requisicoes = registro_metricas.histograma('http_requisicao_segundos',
+                                                    'Latência das requisições por rota e status.',
+                                                    rotulos=('rota', 'status'))
+
+# Pool de motores já construídos (tamanho configurável por variável de ambiente);
+# com SNAPSHOT_REGRAS os motores saem do snapshot pré-compilado da base de regras.
+# O tamanho limita os diagnósticos simultâneos; além da fila de espera, 503 na hora
+pool_motores = PoolMotores(tamanho=int(os.environ.get('TAMANHO_POOL_MOTORES', 4)),
+                           fabrica=partial(criar_motor, metricas=metricas_motor),
+                           max_espera=int(os.environ.get('MAX_ESPERA_MOTORES', 16)),
+                           tempo_espera=float(os.environ.get('TEMPO_ESPERA_MOTOR', 2.0)))
+
+# Cache de resultados por combinação de fatos (LRU + TTL)
+cache_resultados = CacheResultados(tamanho=int(os.environ.get('TAMANHO_CACHE', 1024)),
+                                   ttl=float(os.environ.get('TTL_CACHE_SEGUNDOS', 300)),
+                                   faixas=faixas_do_ambiente(os.environ.get('FAIXAS_CACHE')))
+
+# Auditoria gravada em segundo plano (fila limitada + thread de escrita)
+auditoria = EscritorAuditoria()
+
+# Consultas sobre a auditoria compactada em colunas (python auditoria_colunar.py compactar)
+consulta_auditoria = ConsultaAuditoria(os.environ.get('DIRETORIO_AUDITORIA_COLUNAR', DIRETORIO_COLUNAR))
+
+# Pool de processos para o diagnóstico em lote (criado sob demanda)
+diagnostico_lote = DiagnosticoLote(processos=int(os.environ.get('PROCESSOS_LOTE', 0)) or None)
+
+# Motores de vida longa por campo, para as leituras contínuas dos sensores
+monitoramento_campos = MonitoramentoCampos(max_campos=int(os.environ.get('MAX_CAMPOS', 1000)),
+                                           tempo_ocioso=float(os.environ.get('TEMPO_OCIOSO_CAMPOS', 900)),
+                                           janelas=janelas_do_ambiente(os.environ.get('JANELAS_SENSORES')))
+
+
+def estatisticas_processo():
+    """Estatísticas deste processo (com vários workers, cada um tem as suas)."""
+    return {'pool_motores': pool_motores.estatisticas(),
+            'cache_resultados': cache_resultados.estatisticas(),
+            'auditoria': auditoria.estatisticas(),
+            'monitoramento_campos': monitoramento_campos.estatisticas()}
+
+
+# Com o servidor.py, cada worker publica as suas métricas em DIRETORIO_METRICAS
+# (o servidor.py cria um diretório temporário) e o /metrics e o /estatisticas somam as de todos
+DIRETORIO_METRICAS = os.environ.get('DIRETORIO_METRICAS')
+metricas_workers = (MetricasWorkers(DIRETORIO_METRICAS, registro_metricas, estatisticas_processo,
+                                    intervalo=float(os.environ.get('INTERVALO_METRICAS', 2.0)))
+                    if DIRETORIO_METRICAS else None)
+
+# Estado dos campos entre reinícios: carregado na partida (cada campo volta na
+# próxima leitura) e gravado na saída. É por processo: use com um worker só.
+ARQUIVO_ESTADO_CAMPOS = os.environ.get('ARQUIVO_ESTADO_CAMPOS')
+
+# O servidor.py define esta variável antes de importar o app: quem atende
+# são os workers, então só eles carregam e gravam o estado (o mestre não)
+AMBIENTE_ESTADO_NOS_WORKERS = 'ESTADO_CAMPOS_NOS_WORKERS'
+
+
+def iniciar_estado_campos():
+    """Carrega o estado dos campos e agenda a gravação na saída deste processo."""
+    if not ARQUIVO_ESTADO_CAMPOS:
+        return
+    if os.path.exists(ARQUIVO_ESTADO_CAMPOS):
+        try:
+            monitoramento_campos.carregar_snapshot(ARQUIVO_ESTADO_CAMPOS)
+        except ValueError as e:
+            print(f"Estado dos campos ignorado: {e}")
+    atexit.register(monitoramento_campos.gravar_snapshot, ARQUIVO_ESTADO_CAMPOS)
+
+
+if not os.environ.get(AMBIENTE_ESTADO_NOS_WORKERS):
+    iniciar_estado_campos()
+
+# --- Medição de latência das requisições ---
+@app.before_request
+def iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def registrar_latencia(resposta):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None and request.url_rule is not None and request.url_rule.rule != '/metrics':
+        latencia_requisicoes.observar(time.perf_counter() - inicio, request.url_rule.rule, str(resposta.status_code))
+    return resposta
 
 # --- Rota 1: Servir a Página Web ---
 @app.route('/')
@@ -30,149 +112,210 @@ def index():
     """Renderiza o nosso frontend (o index.html)"""
     return render_template('index.html')
 
-# REGISTRA AUDITORIA EM TXT (LEITURA GERAL DA AUDITORIA)
-def registro_auditoria_txt(resultado_diagnostico):
-    nome_arquivo = "auditoria_diagnosticos_da_planta.txt"
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d (%d/%m) %H:%M:%S")
-
-    if isinstance(resultado_diagnostico, list) or isinstance(resultado_diagnostico, dict):
-        resultado_formatado_txt = json.dumps(resultado_diagnostico, 
-                                          indent=4, 
-                                          ensure_ascii=False) # Garante acentos
+def responder_resultados(resultados):
+    """
+    A mesma resposta do jsonify, montada com os fragmentos JSON do catálogo
+    e com ETag: quem repete a consulta com If-None-Match recebe 304 (também
+    no POST, já que o diagnóstico não altera nada no servidor).
+    """
+    provedor = app.json
+    if (not isinstance(resultados, ResultadosFormatados)
+            or not (getattr(provedor, 'sort_keys', False) and getattr(provedor, 'ensure_ascii', False))):
+        return jsonify(resultados)  # Serialização diferente da dos fragmentos pré-calculados
+    compacto = getattr(provedor, 'compact', None)
+    corpo, etag = resultados.json(indentado=compacto is False or (compacto is None and app.debug))
+    if etag in request.if_none_match:
+        resposta = app.response_class(status=304)
     else:
-        # Fallback
-        resultado_formatado_txt = str(resultado_diagnostico)
+        resposta = app.response_class(corpo + "\n", mimetype=provedor.mimetype)
+    resposta.set_etag(etag)
+    if resultados.interrupcao:
+        # Resultados parciais: o motor parou pelo orçamento ('ciclos' ou 'tempo')
+        resposta.headers['X-Diagnostico-Interrompido'] = resultados.interrupcao
+    return resposta
+
+# --- Rota 2: A API de Diagnóstico (VERSÃO 100% FORMATADA) ---
+@app.route('/diagnosticar', methods=['POST'])
+def diagnosticar():
+    """
+    Recebe os fatos do frontend, executa o motor 
+    e retorna os resultados como JSON.
+    """
+    fatos_json = request.json
     
-    conteudo = f"""
-    AUDITORIA DE DIAGNÓSTICO
-    =============================== 
-    Data/Hora: {timestamp}
-    Resultado do Diagnóstico:
-    {resultado_formatado_txt}
-    ==================================================
-    """
-   
-   #Cria TXT com arquivo e se já foi criado faz apenas um append com o "a" 
     try:
-        with open(nome_arquivo, "a", encoding="utf-8") as arquivo_auditoria:
-            arquivo_auditoria.write(conteudo + "\n")
-            print(f"Arquivo de Auditoria em TXT criado/atualizado!")
+        # A mesma combinação de fatos já diagnosticada vem direto do cache
+        chave_cache = cache_resultados.chave(fatos_json)
+        resultados_finais = cache_resultados.obter(chave_cache)
+
+        if resultados_finais is None:
+            engine = pool_motores.retirar() # Já vem resetado (estado de _fatos_iniciais)
+            try:
+                # Declara os fatos, executa o motor e formata os resultados
+                resultados_finais = diagnosticar_fatos(engine, fatos_json)
+            finally:
+                # Devolve o motor ao pool (ele é resetado na devolução)
+                pool_motores.devolver(engine)
+            if not resultados_finais.interrupcao: # Resultados parciais não vão para o cache
+                cache_resultados.guardar(chave_cache, resultados_finais)
+        
+        auditoria.registrar(resultados_finais) #Enfileira a auditoria (TXT e JSON) com os resultados finais formatados
+        # Retornar a lista final e formatada (304 se o cliente já tem esta versão)
+        return responder_resultados(resultados_finais)
+
+    except PoolOcupado as e:
+        # Sobrecarga: recusa rápido em vez de deixar a fila (e a latência) crescer
+        return jsonify({"erro": str(e)}), 503, {'Retry-After': '1'}
+
     except Exception as e:
-        print(f"Erro ao escrever no arquivo de auditoria: {e}")
+        # Captura erros e os envia como JSON para o frontend
+        return jsonify({"erro": str(e)}), 400
 
-# ---------------------
-# SEPARAÇÃO DAS FUNÇÕES DE REGISTRO PARA EVITAR CONFUSÃO VISUAL
-# ---------------------
+# --- Rota 3: Diagnóstico em Lote (vários talhões por requisição) ---
+@app.route('/diagnosticar/lote', methods=['POST'])
+def diagnosticar_lote():
+    """
+    Recebe uma lista de talhões no formato
+    [{"talhao": <id>, "fatos": [{tipo, dados}, ...]}, ...]
+    e retorna os resultados formatados indexados pelo id do talhão.
+    """
+    talhoes = request.json
 
-# --- REGISTRO DE AUDITORIA EM JSON (PARA ANÁLISE DE DADOS) ---
-def registro_auditoria_json(resultado_diagnostico):
-    nome_arquivo = "auditoria_sistema_especialista.json"
-    timestamp = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    try:
+        if not isinstance(talhoes, list):
+            raise ValueError("O lote deve ser uma lista de talhões.")
 
-    # Dicionario para a entrada de informações
-    log_entry = {
-        "timestamp": timestamp,
-        "resultados": resultado_diagnostico 
-    }
+        resultados_por_talhao = diagnostico_lote.diagnosticar(talhoes)
 
+        # Uma única entrada de auditoria para o lote inteiro
+        auditoria.registrar(resultados_por_talhao)
+        return jsonify(resultados_por_talhao)
+
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 400
+
+# --- Rota 4: Leituras contínuas por campo (respostas só com o que mudou) ---
+@app.route('/campos/<campo_id>', methods=['POST'])
+def atualizar_campo(campo_id):
+    """
+    Recebe {"fatos": [{tipo, dados}], "remover": [{tipo, campos}]} para um
+    campo e retorna só as conclusões novas e as que deixaram de valer.
+    """
+    atualizacao = request.json or {}
     try:
-        linha_json = json.dumps(log_entry, ensure_ascii=False)
-
-        #Abre arquivo como append
-        with open(nome_arquivo, "a", encoding="utf-8") as arquivo_auditoria:
-            arquivo_auditoria.write(linha_json + "\n")
-            print(f"Arquivo de Auditoria JSON criado/atualizado!")
-            
-            
+        return jsonify(monitoramento_campos.atualizar(campo_id,
+                                                      atualizacao.get('fatos', []),
+                                                      atualizacao.get('remover', [])))
     except Exception as e:
-        print(f"Erro ao escrever no arquivo de auditoria JSONL: {e}")
+        return jsonify({"erro": str(e)}), 400
 
+@app.route('/campos/<campo_id>/leituras', methods=['POST'])
+def leituras_campo(campo_id):
+    """
+    Recebe leituras brutas {"leituras": [{sensor, valor, momento}]}: elas
+    entram nas janelas dos sensores e o motor só roda de novo quando um
+    agregado cruza um limite das regras.
+    """
+    corpo = request.json or {}
+    try:
+        return jsonify(monitoramento_campos.registrar_leituras(campo_id, corpo.get('leituras', [])))
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 400
 
-# --- Rota 2: A API de Diagnóstico (VERSÃO 100% FORMATADA) ---
-@app.route('/diagnosticar', methods=['POST'])
-def diagnosticar():
+@app.route('/campos/<campo_id>', methods=['DELETE'])
+def remover_campo(campo_id):
+    """Descarta o motor de um campo."""
+    return jsonify({'removido': monitoramento_campos.remover_campo(campo_id)})
+
+@app.route('/campos/snapshot', methods=['POST'])
+def gravar_estado_campos():
+    """Grava agora o estado de todos os campos em ARQUIVO_ESTADO_CAMPOS."""
+    if not ARQUIVO_ESTADO_CAMPOS:
+        return jsonify({"erro": "ARQUIVO_ESTADO_CAMPOS não configurado."}), 404
+    return jsonify(monitoramento_campos.gravar_snapshot(ARQUIVO_ESTADO_CAMPOS))
+
+@app.route('/campos/fluxo', methods=['POST'])
+def fluxo_campos():
     """
-    Recebe os fatos do frontend, executa o motor 
-    e retorna os resultados como JSON.
+    Fluxo NDJSON: cada linha do corpo é {"campo", "fatos", "remover"} e cada
+    linha da resposta é o delta de um campo (atualizações sem mudança não geram linha).
+    """
+    def atualizacoes():
+        for linha in request.stream:
+            if linha.strip():
+                yield json.loads(linha)
+
+    def deltas():
+        for delta in monitoramento_campos.fluxo(atualizacoes()):
+            yield json.dumps(delta, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(deltas()), mimetype='application/x-ndjson')
+
+# --- Rota 5: Estatísticas de uso ---
+@app.route('/estatisticas')
+def estatisticas():
+    """
+    Retorna contadores internos (pool de motores, cache, auditoria e campos).
+    Com vários workers, soma os de todos os workers vivos e traz os de cada um em 'workers'.
+    """
+    locais = estatisticas_processo()
+    if metricas_workers is None:
+        return jsonify(locais)
+    por_worker = metricas_workers.estatisticas()
+    return jsonify({**somar_estatisticas(list(por_worker.values()), locais),
+                    'workers': {str(pid): valores for pid, valores in por_worker.items()}})
+
+# --- Rota 6: Métricas (Prometheus) ---
+@app.route('/metrics')
+def metrics():
+    """Métricas do motor (por regra) e latência das requisições em formato texto do Prometheus."""
+    texto = registro_metricas.exportar() if metricas_workers is None else metricas_workers.exportar()
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+# --- Rota 7: Consulta da auditoria compactada ---
+@app.route('/auditoria')
+def consultar_auditoria():
+    """
+    Contagens da auditoria compactada num intervalo de tempo, agrupadas por
+    causa, risco, tipo ou talhão. Parâmetros: inicio/fim (data ISO), agrupar,
+    tipo (Diagnostico/Alerta) e busca (trecho do texto agrupado).
+    Ex: /auditoria?inicio=2026-10-11&fim=2026-10-18&agrupar=risco&busca=geada
     """
-    fatos_json = request.json
-    engine = MotorDiagnosticoAgricola()
-    engine.reset()
-    
     try:
-        # 1. Declarar os fatos no motor
-        for fato_info in fatos_json:
-            tipo_fato = fato_info.get('tipo')
-            dados_fato = fato_info.get('dados', {})
-            
-            if tipo_fato == 'Sintoma':
-                engine.declare(Sintoma(**dados_fato))
-            elif tipo_fato == 'Condicao':
-                engine.declare(Condicao(**dados_fato))
-        
-        # 2. Executar o motor
-        engine.run()
-        
-        # 3. Coletar os resultados (de AMBAS as fontes)
-        causas_ja_adicionadas = set() 
-        resultados_finais = []
-
-        for f in engine.facts.values():
-            
-            # Fonte 1: Pega a lista principal de resultados (de _adicionar_resultado)
-            if 'resultados' in f:
-                for res in f['resultados']:
-                    
-                    # --- APLICA FORMATAÇÃO COMPLETA AQUI ---
-                    res_formatado = {
-                        'tipo': res.get('tipo'),
-                        'causa': formatar_texto(res.get('causa')),
-                        'risco': formatar_texto(res.get('risco')),
-                        'recomendacao': formatar_texto(res.get('recomendacao')),
-                        'recomendacao_controle': formatar_texto(res.get('recomendacao_controle')),
-                        'recomendacao_corretiva': formatar_texto(res.get('recomendacao_corretiva'))
-                    }
-                    # Remove chaves que são None (limpa o JSON)
-                    res_formatado = {k: v for k, v in res_formatado.items() if v is not None}
-                    
-                    resultados_finais.append(res_formatado)
-                    
-                    if res_formatado.get('causa'):
-                        causas_ja_adicionadas.add(res_formatado.get('causa')) 
-            
-            # Fonte 2: Pega os diagnósticos de encadeamento (de self.declare)
-            if isinstance(f, Diagnostico):
-                causa_original = f.get('causa')
-                causa_formatada = formatar_texto(causa_original)
-                
-                # Adiciona só se essa causa ainda não foi adicionada pela Fonte 1
-                if causa_formatada and causa_formatada not in causas_ja_adicionadas:
-                    
-                    # --- APLICA FORMATAÇÃO COMPLETA AQUI TAMBÉM ---
-                    diag_dict = {
-                        'tipo': 'Diagnostico',
-                        'causa': causa_formatada,
-                        'recomendacao': formatar_texto(f.get('recomendacao')),
-                        'recomendacao_controle': formatar_texto(f.get('recomendacao_controle')),
-                        'recomendacao_corretiva': formatar_texto(f.get('recomendacao_corretiva'))
-                    }
-                    # Remove chaves que são None (limpa o JSON)
-                    diag_dict = {k: v for k, v in diag_dict.items() if v is not None}
-
-                    resultados_finais.append(diag_dict)
-                    causas_ja_adicionadas.add(causa_formatada) # Marca como adicionada
-        
-        registro_auditoria_txt(resultado_diagnostico=resultados_finais) #Cria a auditoria com os resultados finais formatados no TXT
-        registro_auditoria_json(resultado_diagnostico=resultados_finais) #Cria a auditoria com os resultados finais formatados em JSON
-        # 5. Retornar a lista final e formatada
-        return jsonify(resultados_finais)
-    
+        inicio = request.args.get('inicio')
+        fim = request.args.get('fim')
+        return jsonify(consulta_auditoria.consultar(
+            inicio=interpretar_momento(inicio) if inicio else None,
+            fim=interpretar_momento(fim) if fim else None,
+            agrupar=request.args.get('agrupar', 'causa'),
+            tipo=request.args.get('tipo'),
+            busca=request.args.get('busca')))
+    except FileNotFoundError as e:
+        return jsonify({"erro": str(e)}), 404
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 400
+
+# --- Rota 8: Próximas perguntas (campos que ainda podem mudar o diagnóstico) ---
+@app.route('/proximas-perguntas', methods=['POST'])
+def proximas_perguntas():
+    """
+    Recebe os fatos já informados ([{tipo, dados}]) e retorna só os campos
+    que ainda podem fazer disparar alguma regra, com os valores/faixas que
+    interessam e as regras afetadas (as que atingem mais regras primeiro).
+    """
+    fatos_json = request.json or []
+
+    try:
+        if not isinstance(fatos_json, list):
+            raise ValueError("Os fatos devem ser uma lista.")
+        perguntas, disparam, possiveis = INDICE_DEPENDENCIAS.proximas_perguntas(fatos_json)
+        return jsonify({"perguntas": perguntas, "regras_disparadas": disparam, "regras_possiveis": possiveis})
     except Exception as e:
-        # Captura erros e os envia como JSON para o frontend
         return jsonify({"erro": str(e)}), 400
 
 # --- Comando para rodar o servidor ---
 if __name__ == '__main__':
 #     Roda o app em modo de debug
-    app.run(debug=True, port=5000)
+    # Recarrega o servidor também quando o arquivo da base de regras muda
+    app.run(debug=True, port=5000, extra_files=[CAMINHO_BASE_REGRAS])
 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Arquivo binário com o estado de vários campos (talhões), lido sob demanda.
+
+Formato:
+    cabeçalho  8 bytes   assinatura b'CAMPOS' + versão do formato (2 bytes)
+               8 bytes   posição do índice (inteiro little-endian)
+    registros  o estado serializado de cada campo, um após o outro
+    índice     pickle de {'identificacao': {...}, 'campos': {campo_id: (posição, tamanho)}}
+
+O arquivo é aberto com mmap: abrir lê só o índice, e o registro de um campo
+só é lido quando ele é pedido. A gravação vai para um arquivo temporário
+que substitui o anterior de uma vez (quem ainda lê o antigo não é afetado).
+"""
+
+import mmap
+import os
+import pickle
+import struct
+
+ASSINATURA = b'CAMPOS\x00\x01'
+_CABECALHO = struct.Struct('<8sQ')
+
+
+def gravar(caminho, registros, identificacao):
+    """
+    Grava os registros {campo_id: bytes} (ou pares) em `caminho`.
+    Retorna o tamanho do arquivo em bytes.
+    """
+    if isinstance(registros, dict):
+        registros = registros.items()
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    indice = {}
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(_CABECALHO.pack(ASSINATURA, 0))
+        for campo_id, dados in registros:
+            indice[campo_id] = (arquivo.tell(), len(dados))
+            arquivo.write(dados)
+        posicao_indice = arquivo.tell()
+        pickle.dump({'identificacao': identificacao, 'campos': indice}, arquivo,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+        tamanho = arquivo.tell()
+        arquivo.seek(0)
+        arquivo.write(_CABECALHO.pack(ASSINATURA, posicao_indice))
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, caminho)
+    return tamanho
+
+
+class ArquivoCampos:
+    """Leitura (mapeada em memória) de um arquivo gravado por `gravar`."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, 'rb') as arquivo:
+            self._mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        assinatura, posicao_indice = _CABECALHO.unpack_from(self._mapa)
+        if assinatura != ASSINATURA:
+            self._mapa.close()
+            raise ValueError(f"{caminho} não é um arquivo de estado de campos (ou é de outra versão).")
+        indice = pickle.loads(self._mapa[posicao_indice:])
+        self.identificacao = indice['identificacao']
+        self._campos = indice['campos']
+
+    def __len__(self):
+        return len(self._campos)
+
+    def __contains__(self, campo_id):
+        return campo_id in self._campos
+
+    def campos(self):
+        return list(self._campos)
+
+    def ler(self, campo_id):
+        """Registro de um campo (uma fatia do mapa, sem cópia)."""
+        posicao, tamanho = self._campos[campo_id]
+        return memoryview(self._mapa)[posicao:posicao + tamanho]
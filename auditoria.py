@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import contextlib
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+ARQUIVO_TXT = "auditoria_diagnosticos_da_planta.txt"
+ARQUIVO_JSON = "auditoria_sistema_especialista.json"
+
+
+# --- Formatação dos registros (mesmo conteúdo de antes) ---
+
+# REGISTRO EM TXT (LEITURA GERAL DA AUDITORIA)
+def formatar_registro_txt(momento, resultado_diagnostico):
+    timestamp = momento.strftime("%Y-%m-%d (%d/%m) %H:%M:%S")
+
+    if isinstance(resultado_diagnostico, list) or isinstance(resultado_diagnostico, dict):
+        resultado_formatado_txt = json.dumps(resultado_diagnostico,
+                                          indent=4,
+                                          ensure_ascii=False) # Garante acentos
+    else:
+        # Fallback
+        resultado_formatado_txt = str(resultado_diagnostico)
+
+    conteudo = f"""
+    AUDITORIA DE DIAGNÓSTICO
+    =============================== 
+    Data/Hora: {timestamp}
+    Resultado do Diagnóstico:
+    {resultado_formatado_txt}
+    ==================================================
+    """
+    return conteudo + "\n"
+
+# REGISTRO EM JSON (PARA ANÁLISE DE DADOS) - uma linha por registro (JSONL)
+def formatar_registro_json(momento, resultado_diagnostico):
+    timestamp = momento.strftime("%d/%m/%Y %H:%M:%S")
+
+    # Dicionario para a entrada de informações
+    log_entry = {
+        "timestamp": timestamp,
+        "resultados": resultado_diagnostico
+    }
+    return json.dumps(log_entry, ensure_ascii=False) + "\n"
+
+
+class ArquivoRotativo:
+    """
+    Arquivo de log com rotação por tamanho e por data. O arquivo atual é
+    renomeado para `<nome>.<AAAA-MM-DD>.<n><ext>` quando passa do tamanho
+    máximo ou quando o dia muda.
+
+    Os workers do servidor.py escrevem no mesmo arquivo: conferir, rotacionar
+    e gravar acontecem sob um `flock` em `<nome>.lock`, e a data do arquivo
+    vem do disco (mtime), não do processo, para que um worker não rotacione
+    o arquivo que outro acabou de abrir.
+    """
+
+    def __init__(self, caminho, tamanho_maximo=10 * 1024 * 1024):
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+        self.caminho_trava = os.path.splitext(caminho)[0] + ".lock"
+
+    def _nome_rotacionado(self, data):
+        base, extensao = os.path.splitext(self.caminho)
+        n = 1
+        while True:
+            candidato = f"{base}.{data.isoformat()}.{n}{extensao}"
+            if not os.path.exists(candidato):
+                return candidato
+            n += 1
+
+    def _rotacionar_se_preciso(self, hoje):
+        try:
+            info = os.stat(self.caminho)
+        except FileNotFoundError:
+            return
+        data_arquivo = datetime.date.fromtimestamp(info.st_mtime)
+        if info.st_size >= self.tamanho_maximo or data_arquivo != hoje:
+            os.replace(self.caminho, self._nome_rotacionado(data_arquivo))
+
+    @contextlib.contextmanager
+    def _travado(self):
+        if fcntl is None:  # Sem fcntl (Windows) o servidor roda num processo só
+            yield
+            return
+        # Aberto a cada escrita: um descritor herdado pelo fork dividiria a trava com o pai
+        with open(self.caminho_trava, "a") as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            yield
+
+    def escrever(self, texto):
+        with self._travado():
+            self._rotacionar_se_preciso(datetime.date.today())
+            with open(self.caminho, "a", encoding="utf-8") as arquivo:
+                arquivo.write(texto)
+
+
+# Item colocado na fila só para acordar a thread de escrita no encerramento
+_ACORDAR = object()
+
+
+class EscritorAuditoria:
+    """
+    Grava a auditoria (TXT e JSONL) fora do caminho da requisição.
+
+    `registrar` só coloca o registro numa fila limitada; uma thread dedicada
+    junta os registros e grava em lote quando o lote enche ou quando passa o
+    intervalo. Se a fila estiver cheia o registro é descartado (e contado),
+    para nunca segurar a resposta. No encerramento do processo a fila é
+    esvaziada e gravada.
+    """
+
+    def __init__(self, arquivo_txt=ARQUIVO_TXT, arquivo_json=ARQUIVO_JSON,
+                 capacidade=10000, tamanho_lote=100, intervalo=1.0,
+                 tamanho_maximo_arquivo=10 * 1024 * 1024):
+        self._arquivo_txt = ArquivoRotativo(arquivo_txt, tamanho_maximo_arquivo)
+        self._arquivo_json = ArquivoRotativo(arquivo_json, tamanho_maximo_arquivo)
+        self._fila = queue.Queue(maxsize=capacidade)
+        self.capacidade = capacidade
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+
+        # Contadores
+        self._lock = threading.Lock()
+        self.descartados = 0
+        self.gravados = 0
+        self.lotes_gravados = 0
+        self.erros = 0
+
+        self._pid = os.getpid()
+        self._lock_fork = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="escritor-auditoria", daemon=True)
+        self._thread.start()
+        atexit.register(self.encerrar)
+
+    def _reiniciar_apos_fork(self):
+        """
+        Num processo criado por fork (workers do servidor.py) a thread de
+        escrita do pai não existe: cria fila, trava e thread próprias.
+        """
+        with self._lock_fork:
+            if self._pid == os.getpid():
+                return  # Outra thread do worker já reiniciou
+            self._fila = queue.Queue(maxsize=self.capacidade)
+            self._lock = threading.Lock()
+            self._parar = threading.Event()
+            self._thread = threading.Thread(target=self._executar, name="escritor-auditoria", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def registrar(self, resultado_diagnostico):
+        """Enfileira um registro de auditoria (não bloqueia)."""
+        if self._pid != os.getpid():
+            self._reiniciar_apos_fork()
+        try:
+            self._fila.put_nowait((datetime.datetime.now(), resultado_diagnostico))
+        except queue.Full:
+            with self._lock:
+                self.descartados += 1
+
+    def _gravar(self, registros):
+        texto_txt = "".join(formatar_registro_txt(momento, resultado) for momento, resultado in registros)
+        texto_json = "".join(formatar_registro_json(momento, resultado) for momento, resultado in registros)
+        try:
+            self._arquivo_txt.escrever(texto_txt)
+            self._arquivo_json.escrever(texto_json)
+        except Exception as e:
+            with self._lock:
+                self.erros += 1
+            print(f"Erro ao escrever nos arquivos de auditoria: {e}")
+            return
+        with self._lock:
+            self.gravados += len(registros)
+            self.lotes_gravados += 1
+
+    def _executar(self):
+        pendentes = []
+        proxima_gravacao = time.monotonic() + self.intervalo
+        while not self._parar.is_set():
+            try:
+                registro = self._fila.get(timeout=max(0.0, proxima_gravacao - time.monotonic()))
+                if registro is not _ACORDAR:
+                    pendentes.append(registro)
+            except queue.Empty:
+                pass
+
+            agora = time.monotonic()
+            if len(pendentes) >= self.tamanho_lote or (pendentes and agora >= proxima_gravacao):
+                self._gravar(pendentes)
+                pendentes = []
+            if agora >= proxima_gravacao:
+                proxima_gravacao = agora + self.intervalo
+
+        # Encerramento: grava o que sobrou na fila
+        while True:
+            try:
+                registro = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if registro is not _ACORDAR:
+                pendentes.append(registro)
+        if pendentes:
+            self._gravar(pendentes)
+
+    def encerrar(self, timeout=10):
+        """Para a thread depois de gravar todos os registros pendentes."""
+        if self._thread.is_alive():
+            self._parar.set()
+            try:
+                # Acorda a thread parada no get da fila (que espera até o fim do intervalo)
+                self._fila.put_nowait(_ACORDAR)
+            except queue.Full:
+                pass  # Fila cheia: o get volta na hora
+            self._thread.join(timeout)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'fila': self._fila.qsize(),
+                'capacidade': self.capacidade,
+                'descartados': self.descartados,
+                'gravados': self.gravados,
+                'lotes_gravados': self.lotes_gravados,
+                'erros': self.erros,
+            }
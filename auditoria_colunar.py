@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Armazenamento colunar (NumPy, mapeado em memória) da auditoria JSONL.
+
+A compactação lê `auditoria_sistema_especialista.json` e os arquivos já
+rotacionados (`<nome>.<AAAA-MM-DD>.<n>.json`), continuando de onde parou na
+última execução, e grava uma linha por resultado em colunas:
+
+    momento   int64   segundos desde 1970 (horário local do registro)
+    registro  int64   número do registro de auditoria
+    tipo      int8    código de tipo   (-1 = registro sem resultados)
+    causa     int32   código de causa  (-1 = sem causa)
+    risco     int32   código de risco  (-1 = sem risco)
+    talhao    int32   código do talhão (-1 = diagnóstico avulso)
+
+Os textos de tipo/causa/risco/talhão ficam em dicionários (uma vez cada).
+Cada compactação grava só as linhas novas num segmento próprio
+(`segmento-<n>/`), ordenadas por momento e agrupadas em blocos; o índice
+de tempo de cada segmento guarda o primeiro e o último momento de cada
+bloco, então uma consulta só lê os blocos do intervalo pedido. Um último
+segmento que ainda não encheu um bloco é regravado junto com as linhas
+novas, para que execuções frequentes não deixem só segmentos minúsculos.
+
+Uso:
+    python auditoria_colunar.py compactar [--origem auditoria_sistema_especialista.json] [--destino auditoria_colunar]
+    python auditoria_colunar.py consultar --inicio 2026-10-11 --fim 2026-10-18 --agrupar causa [--busca geada]
+"""
+
+import argparse
+import calendar
+import contextlib
+import datetime
+import glob
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from auditoria import ARQUIVO_JSON
+
+DIRETORIO_COLUNAR = "auditoria_colunar"
+ARQUIVO_MANIFESTO = "manifesto.json"
+ARQUIVO_TRAVA = "compactacao.lock"
+LINHAS_POR_BLOCO = 4096
+
+COLUNAS = {
+    'momento': np.int64,
+    'registro': np.int64,
+    'tipo': np.int8,
+    'causa': np.int32,
+    'risco': np.int32,
+    'talhao': np.int32,
+}
+DICIONARIOS = ('tipo', 'causa', 'risco', 'talhao')
+AGRUPAMENTOS = DICIONARIOS
+
+
+def _segundos(momento):
+    """datetime (sem fuso) -> segundos desde 1970, no mesmo horário local do log."""
+    return calendar.timegm(momento.timetuple())
+
+
+def _momento_do_registro(texto):
+    # Formato de formatar_registro_json: "%d/%m/%Y %H:%M:%S"
+    return _segundos(datetime.datetime(int(texto[6:10]), int(texto[3:5]), int(texto[0:2]),
+                                       int(texto[11:13]), int(texto[14:16]), int(texto[17:19])))
+
+
+def interpretar_momento(texto):
+    """Data/hora de uma consulta em ISO (ex: 2026-10-11 ou 2026-10-11T08:00) -> segundos."""
+    return _segundos(datetime.datetime.fromisoformat(texto))
+
+
+def arquivos_de_origem(origem=ARQUIVO_JSON):
+    """Arquivos rotacionados (do mais antigo ao mais novo) seguidos do arquivo atual."""
+    base, extensao = os.path.splitext(origem)
+    padrao = re.compile(re.escape(os.path.basename(base)) + r'\.(\d{4}-\d{2}-\d{2})\.(\d+)' + re.escape(extensao) + '$')
+    rotacionados = []
+    for caminho in glob.glob(f"{glob.escape(base)}.*{extensao}"):
+        encontrado = padrao.match(os.path.basename(caminho))
+        if encontrado:
+            rotacionados.append(((encontrado.group(1), int(encontrado.group(2))), caminho))
+    arquivos = [caminho for _, caminho in sorted(rotacionados)]
+    if os.path.exists(origem):
+        arquivos.append(origem)
+    return arquivos
+
+
+# --- Compactação ---
+
+class _Dicionario:
+    """Codificação texto -> inteiro; os códigos existentes nunca mudam."""
+
+    def __init__(self, valores=()):
+        self.valores = list(valores)
+        self._codigos = {valor: codigo for codigo, valor in enumerate(self.valores)}
+
+    def codigo(self, valor):
+        if valor is None:
+            return -1
+        codigo = self._codigos.get(valor)
+        if codigo is None:
+            codigo = self._codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+
+def _ler_manifesto(destino):
+    try:
+        with open(os.path.join(destino, ARQUIVO_MANIFESTO), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+def _identificador(estado):
+    # O arquivo atual é renomeado na rotação: a identidade é o inode (do os.stat), não o nome
+    return f"{estado.st_dev}:{estado.st_ino}"
+
+
+@contextlib.contextmanager
+def _travado(destino):
+    """Uma compactação por vez no mesmo destino (ex: cron e uma execução manual)."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(destino, ARQUIVO_TRAVA), 'a') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        yield
+
+
+def _segmentos(manifesto):
+    # Manifestos anteriores aos segmentos: uma geração única com todas as linhas
+    if 'segmentos' in manifesto:
+        return manifesto['segmentos']
+    return [{'diretorio': f"geracao-{manifesto['geracao']}", 'linhas': manifesto['linhas'],
+             'linhas_por_bloco': manifesto['linhas_por_bloco']}]
+
+
+def _gravar_segmento(diretorio, colunas, linhas_por_bloco):
+    """Grava as colunas ordenadas por momento e o índice de tempo dos blocos."""
+    # Ordena por momento (estável: mantém a ordem de gravação no mesmo segundo)
+    ordem = np.argsort(colunas['momento'], kind='stable')
+    if not np.array_equal(ordem, np.arange(len(ordem))):
+        colunas = {nome: valores[ordem] for nome, valores in colunas.items()}
+
+    momentos = colunas['momento']
+    inicios = np.arange(0, len(momentos), linhas_por_bloco)
+    indice_tempo = np.empty((len(inicios), 2), dtype=np.int64)
+    if len(inicios):
+        indice_tempo[:, 0] = momentos[inicios]
+        indice_tempo[:, 1] = momentos[np.minimum(inicios + linhas_por_bloco, len(momentos)) - 1]
+
+    os.makedirs(diretorio, exist_ok=True)
+    for nome, valores in colunas.items():
+        np.save(os.path.join(diretorio, f"{nome}.npy"), valores)
+    np.save(os.path.join(diretorio, "indice_tempo.npy"), indice_tempo)
+
+
+def compactar(origem=ARQUIVO_JSON, destino=DIRETORIO_COLUNAR, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """
+    Acrescenta ao armazenamento colunar os registros novos do log JSONL,
+    num segmento novo (o custo depende só do que chegou, não do histórico).
+    O manifesto é trocado de uma vez, então leitores abertos continuam vendo
+    o conjunto anterior de segmentos inteiro. Retorna um resumo do que foi lido.
+    """
+    os.makedirs(destino, exist_ok=True)
+    with _travado(destino):
+        return _compactar(origem, destino, linhas_por_bloco)
+
+
+def _compactar(origem, destino, linhas_por_bloco):
+    manifesto = _ler_manifesto(destino) or {'geracao': 0, 'lidos': {}, 'registros': 0, 'linhas': 0,
+                                           'segmentos': [], 'dicionarios': {nome: [] for nome in DICIONARIOS}}
+    dicionarios = {nome: _Dicionario(manifesto['dicionarios'][nome]) for nome in DICIONARIOS}
+    lidos = dict(manifesto['lidos'])
+    proximo_registro = manifesto['registros']
+
+    novas = {nome: [] for nome in COLUNAS}
+    invalidas = 0
+    for caminho in arquivos_de_origem(origem):
+        with open(caminho, 'rb') as arquivo:
+            estado = os.fstat(arquivo.fileno())
+            identificador = _identificador(estado)
+            posicao = lidos.get(identificador, 0)
+            if estado.st_size < posicao:
+                # Menor do que já foi lido: o arquivo foi truncado ou o inode é de um arquivo novo
+                posicao = 0
+            arquivo.seek(posicao)
+            conteudo = arquivo.read()
+        # Só linhas completas: a última pode estar sendo escrita agora
+        conteudo = conteudo[:conteudo.rfind(b'\n') + 1]
+        lidos[identificador] = posicao + len(conteudo)
+
+        for linha in conteudo.splitlines():
+            if not linha.strip():
+                continue
+            try:
+                entrada = json.loads(linha)
+                momento = _momento_do_registro(entrada['timestamp'])
+            except (ValueError, KeyError, TypeError):
+                invalidas += 1
+                continue
+
+            resultados = entrada.get('resultados')
+            # Diagnóstico em lote: {talhao: [resultados] ou {"erro": ...}}
+            if isinstance(resultados, dict):
+                grupos = [(talhao, itens if isinstance(itens, list) else []) for talhao, itens in resultados.items()]
+            else:
+                grupos = [(None, resultados if isinstance(resultados, list) else [])]
+
+            for talhao, itens in grupos:
+                for item in itens or [None]:
+                    item = item if isinstance(item, dict) else {}
+                    novas['momento'].append(momento)
+                    novas['registro'].append(proximo_registro)
+                    novas['tipo'].append(dicionarios['tipo'].codigo(item.get('tipo')))
+                    novas['causa'].append(dicionarios['causa'].codigo(item.get('causa')))
+                    novas['risco'].append(dicionarios['risco'].codigo(item.get('risco')))
+                    novas['talhao'].append(dicionarios['talhao'].codigo(None if talhao is None else str(talhao)))
+            proximo_registro += 1
+
+    # Arquivos que não existem mais (apagados) saem do manifesto
+    existentes = {_identificador(os.stat(caminho)) for caminho in arquivos_de_origem(origem)}
+    lidos = {identificador: posicao for identificador, posicao in lidos.items() if identificador in existentes}
+
+    segmentos = list(_segmentos(manifesto)) if manifesto['geracao'] else []
+    colunas = {nome: np.asarray(novas[nome], dtype=tipo) for nome, tipo in COLUNAS.items()}
+    geracao = manifesto['geracao'] + 1
+    if len(colunas['momento']):
+        if segmentos and segmentos[-1]['linhas'] < linhas_por_bloco:
+            # O último segmento ainda é um bloco incompleto: vai junto com as linhas novas
+            ultimo = segmentos.pop()
+            diretorio_ultimo = os.path.join(destino, ultimo['diretorio'])
+            colunas = {nome: np.concatenate([np.load(os.path.join(diretorio_ultimo, f"{nome}.npy")), valores])
+                       for nome, valores in colunas.items()}
+        segmento = {'diretorio': f"segmento-{geracao}", 'linhas': int(len(colunas['momento'])),
+                    'linhas_por_bloco': linhas_por_bloco}
+        _gravar_segmento(os.path.join(destino, segmento['diretorio']), colunas, linhas_por_bloco)
+        segmentos.append(segmento)
+
+    novo_manifesto = {
+        'geracao': geracao,
+        'linhas_por_bloco': linhas_por_bloco,
+        'linhas': sum(segmento['linhas'] for segmento in segmentos),
+        'registros': proximo_registro,
+        'compactado_em': datetime.datetime.now().isoformat(timespec='seconds'),
+        'lidos': lidos,
+        'segmentos': segmentos,
+        'dicionarios': {nome: dicionario.valores for nome, dicionario in dicionarios.items()},
+    }
+    temporario = os.path.join(destino, ARQUIVO_MANIFESTO + '.tmp')
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(novo_manifesto, arquivo, ensure_ascii=False)
+    os.replace(temporario, os.path.join(destino, ARQUIVO_MANIFESTO))
+
+    # Segmentos que saíram do manifesto (no Windows podem ainda estar abertos: ficam para a próxima vez)
+    em_uso = {segmento['diretorio'] for segmento in segmentos}
+    for antigo in glob.glob(os.path.join(destino, "geracao-*")) + glob.glob(os.path.join(destino, "segmento-*")):
+        if os.path.basename(antigo) not in em_uso:
+            shutil.rmtree(antigo, ignore_errors=True)
+
+    return {'linhas_novas': len(novas['momento']), 'linhas': novo_manifesto['linhas'],
+            'registros': proximo_registro, 'linhas_invalidas': invalidas, 'geracao': geracao,
+            'segmentos': len(segmentos)}
+
+
+# --- Consulta ---
+
+class _Segmento:
+    """Colunas (mapeadas em memória) e índice de tempo de um segmento."""
+
+    def __init__(self, diretorio, linhas_por_bloco):
+        self.colunas = {nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode='r')
+                        for nome in COLUNAS}
+        self.indice_tempo = np.load(os.path.join(diretorio, "indice_tempo.npy"))
+        self.linhas_por_bloco = linhas_por_bloco
+
+    def linhas_do_intervalo(self, inicio, fim):
+        """Faixa de linhas [a, b) com inicio <= momento < fim e quantos blocos foram lidos."""
+        total = len(self.colunas['momento'])
+        if not total:
+            return 0, 0, 0
+        # Blocos cujo último momento >= inicio e cujo primeiro momento < fim
+        primeiro = 0 if inicio is None else int(np.searchsorted(self.indice_tempo[:, 1], inicio, side='left'))
+        ultimo = len(self.indice_tempo) if fim is None else int(np.searchsorted(self.indice_tempo[:, 0], fim, side='left'))
+        if primeiro >= ultimo:
+            return 0, 0, 0
+        a = primeiro * self.linhas_por_bloco
+        b = min(ultimo * self.linhas_por_bloco, total)
+        momentos = self.colunas['momento'][a:b]  # Só as páginas desses blocos são lidas
+        inicio_linhas = a + (0 if inicio is None else int(np.searchsorted(momentos, inicio, side='left')))
+        fim_linhas = a + (len(momentos) if fim is None else int(np.searchsorted(momentos, fim, side='left')))
+        return inicio_linhas, fim_linhas, ultimo - primeiro
+
+
+class ArmazemAuditoria:
+    """Leitura (mapeada em memória) dos segmentos listados no manifesto."""
+
+    def __init__(self, diretorio=DIRETORIO_COLUNAR):
+        self.diretorio = diretorio
+        self.manifesto = _ler_manifesto(diretorio)
+        if self.manifesto is None:
+            raise FileNotFoundError(f"Nenhuma auditoria compactada em {diretorio} "
+                                    f"(rode: python auditoria_colunar.py compactar)")
+        self.segmentos = [_Segmento(os.path.join(diretorio, segmento['diretorio']), segmento['linhas_por_bloco'])
+                          for segmento in _segmentos(self.manifesto)]
+        self.dicionarios = self.manifesto['dicionarios']
+
+    def fechar(self):
+        self.segmentos = []
+
+    def _codigos(self, dicionario, busca):
+        """Códigos do dicionário cujo texto contém `busca` (sem diferenciar maiúsculas)."""
+        busca = busca.casefold()
+        return np.array([codigo for codigo, valor in enumerate(self.dicionarios[dicionario])
+                         if busca in valor.casefold()], dtype=np.int64)
+
+    def consultar(self, inicio=None, fim=None, agrupar='causa', tipo=None, busca=None):
+        """
+        Contagens no intervalo [inicio, fim) (segundos; None = sem limite),
+        agrupadas por `agrupar` (tipo, causa, risco ou talhao). `tipo` filtra
+        por tipo de resultado e `busca` por um trecho do texto agrupado.
+        """
+        if agrupar not in AGRUPAMENTOS:
+            raise ValueError(f"Agrupamento inválido: {agrupar} (use {', '.join(AGRUPAMENTOS)})")
+        codigo_tipo = None
+        if tipo is not None:
+            codigo_tipo = (self.dicionarios['tipo'].index(tipo) if tipo in self.dicionarios['tipo'] else -2)
+        codigos_busca = self._codigos(agrupar, busca) if busca else None
+
+        # Um registro fica inteiro num segmento só: as contagens dos segmentos se somam
+        contagens = np.zeros(len(self.dicionarios[agrupar]), dtype=np.int64)
+        registros = itens = sem_valor = blocos_lidos = 0
+        for segmento in self.segmentos:
+            a, b, lidos = segmento.linhas_do_intervalo(inicio, fim)
+            blocos_lidos += lidos
+            if a == b:
+                continue
+            codigos = np.asarray(segmento.colunas[agrupar][a:b], dtype=np.int64)
+            mascara = np.ones(len(codigos), dtype=bool)
+            if codigo_tipo is not None:
+                mascara &= np.asarray(segmento.colunas['tipo'][a:b]) == codigo_tipo
+            if codigos_busca is not None:
+                mascara &= np.isin(codigos, codigos_busca)
+
+            registros += int(len(np.unique(segmento.colunas['registro'][a:b][mascara])))
+            selecionados = codigos[mascara]
+            itens += int(mascara.sum())
+            sem_valor += int((selecionados < 0).sum())
+            contagens += np.bincount(selecionados[selecionados >= 0], minlength=len(contagens))
+
+        grupos = {self.dicionarios[agrupar][codigo]: int(contagens[codigo])
+                  for codigo in np.argsort(-contagens, kind='stable') if contagens[codigo]}
+        return {
+            'agrupar': agrupar,
+            'registros': registros,
+            'itens': itens,
+            'sem_valor': sem_valor,
+            'grupos': grupos,
+            'blocos_lidos': blocos_lidos,
+            'blocos_total': sum(len(segmento.indice_tempo) for segmento in self.segmentos),
+            'compactado_em': self.manifesto['compactado_em'],
+        }
+
+
+class ConsultaAuditoria:
+    """
+    Acesso ao armazenamento colunar para o servidor: reabre a geração nova
+    quando uma compactação troca o manifesto.
+    """
+
+    def __init__(self, diretorio=DIRETORIO_COLUNAR):
+        self.diretorio = diretorio
+        self._armazem = None
+        self._mtime_manifesto = None
+        self._lock = threading.Lock()
+
+    def armazem(self):
+        try:
+            mtime = os.stat(os.path.join(self.diretorio, ARQUIVO_MANIFESTO)).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if self._armazem is None or mtime != self._mtime_manifesto:
+                self._armazem = ArmazemAuditoria(self.diretorio)
+                self._mtime_manifesto = mtime
+            return self._armazem
+
+    def consultar(self, **parametros):
+        return self.armazem().consultar(**parametros)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auditoria em armazenamento colunar")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    compactacao = subcomandos.add_parser('compactar', help="Acrescenta os registros novos do log JSONL")
+    compactacao.add_argument('--origem', default=ARQUIVO_JSON)
+    compactacao.add_argument('--destino', default=DIRETORIO_COLUNAR)
+    compactacao.add_argument('--linhas-por-bloco', type=int, default=LINHAS_POR_BLOCO)
+
+    consulta = subcomandos.add_parser('consultar', help="Contagens num intervalo de tempo")
+    consulta.add_argument('--diretorio', default=DIRETORIO_COLUNAR)
+    consulta.add_argument('--inicio', help="Data/hora ISO (inclusive)")
+    consulta.add_argument('--fim', help="Data/hora ISO (exclusive)")
+    consulta.add_argument('--agrupar', choices=AGRUPAMENTOS, default='causa')
+    consulta.add_argument('--tipo', help="Diagnostico ou Alerta")
+    consulta.add_argument('--busca', help="Trecho do texto agrupado (ex: geada)")
+    args = parser.parse_args()
+
+    if args.comando == 'compactar':
+        resumo = compactar(args.origem, args.destino, args.linhas_por_bloco)
+    else:
+        resumo = ArmazemAuditoria(args.diretorio).consultar(
+            inicio=interpretar_momento(args.inicio) if args.inicio else None,
+            fim=interpretar_momento(args.fim) if args.fim else None,
+            agrupar=args.agrupar, tipo=args.tipo, busca=args.busca)
+    print(json.dumps(resumo, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
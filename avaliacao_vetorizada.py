@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Avaliação vetorizada (NumPy) das regras de sensores para backtesting.
+
+As regras cujo lado esquerdo só usa fatos `Condicao` (faixas numéricas
+e igualdades simples) são lidas do próprio motor e compiladas em operações
+sobre colunas inteiras; as faixas usam o mesmo índice de intervalos das
+regras (faixas.py).
+A entrada é um conjunto de séries temporais em colunas (um array por campo
+de `Condicao`) e a saída é uma matriz booleana regras x instantes.
+
+Uso:
+    python avaliacao_vetorizada.py historico.csv [--saida disparos.npy] [--conferir 500]
+"""
+
+import argparse
+import csv
+
+import numpy as np
+from experta import P, Rule
+
+from faixas import INDICE_FAIXAS, TesteFaixa
+from motor_diagnostico import MotorDiagnosticoAgricola, Condicao, declarar_fatos
+
+# --- Regras de sensores (extraídas de motor_diagnostico.py) ---
+# Cada condição é (campo, '==', valor) ou (campo, 'faixa', TesteFaixa): as
+# faixas são as mesmas do índice de intervalos usado pelas regras do motor.
+
+def _condicoes_da_regra(regra):
+    """Condições da regra, ou None se ela usar algo além de Condicao com igualdades/faixas."""
+    condicoes = []
+    for padrao in regra:
+        if type(padrao) is not Condicao:
+            return None
+        for campo, valor in padrao.items():
+            if isinstance(valor, P) and isinstance(valor.match, TesteFaixa):
+                condicoes.append((campo, 'faixa', valor.match))
+            elif isinstance(valor, (str, bool, int, float)):
+                condicoes.append((campo, '==', valor))
+            else:
+                return None
+    return tuple(condicoes)
+
+
+def _regras_sensores(classe_motor=MotorDiagnosticoAgricola):
+    """Regras do motor (na ordem do arquivo) que só dependem de leituras de sensores."""
+    regras = {}
+    for nome, membro in vars(classe_motor).items():
+        if isinstance(membro, Rule):
+            condicoes = _condicoes_da_regra(membro)
+            if condicoes:
+                regras[nome] = condicoes
+    return regras
+
+
+REGRAS_SENSORES = _regras_sensores()
+
+
+def _tipos_dos_campos(regras):
+    """Descobre o tipo de cada campo (numérico, booleano ou texto) pelas condições."""
+    tipos = {}
+    for condicoes in regras.values():
+        for campo, operador, valor in condicoes:
+            if operador == 'faixa':
+                tipos[campo] = float
+            elif isinstance(valor, bool):
+                tipos[campo] = bool
+            else:
+                tipos.setdefault(campo, str)
+    return tipos
+
+
+TIPOS_CAMPOS = _tipos_dos_campos(REGRAS_SENSORES)
+
+
+def _faixas_da_coluna(campo, coluna):
+    """
+    Matriz booleana faixas x instantes de um campo numérico: uma única busca
+    binária por leitura no índice do campo (NaN não cai em faixa nenhuma).
+    """
+    indice = INDICE_FAIXAS.campo(campo)
+    pontos = np.asarray(indice.pontos, dtype=float)
+    coluna = coluna.astype(float, copy=False)
+
+    posicao = np.searchsorted(pontos, coluna, side='left')
+    no_ponto = posicao < len(pontos)
+    no_ponto[no_ponto] = pontos[posicao[no_ponto]] == coluna[no_ponto]
+    trecho = 2 * posicao + no_ponto
+    trecho[np.isnan(coluna)] = len(indice.trechos)  # Linha extra, sempre False
+
+    tabela = np.zeros((len(indice.intervalos), len(indice.trechos) + 1), dtype=bool)
+    for t, faixas in enumerate(indice.trechos):
+        tabela[list(faixas), t] = True
+    return tabela[:, trecho]
+
+
+class AvaliadorVetorizado:
+    """Compila as regras de sensores uma vez e avalia séries temporais inteiras."""
+
+    def __init__(self, regras=REGRAS_SENSORES):
+        self.regras = list(regras)
+        self._condicoes = [regras[nome] for nome in self.regras]
+
+    def _mascara(self, colunas, condicao, tamanho, faixas_por_campo):
+        campo, operador, valor = condicao
+        coluna = colunas.get(campo)
+        if coluna is None:
+            # Campo ausente: nenhum fato Condicao com esse campo, a regra não casa
+            return np.zeros(tamanho, dtype=bool)
+
+        if operador == '==':
+            # Tipos incompatíveis (ex: texto x booleano) nunca são iguais
+            tipos_aceitos = 'biuf' if isinstance(valor, bool) else 'USO'
+            if coluna.dtype.kind not in tipos_aceitos:
+                return np.zeros(tamanho, dtype=bool)
+            return coluna == valor
+
+        if coluna.dtype.kind not in 'biuf':
+            return np.zeros(tamanho, dtype=bool)
+        # Todas as faixas do campo saem da mesma busca no índice
+        if campo not in faixas_por_campo:
+            faixas_por_campo[campo] = _faixas_da_coluna(campo, coluna)
+        return faixas_por_campo[campo][valor.posicao]
+
+    def avaliar(self, colunas):
+        """
+        Recebe {campo: array} (todos do mesmo tamanho) e devolve a matriz
+        booleana de disparos com formato (len(self.regras), instantes).
+        """
+        colunas = {campo: np.asarray(valores) for campo, valores in colunas.items()}
+        tamanhos = {len(valores) for valores in colunas.values()}
+        if len(tamanhos) > 1:
+            raise ValueError(f"Colunas com tamanhos diferentes: {sorted(tamanhos)}")
+        tamanho = tamanhos.pop() if tamanhos else 0
+
+        disparos = np.ones((len(self.regras), tamanho), dtype=bool)
+        mascaras = {}  # Condições repetidas entre regras são calculadas uma vez
+        faixas_por_campo = {}
+        for i, condicoes in enumerate(self._condicoes):
+            for condicao in condicoes:
+                if condicao not in mascaras:
+                    mascaras[condicao] = self._mascara(colunas, condicao, tamanho, faixas_por_campo)
+                disparos[i] &= mascaras[condicao]
+        return disparos
+
+
+# --- Leitura de arquivos ---
+
+def _converter_coluna(campo, valores):
+    tipo = TIPOS_CAMPOS.get(campo, str)
+    if tipo is float:
+        return np.array([float(v) if v not in ('', None) else np.nan for v in valores], dtype=float)
+    if tipo is bool:
+        return np.array([str(v).strip().lower() in ('1', 'true', 'sim') for v in valores], dtype=bool)
+    return np.array(['' if v is None else v for v in valores], dtype=str)
+
+
+def carregar_colunas(caminho):
+    """
+    Lê uma série temporal em colunas de um arquivo:
+      - .csv: cabeçalho com os nomes dos campos de Condicao;
+      - .npy: array estruturado (um campo por coluna);
+      - .npz: um array por campo.
+    """
+    if caminho.endswith('.csv'):
+        with open(caminho, newline='', encoding='utf-8') as arquivo:
+            leitor = csv.DictReader(arquivo)
+            linhas = list(leitor)
+            campos = leitor.fieldnames or []
+        return {campo: _converter_coluna(campo, [linha[campo] for linha in linhas]) for campo in campos}
+
+    if caminho.endswith('.npz'):
+        with np.load(caminho) as dados:
+            return {campo: dados[campo] for campo in dados.files}
+
+    if caminho.endswith('.npy'):
+        dados = np.load(caminho)
+        if dados.dtype.names is None:
+            raise ValueError("O arquivo .npy precisa ser um array estruturado (um campo por coluna).")
+        return {campo: dados[campo] for campo in dados.dtype.names}
+
+    raise ValueError(f"Formato não suportado: {caminho}")
+
+
+# --- Conferência com o motor experta ---
+
+def _linha_para_fatos(colunas, i):
+    fatos = []
+    for campo, coluna in colunas.items():
+        valor = coluna[i].item()
+        if valor is None or valor == '' or (isinstance(valor, float) and np.isnan(valor)):
+            continue  # Leitura ausente: não declara o fato
+        fatos.append({'tipo': 'Condicao', 'dados': {campo: valor}})
+    return fatos
+
+
+def conferir_com_motor(colunas, avaliador=None, instantes=None):
+    """
+    Roda os instantes indicados (ou todos) no motor experta, um por vez,
+    e devolve a lista de divergências (instante, regra, vetorizado, experta).
+    """
+    avaliador = avaliador or AvaliadorVetorizado()
+    colunas = {campo: np.asarray(valores) for campo, valores in colunas.items()}
+    disparos = avaliador.avaliar(colunas)
+    if instantes is None:
+        instantes = range(disparos.shape[1])
+
+    engine = MotorDiagnosticoAgricola()
+    divergencias = []
+    for i in instantes:
+        engine.reset()
+        declarar_fatos(engine, _linha_para_fatos(colunas, i))
+        # Só fatos Condicao: a agenda já contém exatamente as regras que casaram
+        ativadas = {ativacao.rule.__name__ for ativacao in engine.agenda.activations}
+        for r, nome in enumerate(avaliador.regras):
+            if bool(disparos[r, i]) != (nome in ativadas):
+                divergencias.append((i, nome, bool(disparos[r, i]), nome in ativadas))
+    return divergencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avaliação vetorizada das regras de sensores")
+    parser.add_argument('arquivo', help="Série temporal em .csv, .npy ou .npz")
+    parser.add_argument('--saida', help="Salva a matriz de disparos (regras x instantes) em .npy")
+    parser.add_argument('--conferir', type=int, default=0,
+                        help="Confere os N primeiros instantes com o motor experta")
+    args = parser.parse_args()
+
+    colunas = carregar_colunas(args.arquivo)
+    avaliador = AvaliadorVetorizado()
+    disparos = avaliador.avaliar(colunas)
+
+    print(f"{disparos.shape[1]} instantes avaliados")
+    for nome, contagem in zip(avaliador.regras, disparos.sum(axis=1)):
+        print(f"  {nome}: {contagem}")
+
+    if args.saida:
+        np.save(args.saida, disparos)
+
+    if args.conferir:
+        divergencias = conferir_com_motor(colunas, avaliador, range(min(args.conferir, disparos.shape[1])))
+        print(f"Conferência com o motor: {len(divergencias)} divergência(s)")
+        for divergencia in divergencias[:20]:
+            print(f"  instante {divergencia[0]}: {divergencia[1]} (vetorizado={divergencia[2]}, experta={divergencia[3]})")
+
+
+if __name__ == '__main__':
+    main()
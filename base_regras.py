@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Base de regras em arquivo de dados (JSON ou YAML) e snapshot pré-compilado.
+
+Formato da base:
+
+    {"regras": [
+        {"nome": "alerta_geada",
+         "se": [{"Condicao": {"previsao_tempo": "geada_iminente"}},
+                {"Condicao": {"temperatura_ar": {"abaixo_de": 3}}}],
+         "salience": 0,
+         "acumular": {"Alerta": {"risco": "...", "recomendacao": "..."}}}
+    ]}
+
+- `se`: padrões {<TipoFato>: {campo: valor}}, todos precisam casar. O valor é
+  um literal (igualdade) ou uma faixa: {"acima_de": x}, {"abaixo_de": x} ou
+  {"entre": [min, max]}. {"ou": [padrões]} casa com qualquer um deles.
+- `acumular`: {<Tipo>: {dados}} vai para a lista de resultados do motor.
+- `declarar`: {<TipoFato>: {dados}} declara um fato na memória de trabalho
+  (para regras encadeadas).
+- `salience` (opcional, padrão 0) e `descricao` (opcional).
+
+O snapshot é o motor já construído (rede Rete pronta) serializado com
+pickle: carregá-lo evita montar a rede a cada processo.
+
+Uso:
+    python base_regras.py --snapshot regras/agricola.snapshot
+    python base_regras.py --snapshot regras/agricola.snapshot --medir 10
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+import types
+
+import experta
+from experta import OR, Rule
+from experta.conditionalelement import ConditionalElement
+from experta.fieldconstraint import FieldConstraint, P
+from experta.matchers.rete.check import FeatureCheck
+
+from faixas import INDICE_FAIXAS, acima_de, abaixo_de, entre
+
+DIRETORIO_REGRAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regras')
+CAMINHO_BASE_PADRAO = os.path.join(DIRETORIO_REGRAS, 'agricola.json')
+
+# Construtores das faixas aceitas no arquivo
+FAIXAS = {
+    'acima_de': acima_de,
+    'abaixo_de': abaixo_de,
+    'entre': lambda limites: entre(*limites),
+}
+
+VERSAO_SNAPSHOT = 1
+
+
+# --- Leitura e compilação da base ---
+
+def ler_base(caminho):
+    """Lê a base de regras de um arquivo .json, .yaml ou .yml."""
+    with open(caminho, encoding='utf-8') as arquivo:
+        if caminho.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Bases em YAML precisam do PyYAML (pip install pyyaml).") from None
+            return yaml.safe_load(arquivo)
+        return json.load(arquivo)
+
+
+def versao_base(caminho):
+    """Hash do conteúdo do arquivo da base (identifica a versão num snapshot)."""
+    with open(caminho, 'rb') as arquivo:
+        return hashlib.blake2b(arquivo.read(), digest_size=16).hexdigest()
+
+
+class AcaoRegra:
+    """
+    Lado direito (RHS) de uma regra da base: acumula um resultado ou declara
+    um fato. É uma classe (e não uma função criada em tempo de execução) para
+    que o motor possa ser serializado no snapshot.
+    """
+
+    def __init__(self, nome, modo, tipo, dados, classe_fato=None, descricao=None):
+        self.__name__ = self.__qualname__ = nome
+        self.__doc__ = descricao
+        self.modo = modo  # 'acumular' ou 'declarar'
+        self.tipo = tipo
+        self.dados = dados
+        self.classe_fato = classe_fato
+
+    def __call__(self, engine):
+        if self.modo == 'declarar':
+            engine.declare(self.classe_fato(**self.dados))
+        else:
+            engine._adicionar_resultado(self.tipo, self.dados, self.__name__)
+
+    def __repr__(self):
+        return f"AcaoRegra({self.__name__}: {self.modo} {self.tipo})"
+
+
+def _compilar_valor(nome, campo, valor, indice):
+    if not isinstance(valor, dict):
+        return valor
+    if len(valor) != 1 or next(iter(valor)) not in FAIXAS:
+        raise ValueError(f"Regra {nome}: faixa inválida em '{campo}': {valor!r} "
+                         f"(use uma de {', '.join(FAIXAS)})")
+    (tipo_faixa, limite), = valor.items()
+    return P(indice.teste(campo, FAIXAS[tipo_faixa](limite)))
+
+
+def _compilar_padrao(nome, padrao, tipos_fato, indice):
+    if not isinstance(padrao, dict) or len(padrao) != 1:
+        raise ValueError(f"Regra {nome}: cada padrão deve ter uma única chave (tipo do fato ou 'ou').")
+    (tipo, campos), = padrao.items()
+    if tipo == 'ou':
+        return OR(*(_compilar_padrao(nome, alternativa, tipos_fato, indice) for alternativa in campos))
+    if tipo not in tipos_fato:
+        raise ValueError(f"Regra {nome}: tipo de fato desconhecido '{tipo}'.")
+    return tipos_fato[tipo](**{campo: _compilar_valor(nome, campo, valor, indice)
+                               for campo, valor in campos.items()})
+
+
+def _compilar_acao(nome, regra, tipos_fato):
+    modos = [modo for modo in ('acumular', 'declarar') if modo in regra]
+    if len(modos) != 1:
+        raise ValueError(f"Regra {nome}: informe exatamente um de 'acumular' ou 'declarar'.")
+    modo = modos[0]
+    if not isinstance(regra[modo], dict) or len(regra[modo]) != 1:
+        raise ValueError(f"Regra {nome}: '{modo}' deve ser {{<Tipo>: {{dados}}}}.")
+    (tipo, dados), = regra[modo].items()
+    classe_fato = None
+    if modo == 'declarar':
+        if tipo not in tipos_fato:
+            raise ValueError(f"Regra {nome}: tipo de fato desconhecido '{tipo}'.")
+        classe_fato = tipos_fato[tipo]
+    return AcaoRegra(nome, modo, tipo, dict(dados), classe_fato, regra.get('descricao'))
+
+
+def compilar_regras(base, tipos_fato, indice=INDICE_FAIXAS):
+    """
+    Converte a base lida do arquivo em regras do experta.
+    Retorna {nome: Rule} na ordem do arquivo.
+    """
+    regras = {}
+    for regra in base.get('regras', []):
+        nome = regra.get('nome')
+        if not nome or not nome.isidentifier():
+            raise ValueError(f"Nome de regra inválido: {nome!r}")
+        if nome in regras:
+            raise ValueError(f"Regra repetida na base: {nome}")
+        padroes = [_compilar_padrao(nome, padrao, tipos_fato, indice) for padrao in regra.get('se', [])]
+        if not padroes:
+            raise ValueError(f"Regra {nome}: 'se' não pode ser vazio.")
+        acao = _compilar_acao(nome, regra, tipos_fato)
+        regras[nome] = Rule(*padroes, salience=regra.get('salience', 0))(acao)
+    return regras
+
+
+# --- Snapshot do motor construído ---
+
+def _funcao_da_regra(classe, nome):
+    return vars(classe)[nome]._wrapped
+
+
+class _Serializador(pickle.Pickler):
+    """
+    Pickler que sabe serializar a rede Rete do experta:
+    - ConditionalElement/FieldConstraint são tuplas com __new__ próprio,
+      então são recriadas direto como tuplas;
+    - FeatureCheck guarda uma função interna, recriada pelo construtor;
+    - funções decoradas com @Rule são referenciadas pela classe.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, (ConditionalElement, FieldConstraint)):
+            return tuple.__new__, (type(obj), tuple(obj)), vars(obj) or None
+        if type(obj) is FeatureCheck:
+            return FeatureCheck, (obj.what, obj.how)
+        if isinstance(obj, types.FunctionType):
+            classe_nome, _, nome = obj.__qualname__.rpartition('.')
+            classe = getattr(sys.modules.get(obj.__module__), classe_nome, None)
+            regra = vars(classe).get(nome) if isinstance(classe, type) else None
+            if isinstance(regra, Rule) and regra._wrapped is obj:
+                return _funcao_da_regra, (classe, nome)
+        return NotImplemented
+
+
+def _identificacao(versao):
+    return {'formato': VERSAO_SNAPSHOT, 'base': versao, 'experta': experta.__version__,
+            'python': '.'.join(map(str, sys.version_info[:3]))}
+
+
+class SnapshotMotor:
+    """Motor serializado; cada `novo_motor()` é uma cópia independente."""
+
+    def __init__(self, identificacao, dados):
+        self.identificacao = identificacao
+        self._dados = dados
+
+    @classmethod
+    def de_motor(cls, engine, versao=None):
+        """Snapshot em memória de um motor recém-construído (antes do reset)."""
+        return cls(_identificacao(versao), _serializar(engine))
+
+    def novo_motor(self, metricas=None):
+        engine = pickle.loads(self._dados)
+        engine.metricas = metricas
+        return engine
+
+
+def gravar_snapshot(engine, caminho, versao):
+    """Serializa um motor recém-construído (antes do reset) em `caminho`."""
+    dados = _serializar(engine)
+    with open(caminho, 'wb') as arquivo:
+        pickle.dump((_identificacao(versao), dados), arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    return len(dados)
+
+
+def _serializar(engine):
+    buffer = io.BytesIO()
+    _Serializador(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(engine)
+    return buffer.getvalue()
+
+
+def carregar_snapshot(caminho, versao):
+    """
+    Lê um snapshot gravado por `gravar_snapshot`. Falha se ele foi gerado a
+    partir de outra versão da base de regras (ou outro experta/Python).
+    """
+    with open(caminho, 'rb') as arquivo:
+        identificacao, dados = pickle.load(arquivo)
+    esperado = _identificacao(versao)
+    if identificacao != esperado:
+        diferencas = ', '.join(f"{chave}: {identificacao.get(chave)!r} != {valor!r}"
+                               for chave, valor in esperado.items() if identificacao.get(chave) != valor)
+        raise ValueError(f"Snapshot {caminho} desatualizado ({diferencas}); "
+                         f"gere de novo com: python base_regras.py --snapshot {caminho}")
+    return SnapshotMotor(identificacao, dados)
+
+
+# --- Linha de comando: gerar snapshot e medir a partida ---
+
+_PARTIDA_MODULO = """
+import time
+inicio = time.perf_counter()
+import motor_diagnostico
+motor_diagnostico.MotorDiagnosticoAgricola().reset()
+print(time.perf_counter() - inicio)
+"""
+
+_PARTIDA_SNAPSHOT = """
+import time
+inicio = time.perf_counter()
+import motor_diagnostico
+motor_diagnostico.criar_motor().reset()
+print(time.perf_counter() - inicio)
+"""
+
+
+def _medir_partida(codigo, repeticoes, ambiente):
+    """Mediana, em ms, de `repeticoes` partidas de um interpretador novo."""
+    import subprocess
+
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True,
+                               check=True, env=ambiente, cwd=os.path.dirname(os.path.abspath(__file__)))
+        tempos.append(float(saida.stdout.strip().splitlines()[-1]) * 1000)
+    return sorted(tempos)[len(tempos) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot pré-compilado da base de regras")
+    parser.add_argument('--base', default=os.environ.get('BASE_REGRAS', CAMINHO_BASE_PADRAO),
+                        help="Arquivo da base de regras (.json/.yaml)")
+    parser.add_argument('--snapshot', required=True, help="Arquivo do snapshot a gerar")
+    parser.add_argument('--medir', type=int, default=0,
+                        help="Compara N partidas a frio: import + construção x snapshot")
+    args = parser.parse_args()
+
+    os.environ['BASE_REGRAS'] = args.base
+    os.environ.pop('SNAPSHOT_REGRAS', None)
+    import motor_diagnostico
+
+    engine = motor_diagnostico.MotorDiagnosticoAgricola()
+    tamanho = gravar_snapshot(engine, args.snapshot, motor_diagnostico.VERSAO_BASE_REGRAS)
+    print(f"Snapshot de {len(motor_diagnostico.REGRAS_DA_BASE)} regras gravado em {args.snapshot} "
+          f"({tamanho / 1024:.0f} KB)")
+
+    if args.medir:
+        ambiente = dict(os.environ, BASE_REGRAS=args.base)
+        modulo = _medir_partida(_PARTIDA_MODULO, args.medir, ambiente)
+        ambiente['SNAPSHOT_REGRAS'] = args.snapshot
+        snapshot = _medir_partida(_PARTIDA_SNAPSHOT, args.medir, ambiente)
+        print(f"Partida a frio (mediana de {args.medir}): import + construção = {modulo:.1f} ms, "
+              f"import + snapshot = {snapshot:.1f} ms")
+
+
+if __name__ == '__main__':
+    # Roda pelo módulo importado (e não por __main__) para que as referências
+    # gravadas no snapshot apontem para base_regras
+    import base_regras
+    base_regras.main()
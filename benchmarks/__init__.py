@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks do sistema especialista (rodar a partir da raiz do projeto)."""
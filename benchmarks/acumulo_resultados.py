@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compara o acúmulo de resultados antigo (fato `resultados` copiado e
+re-declarado com modify a cada regra) com o acumulador fora da memória
+de trabalho, variando o número de regras disparadas.
+
+Uso:
+    python -m benchmarks.acumulo_resultados [--disparos 10 50 100 200] [--repeticoes 5]
+"""
+
+import argparse
+import time
+
+from experta import AS, MATCH, DefFacts, Fact, Rule
+
+from motor_diagnostico import MotorDiagnosticoAgricola, Condicao
+
+
+class MotorCarga(MotorDiagnosticoAgricola):
+    """Motor atual + uma regra que dispara uma vez por fato Condicao(carga=...)."""
+
+    @Rule(Condicao(carga=MATCH.i))
+    def regra_carga(self, i):
+        self._adicionar_resultado('Diagnostico', {'causa': f'carga_{i}', 'recomendacao': 'nenhuma'})
+
+    # Sem o relatório impresso, para medir só o acúmulo
+    @Rule(AS.f_acao << Fact(acao='buscar_solucao'),
+          salience=-100)
+    def coletar_resultados(self, f_acao):
+        self.retract(f_acao)
+
+
+class MotorCargaLegado(MotorCarga):
+    """Mesmo motor, mas com o acúmulo antigo via fato `resultados` + modify."""
+
+    @DefFacts()
+    def _fatos_iniciais(self):
+        yield Fact(acao="buscar_solucao")
+        yield Fact(resultados=[])
+
+    def _adicionar_resultado(self, tipo, dados):
+        for f in self.facts.values():
+            if 'resultados' in f:
+                nova_lista = list(f['resultados'])
+                nova_lista.append({'tipo': tipo, **dados})
+                self.modify(f, resultados=nova_lista)
+                break
+
+    @Rule(AS.f_acao << Fact(acao='buscar_solucao'),
+          Fact(resultados=MATCH.r),
+          salience=-100)
+    def coletar_resultados(self, f_acao, r):
+        self.retract(f_acao)
+
+
+def medir(classe_motor, disparos, repeticoes):
+    """Menor tempo (em ms) de reset + declarações + run entre as repetições."""
+    engine = classe_motor()
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        engine.reset()
+        for i in range(disparos):
+            engine.declare(Condicao(carga=i))
+        engine.run()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--disparos', type=int, nargs='+', default=[10, 50, 100, 200])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'disparos':>9} {'modify (ms)':>12} {'append (ms)':>12} {'ganho':>7}")
+    for disparos in args.disparos:
+        legado = medir(MotorCargaLegado, disparos, args.repeticoes)
+        atual = medir(MotorCarga, disparos, args.repeticoes)
+        print(f"{disparos:>9} {legado:>12.2f} {atual:>12.2f} {legado / atual:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
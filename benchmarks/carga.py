@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de carga de ponta a ponta do `/diagnosticar`.
+
+As requisições são enviadas em malha aberta: chegam em horários fixados
+pela taxa (constante ou Poisson), independentemente de as anteriores já
+terem terminado, e a latência é medida a partir do horário previsto (um
+servidor lento não freia o gerador e aparece na latência). Cada etapa
+roda uma taxa; a vazão de saturação é a maior vazão em que o app ainda
+acompanhou a taxa dentro do limite de erros e do p99.
+
+Alvos:
+    flask   app.test_client() no próprio processo (sem rede)
+    http    servidor.py num processo à parte, numa porta local livre
+            (ou --url para um servidor que já está rodando)
+
+As requisições saem do vocabulário de fatos do frontend (static/app.js:
+os campos e valores que cada menu envia) ou de um log gravado (JSONL, um
+corpo [{tipo, dados}] ou {"fatos": [...]} por linha; --gravar grava o
+log das requisições geradas). Com os alvos locais, a auditoria do teste
+vai para um diretório temporário.
+
+Uso:
+    python -m benchmarks.carga [--alvo flask|http] [--taxas 10 20 40 80] [--duracao 10]
+                               [--log requisicoes.jsonl] [--distintas 0] [--saida carga.json]
+"""
+
+import argparse
+import contextlib
+import datetime
+import http.client
+import json
+import os
+import platform
+import queue
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter, namedtuple
+
+from faixas import INDICE_FAIXAS
+from benchmarks.suite import percentis
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_APP_JS = os.path.join(RAIZ, 'static', 'app.js')
+
+# Opções dos menus que não viram fato (voltar, "não", "outra / não sei")
+OPCOES_SEM_FATO = ('v', 'nao', 'outra')
+
+# Campos que o frontend preenche juntos num mesmo fato, e os valores de cada
+# um (None = numérico, digitado pelo usuário)
+GrupoCampos = namedtuple('GrupoCampos', ['tipo', 'campos'])
+
+_LITERAL = r'"[^"]*"|\'[^\']*\'|-?\d+(?:\.\d+)?|true|false'
+
+
+def _valor_js(texto):
+    texto = texto.strip()
+    if texto[0] in '"\'':
+        return texto[1:-1]
+    if texto in ('true', 'false'):
+        return texto == 'true'
+    return None  # Número: o campo é numérico
+
+
+def vocabulario_frontend(caminho=CAMINHO_APP_JS):
+    """
+    Lê em static/app.js os fatos que os menus montam: os dicionários
+    preenchidos campo a campo (`dados.cor = "..."`) e os passados direto
+    para `adicionarFato("Tipo", {campo: valor})`. Retorna [GrupoCampos].
+    """
+    with open(caminho, encoding='utf-8') as arquivo:
+        codigo = arquivo.read()
+
+    numericas = set(re.findall(r'const\s+(\w+)\s*=\s*parseFloat\(', codigo))
+    opcoes = {}  # variável -> chaves das opções de askQuestion
+    for variavel, bloco in re.findall(r'const\s+(\w+)\s*=\s*await\s+askQuestion\([^{]*\{([^}]*)\}', codigo):
+        pares = re.findall(r'(?:\'([^\']+)\'|"([^"]+)"|(\w+))\s*:\s*(?:"[^"]*"|\'[^\']*\')', bloco)
+        chaves = [a or b or c for a, b, c in pares]
+        opcoes[variavel] = [chave for chave in chaves if chave not in OPCOES_SEM_FATO]
+
+    def juntar(campos, campo, valor):
+        if valor is None:
+            campos[campo] = None
+        elif campos.get(campo, []) is not None:
+            valores = campos.setdefault(campo, [])
+            valores.extend(v for v in (valor if isinstance(valor, list) else [valor]) if v not in valores)
+
+    grupos = {}  # (tipo, variável ou campo) -> {campo: valores}
+    tipos_das_variaveis = dict((variavel, tipo) for tipo, variavel in
+                               re.findall(r'adicionarFato\(\s*"(\w+)",\s*(\w+)\s*,', codigo))
+    for variavel, campo, valor in re.findall(rf'\b(\w+)\.(\w+)\s*=\s*({_LITERAL})\s*;', codigo):
+        if variavel in tipos_das_variaveis:
+            juntar(grupos.setdefault((tipos_das_variaveis[variavel], variavel), {}), campo, _valor_js(valor))
+
+    for tipo, campo, expressao in re.findall(r'adicionarFato\(\s*"(\w+)",\s*\{\s*(\w+):\s*([^}]+?)\s*\}', codigo):
+        if re.fullmatch(_LITERAL, expressao):
+            valor = _valor_js(expressao)
+        elif expressao in numericas:
+            valor = None
+        elif expressao in opcoes:
+            valor = opcoes[expressao]
+        else:
+            continue
+        juntar(grupos.setdefault((tipo, campo), {}), campo, valor)
+
+    return [GrupoCampos(tipo, campos) for (tipo, _), campos in grupos.items()]
+
+
+def faixa_numerica(campo):
+    """Intervalo sorteado para um campo numérico: em volta dos limites usados pelas regras."""
+    if campo not in INDICE_FAIXAS.campos():
+        return 0.0, 100.0
+    pontos = INDICE_FAIXAS.campo(campo).pontos
+    margem = max((pontos[-1] - pontos[0]) / 2, abs(pontos[-1]) * 0.1, 1.0)
+    return pontos[0] - margem, pontos[-1] + margem
+
+
+def gerar_requisicao(rng, grupos, max_fatos=6):
+    """Um corpo de /diagnosticar com 1..max_fatos fatos sorteados do vocabulário."""
+    fatos = []
+    vistos = set()
+    for _ in range(rng.randint(1, max_fatos)):
+        grupo = rng.choice(grupos)
+        dados = {}
+        for campo in rng.sample(sorted(grupo.campos), rng.randint(1, len(grupo.campos))):
+            valores = grupo.campos[campo]
+            dados[campo] = round(rng.uniform(*faixa_numerica(campo)), 1) if valores is None else rng.choice(valores)
+        chave = json.dumps([grupo.tipo, dados], sort_keys=True)
+        if chave not in vistos:
+            vistos.add(chave)
+            fatos.append({'tipo': grupo.tipo, 'dados': dados})
+    return fatos
+
+
+def ler_log(caminho):
+    """Corpos de requisição de um log JSONL."""
+    corpos = []
+    with open(caminho, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            if linha.strip():
+                registro = json.loads(linha)
+                corpos.append(registro['fatos'] if isinstance(registro, dict) else registro)
+    return corpos
+
+
+# --- Alvos ---
+
+class AlvoFlask:
+    """O app no próprio processo, pelo cliente de teste do Flask."""
+
+    def __init__(self, diretorio, sem_cache=False):
+        if sem_cache:
+            os.environ['TAMANHO_CACHE'] = '0'
+        import app as modulo_app
+        from auditoria import ARQUIVO_JSON, ARQUIVO_TXT, EscritorAuditoria
+        modulo_app.auditoria.encerrar()
+        modulo_app.auditoria = EscritorAuditoria(os.path.join(diretorio, ARQUIVO_TXT),
+                                                 os.path.join(diretorio, ARQUIVO_JSON))
+        self._modulo = modulo_app
+        # coletar_resultados imprime o relatório; o custo do print continua medido
+        # (o andamento do teste vai para a saída de erro)
+        self._nulo = open(os.devnull, 'w')
+        self._saida = contextlib.redirect_stdout(self._nulo)
+        self._saida.__enter__()
+
+    def cliente(self):
+        cliente = self._modulo.app.test_client()
+
+        def enviar(corpo):
+            return cliente.post('/diagnosticar', data=corpo, content_type='application/json').status_code
+        return enviar
+
+    def estatisticas(self):
+        return self._modulo.app.test_client().get('/estatisticas').get_json()
+
+    def encerrar(self):
+        self._modulo.auditoria.encerrar()
+        self._saida.__exit__(None, None, None)
+        self._nulo.close()
+
+
+class AlvoHttp:
+    """Um servidor HTTP: o servidor.py iniciado aqui (url=None) ou um que já está rodando."""
+
+    def __init__(self, diretorio, url=None, workers=1, sem_cache=False, timeout=30.0):
+        self.timeout = timeout
+        self._processo = None
+        if url is None:
+            with socket.socket() as sonda:
+                sonda.bind(('127.0.0.1', 0))
+                porta = sonda.getsockname()[1]
+            ambiente = dict(os.environ, **({'TAMANHO_CACHE': '0'} if sem_cache else {}))
+            self._processo = subprocess.Popen(
+                [sys.executable, os.path.join(RAIZ, 'servidor.py'), '--workers', str(workers),
+                 '--host', '127.0.0.1', '--porta', str(porta), '--silencioso'],
+                cwd=diretorio, env=ambiente, stdout=subprocess.DEVNULL)
+            url = f'http://127.0.0.1:{porta}'
+        partes = urllib.parse.urlsplit(url)
+        self.url = url
+        self._host, self._porta = partes.hostname, partes.port or 80
+        self._esperar_servidor()
+
+    def _esperar_servidor(self, limite=60.0):
+        fim = time.monotonic() + limite
+        while True:
+            try:
+                self.estatisticas()
+                return
+            except OSError:
+                if self._processo is not None and self._processo.poll() is not None:
+                    raise RuntimeError("O servidor.py terminou antes de aceitar conexões.") from None
+                if time.monotonic() > fim:
+                    raise
+                time.sleep(0.2)
+
+    def _requisicao(self, conexao, metodo, caminho, corpo=None):
+        cabecalhos = {'Content-Type': 'application/json'} if corpo is not None else {}
+        conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+        resposta = conexao.getresponse()
+        return resposta.status, resposta.read()
+
+    def cliente(self):
+        estado = {'conexao': None}
+
+        def enviar(corpo):
+            # Conexão persistente por thread; refeita se o servidor a fechou
+            for tentativa in (1, 2):
+                if estado['conexao'] is None:
+                    estado['conexao'] = http.client.HTTPConnection(self._host, self._porta, timeout=self.timeout)
+                try:
+                    return self._requisicao(estado['conexao'], 'POST', '/diagnosticar', corpo)[0]
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    estado['conexao'].close()
+                    estado['conexao'] = None
+                    if tentativa == 2:
+                        raise
+        return enviar
+
+    def estatisticas(self):
+        conexao = http.client.HTTPConnection(self._host, self._porta, timeout=self.timeout)
+        try:
+            status, corpo = self._requisicao(conexao, 'GET', '/estatisticas')
+        finally:
+            conexao.close()
+        return json.loads(corpo) if status == 200 else None
+
+    def encerrar(self):
+        if self._processo is not None:
+            self._processo.send_signal(signal.SIGTERM)
+            try:
+                self._processo.wait(30)
+            except subprocess.TimeoutExpired:
+                self._processo.kill()
+
+
+# --- Execução em malha aberta ---
+
+def executar_etapa(alvo, corpos, taxa, duracao, conexoes, chegadas='constante', rng=None):
+    """
+    Envia taxa*duracao requisições nos horários previstos e mede cada uma.
+    `corpos(i)` devolve o corpo (bytes) da i-ésima requisição.
+    """
+    rng = rng or random.Random()
+    total = max(1, int(taxa * duracao))
+    fila = queue.Queue()
+    medidas = []  # (previsto, início do envio, fim, status ou None)
+
+    def trabalhador():
+        enviar = alvo.cliente()
+        while True:
+            item = fila.get()
+            if item is None:
+                return
+            previsto, corpo = item
+            inicio = time.perf_counter()
+            try:
+                status = enviar(corpo)
+            except Exception:
+                status = None  # Falha de conexão ou timeout
+            medidas.append((previsto, inicio, time.perf_counter(), status))
+
+    threads = [threading.Thread(target=trabalhador, daemon=True) for _ in range(conexoes)]
+    for thread in threads:
+        thread.start()
+
+    comeco = time.perf_counter() + 0.05
+    deslocamento = 0.0
+    for i in range(total):
+        previsto = comeco + deslocamento
+        espera = previsto - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        fila.put((previsto, corpos(i)))
+        deslocamento += rng.expovariate(taxa) if chegadas == 'poisson' else 1.0 / taxa
+    for _ in threads:
+        fila.put(None)
+    for thread in threads:
+        thread.join()
+
+    sucesso = [fim - previsto for previsto, _, fim, status in medidas if status is not None and status < 400]
+    erros = sum(1 for *_, status in medidas if status is None or status >= 400)
+    fim = max(medida[2] for medida in medidas)
+    vazao = len(sucesso) / (fim - comeco)
+    return {
+        'taxa': taxa,
+        'enviadas': total,
+        'sucesso': len(sucesso),
+        'erros': erros,
+        'taxa_erro': erros / total,
+        'status': dict(Counter(str(status) for *_, status in medidas)),
+        'vazao_por_s': vazao,
+        'latencia_ms': dict(percentis(sucesso), max=max(sucesso) * 1000) if sucesso else None,
+        # Quanto o envio atrasou em relação ao previsto (todas as conexões ocupadas)
+        'atraso_envio_ms': percentis([inicio - previsto for previsto, inicio, _, _ in medidas]),
+    }
+
+
+def executar(alvo, corpos, taxas, duracao, conexoes, chegadas='constante', semente=42,
+             max_erros=0.01, slo_p99_ms=1000.0, parar_na_saturacao=True):
+    rng = random.Random(semente)
+    enviar = alvo.cliente()
+    for i in range(20):
+        enviar(corpos(i))  # Aquecimento (fora das medidas)
+
+    etapas = []
+    for taxa in taxas:
+        etapa = executar_etapa(alvo, corpos, taxa, duracao, conexoes, chegadas, rng)
+        etapa['acompanhou'] = (etapa['vazao_por_s'] >= 0.95 * taxa and etapa['taxa_erro'] <= max_erros
+                               and etapa['latencia_ms'] is not None and etapa['latencia_ms']['p99'] <= slo_p99_ms)
+        etapa['estatisticas'] = alvo.estatisticas()
+        etapas.append(etapa)
+        imprimir_etapa(etapa)
+        if parar_na_saturacao and not etapa['acompanhou']:
+            break
+
+    acompanharam = [etapa for etapa in etapas if etapa['acompanhou']]
+    return {
+        'etapas': etapas,
+        'saturacao': {
+            'taxa': max((etapa['taxa'] for etapa in acompanharam), default=None),
+            'vazao_por_s': max((etapa['vazao_por_s'] for etapa in acompanharam), default=None),
+            'vazao_maxima_por_s': max(etapa['vazao_por_s'] for etapa in etapas),
+            'criterio': {'vazao_minima': 0.95, 'max_erros': max_erros, 'slo_p99_ms': slo_p99_ms},
+        },
+    }
+
+
+def imprimir_etapa(etapa):
+    latencia = etapa['latencia_ms'] or {'p50': float('nan'), 'p95': float('nan'), 'p99': float('nan')}
+    print(f"taxa {etapa['taxa']:>7.1f}/s  vazão {etapa['vazao_por_s']:>7.1f}/s  "
+          f"p50 {latencia['p50']:>8.1f} ms  p95 {latencia['p95']:>8.1f} ms  p99 {latencia['p99']:>8.1f} ms  "
+          f"erros {etapa['taxa_erro']:>6.1%}{'' if etapa['acompanhou'] else '  <-- saturado'}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--alvo', choices=('flask', 'http'), default='flask')
+    parser.add_argument('--url', help="Servidor já rodando (alvo http); sem ele o servidor.py é iniciado aqui")
+    parser.add_argument('--workers', type=int, default=1, help="Workers do servidor.py iniciado (alvo http)")
+    parser.add_argument('--taxas', type=float, nargs='+', default=[10, 20, 40, 80, 160, 320],
+                        help="Requisições por segundo de cada etapa")
+    parser.add_argument('--duracao', type=float, default=10.0, help="Segundos por etapa")
+    parser.add_argument('--chegadas', choices=('constante', 'poisson'), default='constante')
+    parser.add_argument('--conexoes', type=int, default=64, help="Requisições em andamento no máximo")
+    parser.add_argument('--log', help="Log JSONL de requisições para repetir (em vez do vocabulário)")
+    parser.add_argument('--distintas', type=int, default=0,
+                        help="Sorteia de N requisições distintas (exercita o cache); 0 = todas novas")
+    parser.add_argument('--gravar', help="Grava as requisições geradas num log JSONL")
+    parser.add_argument('--sem-cache', action='store_true', help="Desliga o cache de resultados (alvos locais)")
+    parser.add_argument('--slo-p99', type=float, default=1000.0, help="p99 máximo (ms) para contar como acompanhou")
+    parser.add_argument('--max-erros', type=float, default=0.01)
+    parser.add_argument('--todas', action='store_true', help="Roda todas as taxas, mesmo depois de saturar")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help="Arquivo JSON para gravar o relatório")
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    if args.log:
+        fonte = ler_log(args.log)
+        gerar = None
+    else:
+        grupos = vocabulario_frontend()
+        fonte = [gerar_requisicao(rng, grupos) for _ in range(args.distintas)]
+        gerar = (lambda i: gerar_requisicao(rng, grupos)) if not args.distintas else None
+    gravadas = open(args.gravar, 'w', encoding='utf-8') if args.gravar else None
+
+    def corpos(i):
+        if gerar is not None:
+            fatos = gerar(i)
+        elif args.log:
+            fatos = fonte[i % len(fonte)]
+        else:
+            fatos = rng.choice(fonte)
+        if gravadas is not None:
+            gravadas.write(json.dumps(fatos, ensure_ascii=False) + '\n')
+        return json.dumps(fatos).encode('utf-8')
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        if args.alvo == 'flask':
+            alvo = AlvoFlask(diretorio, sem_cache=args.sem_cache)
+        else:
+            alvo = AlvoHttp(diretorio, url=args.url, workers=args.workers, sem_cache=args.sem_cache)
+        try:
+            resultado = executar(alvo, corpos, args.taxas, args.duracao, args.conexoes, args.chegadas,
+                                 args.semente, args.max_erros, args.slo_p99, not args.todas)
+        finally:
+            alvo.encerrar()
+            if gravadas is not None:
+                gravadas.close()
+
+    saturacao = resultado['saturacao']
+    print(f"\nsaturação: {saturacao['vazao_por_s'] or 0:.1f}/s (taxa {saturacao['taxa'] or 0:g}/s), "
+          f"vazão máxima {saturacao['vazao_maxima_por_s']:.1f}/s", file=sys.stderr)
+
+    resultado['metadados'] = {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'maquina': platform.platform(),
+        'cpus': os.cpu_count(),
+        'alvo': args.alvo if not args.url else args.url,
+        'workers': args.workers if args.alvo == 'http' and not args.url else None,
+        'origem': args.log or 'static/app.js',
+        'distintas': args.distintas,
+        'cache': not args.sem_cache,
+        'duracao_etapa_s': args.duracao,
+        'chegadas': args.chegadas,
+        'conexoes': args.conexoes,
+        'semente': args.semente,
+    }
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
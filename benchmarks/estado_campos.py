@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compara duas formas de recuperar os campos (talhões) do monitoramento
+contínuo depois de um reinício: reenviar as leituras de cada campo (o
+motor declara tudo e roda de novo) contra restaurar o estado gravado por
+`MonitoramentoCampos.gravar_snapshot` (fatos e agenda, sem rodar regras).
+
+Mede o tempo por campo de cada forma, o tamanho do arquivo e confere que
+os campos restaurados têm as mesmas conclusões dos originais.
+
+Uso:
+    python -m benchmarks.estado_campos [--campos 200] [--leituras 3] [--semente 42]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from monitoramento_campos import MonitoramentoCampos
+from benchmarks.geradores import fatos_aleatorios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--campos', type=int, default=200)
+    parser.add_argument('--leituras', type=int, default=3, help='atualizações por campo')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    leituras = {f'campo-{i}': [fatos_aleatorios(rng) for _ in range(args.leituras)]
+                for i in range(args.campos)}
+    campos = list(leituras)
+
+    # Reenvio: como o monitor se recupera sem snapshot
+    original = MonitoramentoCampos(max_campos=args.campos)
+    inicio = time.perf_counter()
+    for campo_id in campos:
+        for fatos in leituras[campo_id]:
+            original.atualizar(campo_id, fatos)
+    tempo_reenvio = time.perf_counter() - inicio
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'campos.bin')
+        inicio = time.perf_counter()
+        gravado = original.gravar_snapshot(caminho)
+        tempo_gravacao = time.perf_counter() - inicio
+
+        restaurado = MonitoramentoCampos(max_campos=args.campos)
+        inicio = time.perf_counter()
+        restaurado.carregar_snapshot(caminho)
+        tempo_abertura = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for campo_id in campos:
+            restaurado._obter_campo(campo_id)  # Restaura sem aplicar leitura nova
+        tempo_restauracao = time.perf_counter() - inicio
+
+    divergentes = sum(original._campos[c].conclusoes.keys() != restaurado._campos[c].conclusoes.keys()
+                      for c in campos)
+
+    n = args.campos
+    print(f"{n} campos, {args.leituras} leituras por campo")
+    print(f"{'reenvio das leituras':<28} {tempo_reenvio / n * 1000:>8.2f} ms/campo")
+    print(f"{'restauração do snapshot':<28} {tempo_restauracao / n * 1000:>8.2f} ms/campo "
+          f"({tempo_reenvio / tempo_restauracao:.1f}x)")
+    print(f"{'abertura do arquivo':<28} {tempo_abertura * 1000:>8.2f} ms (todos os campos)")
+    print(f"{'gravação':<28} {tempo_gravacao / n * 1000:>8.2f} ms/campo")
+    print(f"{'arquivo':<28} {gravado['bytes'] / n:>8,.0f} bytes/campo")
+    print(f"campos com conclusões diferentes: {divergentes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Geradores de conjuntos de fatos sintéticos (formato [{tipo, dados}]) para
+os benchmarks: casos realistas e casos extremos da base de regras.
+"""
+
+import math
+import random
+
+import base_regras
+from dependencias_regras import TIPOS_ENTRADA
+from motor_diagnostico import CAMINHO_BASE_REGRAS
+
+
+def _s(**dados):
+    return {'tipo': 'Sintoma', 'dados': dados}
+
+
+def _c(**dados):
+    return {'tipo': 'Condicao', 'dados': dados}
+
+
+def _valor_dentro(intervalo, n=0):
+    """O n-ésimo (n < 3) de alguns valores distintos dentro da faixa, longe dos limites."""
+    if math.isinf(intervalo.minimo):
+        valor = intervalo.maximo - 1 - 0.5 * n
+    elif math.isinf(intervalo.maximo):
+        valor = intervalo.minimo + 1 + 0.5 * n
+    else:
+        valor = intervalo.minimo + (intervalo.maximo - intervalo.minimo) * (n + 1) / 4
+    assert intervalo.contem(valor), (intervalo, valor)
+    return valor
+
+
+def _dados_do_padrao(campos, n=0):
+    dados = {}
+    for campo, valor in campos.items():
+        if isinstance(valor, dict):
+            (tipo_faixa, limite), = valor.items()
+            valor = _valor_dentro(base_regras.FAIXAS[tipo_faixa](limite), n)
+        dados[campo] = valor
+    return dados
+
+
+def _tipos_do_padrao(padrao):
+    (tipo, campos), = padrao.items()
+    return set().union(*map(_tipos_do_padrao, campos)) if tipo == 'ou' else {tipo}
+
+
+def _gatilhos(regras, nome, n=0):
+    """
+    Fatos de entrada mínimos que disparam a regra: um fato por padrão do 'se'
+    (a primeira alternativa de um 'ou') e, para padrões de fatos que só as
+    regras declaram, os gatilhos da regra que declara um fato que casa.
+    """
+    fatos = []
+    for padrao in regras[nome]['se']:
+        (tipo, campos), = padrao.items()
+        if tipo == 'ou':
+            (tipo, campos), = campos[0].items()
+        if tipo in TIPOS_ENTRADA:
+            fatos.append({'tipo': tipo, 'dados': _dados_do_padrao(campos, n)})
+            continue
+        origem = next(outra for outra, regra in regras.items()
+                      if tipo in regra.get('declarar', {})
+                      and all(regra['declarar'][tipo].get(campo) == valor for campo, valor in campos.items()))
+        fatos.extend(_gatilhos(regras, origem, n))
+    return fatos
+
+
+# Fatos mínimos que disparam cada regra, tirados da base de regras carregada
+# pelo motor (BASE_REGRAS): os limiares das faixas nunca ficam duplicados aqui
+_REGRAS = {regra['nome']: regra for regra in base_regras.ler_base(CAMINHO_BASE_REGRAS)['regras']}
+GATILHOS_POR_REGRA = {nome: _gatilhos(_REGRAS, nome) for nome in _REGRAS}
+
+# Grupos na ordem do arquivo da base
+GRUPOS_DE_REGRAS = {
+    'gestao_hidrica': list(GATILHOS_POR_REGRA)[0:7],
+    'nutricional': list(GATILHOS_POR_REGRA)[7:14],
+    'doencas_e_pragas': list(GATILHOS_POR_REGRA)[14:21],
+    'ambiental': list(GATILHOS_POR_REGRA)[21:30],
+}
+
+
+def _unir(*listas):
+    """Junta listas de fatos sem repetir fatos iguais (o motor descartaria)."""
+    vistos = set()
+    fatos = []
+    for lista in listas:
+        for fato in lista:
+            chave = (fato['tipo'], tuple(sorted(fato['dados'].items())))
+            if chave not in vistos:
+                vistos.add(chave)
+                fatos.append(fato)
+    return fatos
+
+
+def fatos_nenhuma_regra(rng=None):
+    """Fatos plausíveis que não disparam nenhuma regra."""
+    return [_c(temperatura_ar=22), _c(umidade_ar=55), _c(ph_solo=6.5), _c(velocidade_vento=12),
+            _c(sensor_umidade_solo=55), _c(tipo_solo='arenoso'), _c(solo_umido='umido'),
+            _c(temperatura_solo=16), _s(local='folhas_velhas', cor='verde_normal')]
+
+
+def fatos_grupo(nome, rng=None):
+    """Fatos que disparam todas as regras de um grupo."""
+    return _unir(*(GATILHOS_POR_REGRA[regra] for regra in GRUPOS_DE_REGRAS[nome]))
+
+
+def fatos_todas_as_regras(rng=None):
+    """Pior caso de disparos: todas as regras da base ao mesmo tempo."""
+    return _unir(*GATILHOS_POR_REGRA.values())
+
+
+def fatos_encadeados(rng=None):
+    """
+    Pior caso de encadeamento: os gatilhos das regras que declaram fatos e
+    das que dependem deles, com três leituras diferentes para cada padrão.
+    """
+    declarados = {tipo for regra in _REGRAS.values() for tipo in regra.get('declarar', {})}
+    nomes = [nome for nome, regra in _REGRAS.items()
+             if 'declarar' in regra or any(_tipos_do_padrao(padrao) & declarados for padrao in regra['se'])]
+    return _unir(*(_gatilhos(_REGRAS, nome, n) for n in range(3) for nome in nomes))
+
+
+# Vocabulário usado pelo gerador realista (valores como os do frontend)
+_SINTOMAS = [
+    ('local', ['folhas_velhas', 'folhas_novas']),
+    ('cor', ['amarelada_uniforme', 'verde_escura_com_tons_arroxeados', 'amarelada_entre_nervuras',
+             'amarelada_uniforme_completa']),
+    ('aspecto', ['bordas_queimadas_e_secas', 'deformadas_ou_retorcidas']),
+    ('observacao', ['po_branco_nas_folhas', 'substancia_pegajosa_escura_nas_folhas',
+                    'furos_irregulares_nas_folhas', 'folhas_com_pontilhados_prateados_ou_amarelados']),
+    ('observacao_inseto', ['pequenos_insetos_verdes_ou_pretos_agrupados']),
+    ('planta_aparencia', ['murcha_pela_manha', 'murcha_pela_tarde']),
+]
+_CONDICOES_NUMERICAS = {
+    'temperatura_ar': (-5, 45), 'umidade_ar': (20, 100), 'ph_solo': (4.0, 9.0),
+    'velocidade_vento': (0, 90), 'sensor_umidade_solo': (0, 80), 'temperatura_solo': (0, 35),
+}
+_CONDICOES_CATEGORICAS = {
+    'tipo_solo': ['arenoso', 'argiloso'], 'solo_umido': ['seco', 'umido', 'encharcado'],
+    'previsao_tempo': ['geada_iminente', 'calor_iminente', 'chuva_forte_ou_granizo'],
+    'clima': ['seco_e_quente'], 'periodo_chuvoso': [True], 'historico_area': ['alta_incidencia_fungica'],
+    'estacao_ano': ['inicio_primavera'], 'cultura_estagio': ['floracao'],
+}
+
+
+def fatos_aleatorios(rng=None):
+    """Caso realista: alguns sintomas e um punhado de leituras/condições."""
+    rng = rng or random.Random()
+    fatos = []
+    for _ in range(rng.randint(0, 2)):
+        campos = rng.sample(_SINTOMAS, rng.randint(1, 2))
+        fatos.append(_s(**{campo: rng.choice(valores) for campo, valores in campos}))
+    for campo in rng.sample(sorted(_CONDICOES_NUMERICAS), rng.randint(1, 4)):
+        minimo, maximo = _CONDICOES_NUMERICAS[campo]
+        fatos.append(_c(**{campo: round(rng.uniform(minimo, maximo), 1)}))
+    for campo in rng.sample(sorted(_CONDICOES_CATEGORICAS), rng.randint(0, 3)):
+        fatos.append(_c(**{campo: rng.choice(_CONDICOES_CATEGORICAS[campo])}))
+    return _unir(fatos)
+
+
+# Cenários: nome -> função(rng) que devolve um conjunto de fatos
+CENARIOS = {
+    'nenhuma_regra': fatos_nenhuma_regra,
+    'realista': fatos_aleatorios,
+    **{f'grupo_{nome}': (lambda rng=None, nome=nome: fatos_grupo(nome, rng)) for nome in GRUPOS_DE_REGRAS},
+    'todas_as_regras': fatos_todas_as_regras,
+    'encadeado': fatos_encadeados,
+}
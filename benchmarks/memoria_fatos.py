@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compara a memória por campo (talhão) com motores vivos: fatos `Fact` comuns
+(como antes, com as strings de cada JSON recebido) contra os fatos
+compactos (`FatoCompacto` + vocabulário da base de regras).
+
+Cada campo recebe um conjunto realista de fatos (chegando como JSON) e
+roda o motor; mede-se a memória do motor vazio (rede Rete) e a da memória
+de trabalho que fica viva depois do diagnóstico.
+
+Uso:
+    python -m benchmarks.memoria_fatos [--campos 50] [--semente 42]
+"""
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from experta import AS, Fact, Rule
+
+import base_regras
+from motor_diagnostico import CAMINHO_BASE_REGRAS, MotorDiagnosticoAgricola, TIPOS_FATO, novo_fato
+from benchmarks.geradores import fatos_aleatorios
+
+
+class MotorMedicao(MotorDiagnosticoAgricola):
+    """Motor atual sem o relatório impresso."""
+
+    @Rule(AS.f_acao << Fact(acao='buscar_solucao'),
+          salience=-100)
+    def coletar_resultados(self, f_acao):
+        self.retract(f_acao)
+
+
+# Tipos de fato como eram antes (Fact comum) e o motor com as regras compiladas para eles
+class SintomaLegado(Fact):
+    pass
+class CondicaoLegado(Fact):
+    pass
+class DiagnosticoLegado(Fact):
+    pass
+class AlertaLegado(Fact):
+    pass
+
+TIPOS_LEGADOS = {'Sintoma': SintomaLegado, 'Condicao': CondicaoLegado,
+                 'Diagnostico': DiagnosticoLegado, 'Alerta': AlertaLegado}
+
+MotorMedicaoLegado = type('MotorMedicaoLegado', (MotorMedicao,), dict(
+    base_regras.compilar_regras(base_regras.ler_base(CAMINHO_BASE_REGRAS), TIPOS_LEGADOS)))
+
+
+def _fato_legado(tipo, dados):
+    return TIPOS_LEGADOS[tipo](**dados)
+
+
+def _fato_compacto(tipo, dados):
+    return novo_fato(TIPOS_FATO[tipo], dados)
+
+
+def medir(classe_motor, criar_fato, casos):
+    """Bytes por campo do motor vazio e da memória de trabalho após o diagnóstico."""
+    gc.collect()
+    tracemalloc.start()
+    motores = []
+    for _ in casos:
+        engine = classe_motor()
+        engine.reset()
+        motores.append(engine)
+    depois_motores = tracemalloc.get_traced_memory()[0]
+
+    total_fatos = 0
+    for engine, caso in zip(motores, casos):
+        for fato in json.loads(caso):  # Como chega na requisição: strings novas a cada JSON
+            engine.declare(criar_fato(fato['tipo'], fato['dados']))
+        engine.run()
+        total_fatos += len(engine.facts)
+    gc.collect()
+    depois_fatos = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    campos = len(casos)
+    return {
+        'motor': depois_motores / campos,
+        'memoria_trabalho': (depois_fatos - depois_motores) / campos,
+        'fatos_por_campo': total_fatos / campos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--campos', type=int, default=50)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    casos = [json.dumps(fatos_aleatorios(rng)) for _ in range(args.campos)]
+
+    legado = medir(MotorMedicaoLegado, _fato_legado, casos)
+    compacto = medir(MotorMedicao, _fato_compacto, casos)
+
+    print(f"{args.campos} campos, {compacto['fatos_por_campo']:.1f} fatos por campo (média)")
+    print(f"{'bytes por campo':<28} {'Fact':>10} {'compacto':>10} {'ganho':>7}")
+    for nome, chave in (('memória de trabalho', 'memoria_trabalho'), ('motor vazio (rede Rete)', 'motor')):
+        print(f"{nome:<28} {legado[chave]:>10,.0f} {compacto[chave]:>10,.0f} "
+              f"{legado[chave] / compacto[chave]:>6.2f}x")
+    por_fato = [medida['memoria_trabalho'] / medida['fatos_por_campo'] for medida in (legado, compacto)]
+    print(f"{'memória de trabalho por fato':<28} {por_fato[0]:>10,.0f} {por_fato[1]:>10,.0f} "
+          f"{por_fato[0] / por_fato[1]:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
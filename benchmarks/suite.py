@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Suíte de benchmarks da base de regras.
+
+Mede, para cada cenário de fatos (benchmarks/geradores.py), a construção
+do motor e o diagnóstico pelo mesmo caminho do /diagnosticar (reset +
+`diagnosticar_fatos`), que dá o total e a vazão. À parte, detalha as etapas
+de `diagnosticar_fatos`: alcance no índice de dependências, declaração dos
+fatos alcançados, run e formatação. Reporta p50/p95/p99, vazão e pico de
+memória e grava os números em JSON para comparar com uma base salva.
+
+Uso:
+    python -m benchmarks.suite [--repeticoes 300] [--cenarios realista todas_as_regras]
+                               [--saida resultado.json] [--base base.json] [--tolerancia 0.15]
+
+Com --base, sai com código 1 se algum p50 piorar mais que a tolerância.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from importlib import metadata
+
+from motor_diagnostico import (INDICE_DEPENDENCIAS, MotorDiagnosticoAgricola, coletar_resultados_formatados,
+                               declarar_fatos, diagnosticar_fatos)
+from benchmarks.geradores import CENARIOS
+
+FASES = ('reset', 'diagnostico', 'total')
+# Etapas de diagnosticar_fatos, medidas numa passada à parte
+ETAPAS = ('alcance', 'declaracao', 'run', 'formatacao')
+
+
+def percentis(amostras_s):
+    """p50/p95/p99/média (em ms) de uma lista de tempos em segundos."""
+    ordenadas = sorted(amostras_s)
+    n = len(ordenadas)
+
+    def p(q):
+        return ordenadas[min(n - 1, int(round(q * (n - 1))))] * 1000
+
+    return {'p50': p(0.50), 'p95': p(0.95), 'p99': p(0.99),
+            'media': sum(ordenadas) / n * 1000, 'n': n}
+
+
+@contextlib.contextmanager
+def _sem_saida():
+    # coletar_resultados imprime o relatório; o custo do print continua medido
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+def medir_construcao(repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        MotorDiagnosticoAgricola()
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    MotorDiagnosticoAgricola()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'construcao': percentis(tempos), 'pico_memoria_kb': pico / 1024}
+
+
+def _ciclo(engine, fatos):
+    """Um diagnóstico completo pelo caminho de produção, retornando o tempo de cada fase."""
+    t0 = time.perf_counter()
+    engine.reset()
+    t1 = time.perf_counter()
+    diagnosticar_fatos(engine, fatos)
+    t2 = time.perf_counter()
+    return {'reset': t1 - t0, 'diagnostico': t2 - t1, 'total': t2 - t0}
+
+
+def _etapas(engine, fatos):
+    """Os passos de diagnosticar_fatos, um a um (depois do reset)."""
+    engine.reset()
+    t0 = time.perf_counter()
+    alcancados = INDICE_DEPENDENCIAS.alcance(fatos).fatos
+    t1 = time.perf_counter()
+    declarar_fatos(engine, alcancados)
+    t2 = time.perf_counter()
+    engine.run()
+    t3 = time.perf_counter()
+    coletar_resultados_formatados(engine)
+    t4 = time.perf_counter()
+    return {'alcance': t1 - t0, 'declaracao': t2 - t1, 'run': t3 - t2, 'formatacao': t4 - t3}
+
+
+def medir_cenario(gerador, repeticoes, semente=42):
+    rng = random.Random(semente)
+    conjuntos = [gerador(rng) for _ in range(repeticoes)]
+    engine = MotorDiagnosticoAgricola()
+
+    tempos = {fase: [] for fase in FASES + ETAPAS}
+    with _sem_saida():
+        _ciclo(engine, conjuntos[0])  # Aquecimento
+        for fatos in conjuntos:
+            for fase, duracao in _ciclo(engine, fatos).items():
+                tempos[fase].append(duracao)
+        for fatos in conjuntos:
+            for etapa, duracao in _etapas(engine, fatos).items():
+                tempos[etapa].append(duracao)
+
+        # Pico de memória de um ciclo (à parte: o tracemalloc distorce os tempos)
+        tracemalloc.start()
+        for fatos in conjuntos[:20]:
+            _ciclo(engine, fatos)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    resultado = {fase: percentis(amostras) for fase, amostras in tempos.items()}
+    resultado['vazao_por_s'] = repeticoes / sum(tempos['total'])
+    resultado['fatos_por_conjunto'] = sum(len(f) for f in conjuntos) / len(conjuntos)
+    resultado['pico_memoria_kb'] = pico / 1024
+    return resultado
+
+
+def executar(cenarios, repeticoes):
+    try:
+        versao_experta = metadata.version('experta')
+    except metadata.PackageNotFoundError:
+        versao_experta = None
+
+    return {
+        'metadados': {
+            'data': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'experta': versao_experta,
+            'maquina': platform.platform(),
+            'repeticoes': repeticoes,
+        },
+        'motor': medir_construcao(max(10, repeticoes // 10)),
+        'cenarios': {nome: medir_cenario(CENARIOS[nome], repeticoes) for nome in cenarios},
+    }
+
+
+def comparar(atual, base, tolerancia):
+    """Compara os p50 com a base; retorna a lista de regressões."""
+    pares = [('motor', 'construcao', atual['motor']['construcao'], base.get('motor', {}).get('construcao'))]
+    for nome, cenario in atual['cenarios'].items():
+        cenario_base = base.get('cenarios', {}).get(nome, {})
+        for fase in FASES + ETAPAS:
+            pares.append((nome, fase, cenario[fase], cenario_base.get(fase)))
+
+    regressoes = []
+    print(f"\n{'cenário':<28} {'fase':<11} {'base p50':>10} {'atual p50':>10} {'variação':>9}")
+    for nome, fase, medida, medida_base in pares:
+        if not medida_base:
+            continue
+        variacao = medida['p50'] / medida_base['p50'] - 1 if medida_base['p50'] else 0.0
+        marca = ''
+        if variacao > tolerancia:
+            marca = '  <-- REGRESSÃO'
+            regressoes.append((nome, fase, variacao))
+        print(f"{nome:<28} {fase:<11} {medida_base['p50']:>10.3f} {medida['p50']:>10.3f} {variacao:>+8.1%}{marca}")
+    return regressoes
+
+
+def imprimir(resultado):
+    construcao = resultado['motor']['construcao']
+    print(f"Construção do motor: p50={construcao['p50']:.2f} ms p95={construcao['p95']:.2f} ms "
+          f"p99={construcao['p99']:.2f} ms, pico={resultado['motor']['pico_memoria_kb']:.0f} KB")
+    print(f"\n{'cenário':<28} {'fase':<11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for nome, cenario in resultado['cenarios'].items():
+        for fase in FASES + ETAPAS:
+            m = cenario[fase]
+            print(f"{nome:<28} {fase:<11} {m['p50']:>8.3f} {m['p95']:>8.3f} {m['p99']:>8.3f}")
+        print(f"{'':<28} vazão={cenario['vazao_por_s']:.0f}/s pico={cenario['pico_memoria_kb']:.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks da base de regras")
+    parser.add_argument('--repeticoes', type=int, default=300)
+    parser.add_argument('--cenarios', nargs='+', choices=sorted(CENARIOS), default=list(CENARIOS))
+    parser.add_argument('--saida', help="Arquivo JSON para gravar os resultados")
+    parser.add_argument('--base', help="Resultado JSON salvo para comparação")
+    parser.add_argument('--tolerancia', type=float, default=0.15,
+                        help="Piora relativa de p50 aceita antes de acusar regressão (padrão: 0.15)")
+    args = parser.parse_args()
+
+    resultado = executar(args.cenarios, args.repeticoes)
+    imprimir(resultado)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(resultado, base, args.tolerancia)
+        if regressoes:
+            print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import motor_diagnostico
+
+# Tipos de fato que o motor realmente declara (os demais são ignorados)
+TIPOS_DECLARADOS = ('Sintoma', 'Condicao')
+
+
+class CacheResultados:
+    """
+    Cache LRU com TTL para os resultados de `diagnosticar`.
+
+    A chave é um hash canônico (independente da ordem) dos fatos
+    Sintoma/Condicao declarados. Campos numéricos podem ser agrupados em
+    faixas (ex: {'temperatura_ar': 0.5}) para aumentar os acertos, ao custo
+    de tratar como iguais leituras dentro da mesma faixa.
+
+    A chave inclui a versão da base de regras carregada pelo processo (a
+    que está compilada no motor), não a do arquivo em disco: uma base nova
+    só vale depois de reiniciar o processo, e aí as chaves já são outras.
+    """
+
+    def __init__(self, tamanho=1024, ttl=300, faixas=None, versao_regras=motor_diagnostico.VERSAO_BASE_REGRAS):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.faixas = dict(faixas or {})
+        self._itens = OrderedDict()  # chave -> (expira_em, resultados)
+        self._lock = threading.Lock()
+        self.versao_regras = versao_regras
+
+        # Contadores
+        self.acertos = 0
+        self.faltas = 0
+        self.remocoes = 0  # Saídas por LRU (cache cheio)
+        self.expiracoes = 0  # Saídas por TTL
+
+    # --- Chave canônica ---
+
+    def _normalizar_valor(self, campo, valor):
+        largura = self.faixas.get(campo)
+        if largura and isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            return math.floor(valor / largura) * largura
+        return valor
+
+    def chave(self, fatos_json):
+        """Hash canônico dos fatos: mesma combinação em qualquer ordem gera a mesma chave."""
+        fatos = set()
+        for fato_info in fatos_json:
+            tipo_fato = fato_info.get('tipo')
+            if tipo_fato not in TIPOS_DECLARADOS:
+                continue
+            dados = {campo: self._normalizar_valor(campo, valor)
+                     for campo, valor in fato_info.get('dados', {}).items()}
+            # Fatos repetidos são descartados pelo motor, então o conjunto basta
+            fatos.add(json.dumps([tipo_fato, dados], sort_keys=True, ensure_ascii=False))
+
+        conteudo = json.dumps([self.versao_regras, sorted(fatos)], ensure_ascii=False)
+        return hashlib.blake2b(conteudo.encode('utf-8'), digest_size=16).hexdigest()
+
+    # --- Leitura e escrita ---
+
+    def obter(self, chave):
+        """Retorna os resultados guardados para a chave ou None."""
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.faltas += 1
+                return None
+
+            expira_em, resultados = item
+            if expira_em <= agora:
+                del self._itens[chave]
+                self.expiracoes += 1
+                self.faltas += 1
+                return None
+
+            self._itens.move_to_end(chave)  # Marca como usado recentemente
+            self.acertos += 1
+            return resultados
+
+    def guardar(self, chave, resultados):
+        if self.tamanho <= 0:
+            return
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, resultados)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)  # Remove o menos usado
+                self.remocoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'tamanho': self.tamanho,
+                'itens': len(self._itens),
+                'ttl': self.ttl,
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'remocoes': self.remocoes,
+                'expiracoes': self.expiracoes,
+                'versao_regras': self.versao_regras,
+            }
+
+
+def faixas_do_ambiente(texto):
+    """Converte 'temperatura_ar:0.5,umidade_ar:1' em {'temperatura_ar': 0.5, 'umidade_ar': 1.0}."""
+    faixas = {}
+    for item in filter(None, (parte.strip() for parte in (texto or '').split(','))):
+        campo, largura = item.split(':')
+        faixas[campo.strip()] = float(largura)
+    return faixas
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Catálogo pré-compilado dos resultados formatados, por regra.
+
+Os textos de saída são fixos nas regras da base, então cada resultado é
+formatado uma única vez na importação: o dict que vai para o frontend e o
+seu fragmento JSON (nos dois formatos do `jsonify`: compacto e indentado).
+Uma resposta é montada a partir das entradas das regras que dispararam,
+concatenando os fragmentos, com os mesmos bytes que o `jsonify` geraria.
+
+Os dicts do catálogo são compartilhados entre as respostas: não devem ser
+modificados.
+"""
+
+import hashlib
+import json
+from collections import namedtuple
+
+# Mesmas opções do provedor JSON padrão do Flask (jsonify)
+_OPCOES_JSON = {'ensure_ascii': True, 'sort_keys': True}
+_CAMPOS_RESULTADO = ('causa', 'risco', 'recomendacao', 'recomendacao_controle', 'recomendacao_corretiva')
+_CAMPOS_DIAGNOSTICO = ('causa', 'recomendacao', 'recomendacao_controle', 'recomendacao_corretiva')
+
+
+def formatar_texto(texto):
+    """
+    Formata o texto interno do motor para algo legível.
+    Ex: 'deficiencia_de_magnesio_(Mg)' vira 'Deficiencia de magnesio (mg)'
+    """
+    if not texto:
+        return None # Retorna None se o texto for vazio
+
+    # Primeiro, substitui underscores
+    texto_formatado = texto.replace('_', ' ')
+
+    # Coloca em maiúscula apenas a primeira letra da string inteira
+    return texto_formatado.capitalize()
+
+
+def _formatar(tipo, dados, campos):
+    formatado = {'tipo': tipo}
+    formatado.update((campo, formatar_texto(dados.get(campo))) for campo in campos)
+    # Remove chaves que são None (limpa o JSON)
+    return {k: v for k, v in formatado.items() if v is not None}
+
+
+class EntradaCatalogo(namedtuple('EntradaCatalogo', ['chave', 'resultado', 'causa', 'json_compacto', 'json_indentado'])):
+    """Um resultado formatado e seus fragmentos JSON prontos."""
+
+    @classmethod
+    def criar(cls, chave, resultado):
+        json_indentado = json.dumps([resultado], indent=2, **_OPCOES_JSON)[2:-2]  # Sem o "[\n" e o "\n]"
+        json_compacto = json.dumps(resultado, separators=(',', ':'), **_OPCOES_JSON)
+        return cls(chave, resultado, resultado.get('causa'), json_compacto, json_indentado)
+
+
+class CatalogoResultados:
+    """
+    Entradas por regra: o resultado acumulado por uma regra `acumular` e o
+    Diagnostico declarado por uma regra `declarar` (achado pelo conteúdo do fato).
+    """
+
+    def __init__(self, regras):
+        self._por_regra = {}
+        self._por_diagnostico = {}
+        for nome, regra in regras.items():
+            acao = regra._wrapped
+            if acao.modo == 'acumular':
+                self._por_regra[nome] = EntradaCatalogo.criar(
+                    nome, _formatar(acao.tipo, acao.dados, _CAMPOS_RESULTADO))
+            elif acao.tipo == 'Diagnostico' and formatar_texto(acao.dados.get('causa')):
+                chave = frozenset(acao.classe_fato(**acao.dados).items())
+                self._por_diagnostico[chave] = EntradaCatalogo.criar(
+                    nome, _formatar('Diagnostico', acao.dados, _CAMPOS_DIAGNOSTICO))
+
+    def __len__(self):
+        return len(self._por_regra) + len(self._por_diagnostico)
+
+    def resultado(self, res):
+        """Entrada de um item de `engine.resultados` (formatada na hora se não for do catálogo)."""
+        entrada = self._por_regra.get(getattr(res, 'regra', None))
+        if entrada is None:
+            entrada = EntradaCatalogo.criar(None, _formatar(res.get('tipo'), res, _CAMPOS_RESULTADO))
+        return entrada
+
+    def diagnostico(self, fato):
+        """Entrada de um fato Diagnostico da memória de trabalho (None se não tiver causa)."""
+        try:
+            entrada = self._por_diagnostico.get(frozenset(
+                (k, v) for k, v in fato.items() if not fato.is_special(k)))
+        except TypeError:
+            entrada = None  # Valor não hashable: não é um fato declarado pela base
+        if entrada is None and formatar_texto(fato.get('causa')):
+            entrada = EntradaCatalogo.criar(None, _formatar('Diagnostico', fato, _CAMPOS_DIAGNOSTICO))
+        return entrada
+
+
+class ResultadosFormatados(list):
+    """
+    Lista de resultados formatados (pode ser usada como a lista de sempre)
+    que guarda as entradas do catálogo para gerar o JSON e o ETag sem
+    serializar de novo. `interrupcao` indica resultados parciais (o motor
+    parou por orçamento).
+    """
+
+    __slots__ = ('entradas', 'interrupcao', '_corpos')
+
+    def __init__(self, entradas, interrupcao=None):
+        super().__init__(entrada.resultado for entrada in entradas)
+        self.entradas = tuple(entradas)
+        self.interrupcao = interrupcao
+        self._corpos = {}
+
+    def json(self, indentado=False):
+        """(corpo, etag): os mesmos bytes do jsonify (sem o "\\n" final) e o hash deles."""
+        corpo = self._corpos.get(indentado)
+        if corpo is None:
+            if not self.entradas:
+                texto = '[]'
+            elif indentado:
+                texto = '[\n' + ',\n'.join(entrada.json_indentado for entrada in self.entradas) + '\n]'
+            else:
+                texto = '[' + ','.join(entrada.json_compacto for entrada in self.entradas) + ']'
+            corpo = self._corpos[indentado] = (texto, hashlib.blake2b(texto.encode(), digest_size=16).hexdigest())
+        return corpo
+
+    def __reduce__(self):
+        # Entre processos (diagnóstico em lote) vai como uma lista comum
+        return list, (list(self),)
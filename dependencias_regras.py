@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Índice de dependências das regras, montado a partir dos padrões (LHS) da base.
+
+Cada padrão {Tipo: {campo: valor}} é indexado por (tipo, campo, valor) e,
+nas faixas, por (tipo, campo) + posição da faixa no `INDICE_FAIXAS`: um
+fato é mapeado para todos os padrões que satisfaz com uma busca por campo.
+Com isso:
+
+- `alcance(fatos)`: as regras que podem disparar com esses fatos (incluindo
+  as encadeadas por fatos que outras regras declaram) e os fatos que
+  alimentam alguma delas. O motor declara só esses fatos, então as regras
+  sem os campos necessários nem chegam a ser avaliadas.
+- `proximas_perguntas(fatos)`: os campos ainda não respondidos que podem
+  mudar o resultado (fazer disparar uma regra que ainda não disparou).
+
+A base não tem negação nem variáveis ligando padrões, então "todos os
+padrões satisfeitos" é exatamente "a regra dispara".
+"""
+
+from collections import namedtuple
+
+from base_regras import FAIXAS
+from faixas import INDICE_FAIXAS, Intervalo
+
+# Tipos de fato que vêm do usuário (os demais só são declarados por regras)
+TIPOS_ENTRADA = ('Sintoma', 'Condicao')
+
+# Tipos em que cada campo tem um valor só (estado do ambiente); sintomas podem se acumular
+TIPOS_VALOR_UNICO = ('Condicao',)
+
+Alcance = namedtuple('Alcance', ['regras', 'fatos'])
+
+
+class _Padrao(namedtuple('_Padrao', ['tipo', 'restricoes'])):
+    """Um padrão da base: tipo do fato e {campo: valor literal ou Intervalo}."""
+
+    def aceita(self, campo, valor):
+        """O valor (de um campo já respondido) é compatível com a restrição do padrão?"""
+        esperado = self.restricoes.get(campo)
+        if isinstance(esperado, Intervalo):
+            try:
+                return esperado.contem(valor)
+            except TypeError:
+                return False
+        return esperado == valor
+
+
+class IndiceDependencias:
+    """Padrões e regras da base indexados por campo e valor."""
+
+    def __init__(self, base, indice=INDICE_FAIXAS):
+        self.indice = indice
+        self._padroes = []  # id -> _Padrao
+        self._por_valor = {}  # (tipo, campo, valor) -> [ids]
+        self._por_faixa = {}  # (tipo, campo) -> {posição da faixa: [ids]}
+        self._regras = {}  # nome -> [alternativas (ids) de cada padrão do 'se']
+        self._declara = {}  # nome -> ids dos padrões satisfeitos pelo fato que a regra declara
+        for regra in base.get('regras', []):
+            self._regras[regra['nome']] = [self._alternativas(padrao) for padrao in regra['se']]
+        for regra in base.get('regras', []):
+            if 'declarar' in regra:
+                (tipo, dados), = regra['declarar'].items()
+                self._declara[regra['nome']] = self._padroes_do_fato(tipo, dados)
+
+    def _alternativas(self, padrao):
+        (tipo, campos), = padrao.items()
+        if tipo == 'ou':
+            return frozenset().union(*(self._alternativas(alternativa) for alternativa in campos))
+        restricoes = {}
+        for campo, valor in campos.items():
+            if isinstance(valor, dict):
+                (tipo_faixa, limite), = valor.items()
+                valor = FAIXAS[tipo_faixa](limite)
+                posicao = self.indice.teste(campo, valor).posicao
+                self._por_faixa.setdefault((tipo, campo), {}).setdefault(posicao, []).append(len(self._padroes))
+            else:
+                self._por_valor.setdefault((tipo, campo, valor), []).append(len(self._padroes))
+            restricoes[campo] = valor
+        self._padroes.append(_Padrao(tipo, restricoes))
+        return frozenset([len(self._padroes) - 1])
+
+    def regras(self):
+        return list(self._regras)
+
+    def _padroes_do_fato(self, tipo, dados):
+        """Ids dos padrões que o fato satisfaz (todas as restrições do padrão casam)."""
+        acertos = {}
+        for campo, valor in dados.items():
+            for i in self._por_valor.get((tipo, campo, valor), ()):
+                acertos[i] = acertos.get(i, 0) + 1
+            faixas = self._por_faixa.get((tipo, campo))
+            if faixas:
+                for posicao in self.indice.faixas_de(campo, valor):
+                    for i in faixas.get(posicao, ()):
+                        acertos[i] = acertos.get(i, 0) + 1
+        return frozenset(i for i, n in acertos.items() if n == len(self._padroes[i].restricoes))
+
+    def _padroes_dos_fatos(self, fatos_json):
+        """[(fato, ids dos padrões ou None se o fato não puder ser avaliado aqui)] dos fatos de entrada."""
+        avaliados = []
+        for fato in fatos_json:
+            if not isinstance(fato, dict):
+                avaliados.append((fato, None))  # Malformado: fica com o motor (que decide o erro)
+                continue
+            tipo = fato.get('tipo')
+            if tipo not in TIPOS_ENTRADA:
+                continue  # O motor também ignora
+            dados = fato.get('dados', {})
+            try:
+                hash(frozenset(dados.items()))
+                padroes = self._padroes_do_fato(tipo, dados)
+            except (AttributeError, TypeError):
+                padroes = None
+            avaliados.append((fato, padroes))
+        return avaliados
+
+    def _fechamento(self, satisfeitos):
+        """Regras que disparam a partir dos padrões satisfeitos (com encadeamento)."""
+        satisfeitos = set(satisfeitos)
+        disparam = set()
+        mudou = True
+        while mudou:
+            mudou = False
+            for nome, padroes in self._regras.items():
+                if nome not in disparam and all(alternativas & satisfeitos for alternativas in padroes):
+                    disparam.add(nome)
+                    satisfeitos.update(self._declara.get(nome, ()))
+                    mudou = True
+        return disparam
+
+    def alcance(self, fatos_json):
+        """Regras que disparam com os fatos e os fatos que alimentam alguma delas (na ordem)."""
+        avaliados = self._padroes_dos_fatos(fatos_json)
+        regras = self._fechamento(i for _, padroes in avaliados if padroes for i in padroes)
+        usados = {i for nome in regras for alternativas in self._regras[nome] for i in alternativas}
+        fatos = [fato for fato, padroes in avaliados if padroes is None or padroes & usados]
+        return Alcance(regras, fatos)
+
+    def proximas_perguntas(self, fatos_json):
+        """
+        Campos ainda não respondidos que podem fazer disparar alguma regra
+        que ainda não disparou. Um campo de `TIPOS_VALOR_UNICO` já respondido
+        elimina os padrões que pedem outro valor nele.
+        Retorna (perguntas, regras que já disparam, regras ainda possíveis).
+        """
+        avaliados = self._padroes_dos_fatos(fatos_json)
+        satisfeitos = {i for _, padroes in avaliados if padroes for i in padroes}
+        disparam = self._fechamento(satisfeitos)
+
+        respondidos = {}  # (tipo, campo) -> valores já informados
+        for fato, _ in avaliados:
+            if not isinstance(fato, dict):
+                continue  # Malformado: não responde nada (como no alcance)
+            dados = fato.get('dados', {})
+            if isinstance(dados, dict):
+                for campo, valor in dados.items():
+                    respondidos.setdefault((fato['tipo'], campo), []).append(valor)
+
+        def padrao_possivel(i):
+            padrao = self._padroes[i]
+            if i in satisfeitos:
+                return True
+            if padrao.tipo not in TIPOS_ENTRADA:
+                return any(i in self._declara.get(nome, ()) for nome in possiveis)
+            if padrao.tipo not in TIPOS_VALOR_UNICO:
+                return True
+            return all(any(padrao.aceita(campo, valor) for valor in respondidos[(padrao.tipo, campo)])
+                       for campo in padrao.restricoes if (padrao.tipo, campo) in respondidos)
+
+        # Maior ponto fixo: parte de todas as regras e tira as que têm um padrão impossível
+        possiveis = set(self._regras)
+        mudou = True
+        while mudou:
+            mudou = False
+            for nome in list(possiveis):
+                if not all(any(padrao_possivel(i) for i in alternativas) for alternativas in self._regras[nome]):
+                    possiveis.discard(nome)
+                    mudou = True
+
+        perguntas = {}
+        for nome in sorted(possiveis - disparam):
+            for alternativas in self._regras[nome]:
+                if alternativas & satisfeitos:
+                    continue
+                for i in sorted(alternativas):
+                    padrao = self._padroes[i]
+                    if padrao.tipo not in TIPOS_ENTRADA or not padrao_possivel(i):
+                        continue
+                    for campo, valor in padrao.restricoes.items():
+                        if padrao.tipo in TIPOS_VALOR_UNICO and (padrao.tipo, campo) in respondidos:
+                            continue
+                        pergunta = perguntas.setdefault((padrao.tipo, campo), {
+                            'tipo': padrao.tipo, 'campo': campo, 'valores': [], 'faixas': [], 'regras': []})
+                        lista = pergunta['faixas'] if isinstance(valor, Intervalo) else pergunta['valores']
+                        valor = str(valor) if isinstance(valor, Intervalo) else valor
+                        if valor not in lista:
+                            lista.append(valor)
+                        if nome not in pergunta['regras']:
+                            pergunta['regras'].append(nome)
+
+        ordenadas = sorted(perguntas.values(), key=lambda p: (-len(p['regras']), p['tipo'], p['campo']))
+        return ordenadas, sorted(disparam), sorted(possiveis - disparam)
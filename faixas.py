@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Faixas numéricas declarativas para as regras e o índice de intervalos.
+
+Em vez de `Condicao(temperatura_ar=P(lambda x: 15 < x < 25))` as regras
+escrevem `em_faixa(temperatura_ar=entre(15, 25))`. Todas as faixas de um
+campo são compiladas num índice ordenado: os limites viram pontos de corte
+e cada trecho entre eles já sabe quais faixas satisfaz, então um valor de
+sensor é mapeado para todas as suas faixas com uma única busca binária.
+O mesmo índice é usado pelo motor e pela avaliação vetorizada.
+"""
+
+import bisect
+import math
+from collections import namedtuple
+
+_INF = float('inf')
+
+
+class Intervalo(namedtuple('Intervalo', ['minimo', 'maximo', 'inclui_minimo', 'inclui_maximo'])):
+    """Intervalo numérico; por padrão aberto nas duas pontas (como `a < x < b`)."""
+
+    def __new__(cls, minimo=-_INF, maximo=_INF, inclui_minimo=False, inclui_maximo=False):
+        return super().__new__(cls, minimo, maximo, inclui_minimo, inclui_maximo)
+
+    def contem(self, valor):
+        # Lado sem limite (infinito) aceita qualquer valor, inclusive ±inf
+        acima = (self.minimo == -_INF
+                 or (valor >= self.minimo if self.inclui_minimo else valor > self.minimo))
+        abaixo = (self.maximo == _INF
+                  or (valor <= self.maximo if self.inclui_maximo else valor < self.maximo))
+        return acima and abaixo
+
+    def limites(self):
+        return [limite for limite in (self.minimo, self.maximo) if not math.isinf(limite)]
+
+    def __str__(self):
+        esquerda = '[' if self.inclui_minimo else '('
+        direita = ']' if self.inclui_maximo else ')'
+        return f"{esquerda}{self.minimo}, {self.maximo}{direita}"
+
+
+def acima_de(valor):
+    """x > valor"""
+    return Intervalo(minimo=valor)
+
+
+def abaixo_de(valor):
+    """x < valor"""
+    return Intervalo(maximo=valor)
+
+
+def entre(minimo, maximo):
+    """minimo < x < maximo"""
+    return Intervalo(minimo=minimo, maximo=maximo)
+
+
+class TesteFaixa:
+    """
+    Predicado de uma faixa num campo (usado dentro de P()). Faixas iguais no
+    mesmo campo compartilham o mesmo objeto, e portanto o mesmo nó da rede.
+    """
+
+    def __init__(self, indice, campo, intervalo, posicao):
+        self.indice = indice
+        self.campo = campo
+        self.intervalo = intervalo
+        self.posicao = posicao  # Posição da faixa entre as faixas do campo
+
+    def __call__(self, valor):
+        return self.posicao in self.indice.faixas_de(self.campo, valor)
+
+    def __repr__(self):
+        return f"TesteFaixa({self.campo} em {self.intervalo})"
+
+    def __reduce__(self):
+        # Ao desserializar (snapshot do motor) volta a ser o mesmo predicado do índice
+        return self.indice.teste, (self.campo, self.intervalo)
+
+
+class _IndiceCampo:
+    """Índice compilado de um campo: pontos de corte e faixas de cada trecho."""
+
+    def __init__(self, intervalos):
+        self.intervalos = list(intervalos)
+        self.pontos = sorted({limite for intervalo in self.intervalos for limite in intervalo.limites()})
+        # Trechos: 2i = aberto antes do ponto i (ou depois do último), 2i+1 = o próprio ponto i
+        self.trechos = [frozenset(posicao for posicao, intervalo in enumerate(self.intervalos)
+                                  if intervalo.contem(representante))
+                        for representante in self._representantes()]
+        self._memoria = {}
+
+    def _representantes(self):
+        pontos = self.pontos
+        if not pontos:
+            return [0.0]
+        representantes = []
+        for i, ponto in enumerate(pontos):
+            anterior = pontos[i - 1] if i else ponto - 1
+            representantes.append((anterior + ponto) / 2 if i else anterior)
+            representantes.append(ponto)
+        representantes.append(pontos[-1] + 1)
+        return representantes
+
+    def trecho(self, valor):
+        """Posição do trecho que contém o valor (None para NaN)."""
+        if valor != valor:
+            return None
+        i = bisect.bisect_left(self.pontos, valor)
+        if i < len(self.pontos) and self.pontos[i] == valor:
+            return 2 * i + 1
+        return 2 * i
+
+    def faixas_de(self, valor):
+        faixas = self._memoria.get(valor)
+        if faixas is None:
+            trecho = self.trecho(valor)
+            faixas = frozenset() if trecho is None else self.trechos[trecho]
+            if len(self._memoria) > 4096:
+                self._memoria.clear()
+            self._memoria[valor] = faixas
+        return faixas
+
+
+class IndiceFaixas:
+    """Registro das faixas usadas pelas regras, compilado num índice por campo."""
+
+    def __init__(self):
+        self._testes = {}  # (campo, intervalo) -> TesteFaixa
+        self._intervalos = {}  # campo -> [intervalos na ordem de registro]
+        self._campos = None  # campo -> _IndiceCampo (None = precisa compilar)
+
+    def teste(self, campo, intervalo):
+        """Retorna o predicado (único) da faixa `intervalo` no `campo`."""
+        chave = (campo, intervalo)
+        teste = self._testes.get(chave)
+        if teste is None:
+            intervalos = self._intervalos.setdefault(campo, [])
+            teste = self._testes[chave] = TesteFaixa(self, campo, intervalo, len(intervalos))
+            intervalos.append(intervalo)
+            self._campos = None
+        return teste
+
+    def compilar(self):
+        self._campos = {campo: _IndiceCampo(intervalos) for campo, intervalos in self._intervalos.items()}
+        return self
+
+    def campo(self, campo):
+        """Índice compilado de um campo."""
+        if self._campos is None:
+            self.compilar()
+        return self._campos[campo]
+
+    def campos(self):
+        return list(self._intervalos)
+
+    def faixas_de(self, campo, valor):
+        """Posições de todas as faixas do campo que contêm o valor (uma busca)."""
+        return self.campo(campo).faixas_de(valor)
+
+    def __reduce_ex__(self, protocolo):
+        if self is INDICE_FAIXAS:
+            return 'INDICE_FAIXAS'  # Serializado por referência ao índice global
+        return super().__reduce_ex__(protocolo)
+
+
+# Índice compartilhado pelas regras de motor_diagnostico.py
+INDICE_FAIXAS = IndiceFaixas()
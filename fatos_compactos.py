@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fatos compactos para a memória de trabalho.
+
+O `Fact` do experta é um dict que, além das chaves, guarda no __dict__ de
+cada instância um dict de valores padrão dos Fields (`__defaults`, criado
+mesmo vazio) e o hash em cache. Com milhares de campos mantendo um motor
+vivo, esse custo fixo por fato passa a ser o teto de memória.
+
+`FatoCompacto` continua sendo um `Fact` (a rede Rete casa pelo tipo exato
+e lê os campos como dict, então as regras da base não mudam), mas guarda o
+hash num slot e não cria o dict `__defaults`. O `Fact` não declara
+`__slots__`, então a instância ainda tem __dict__; ele só fica vazio. Os
+campos continuam as chaves do dict (sem campos fixos por tipo): é assim
+que a rede do experta os lê. `Vocabulario` faz as
+chaves e os textos conhecidos apontarem para uma única cópia, em vez de uma
+string nova a cada JSON recebido.
+"""
+
+from itertools import chain
+
+from experta import Fact
+
+
+class FatoCompacto(Fact):
+    """Fact sem o dict `__defaults` por instância e com o hash num slot (para tipos sem Fields declarados)."""
+
+    __slots__ = ('_hash',)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__fields__:
+            # Os valores padrão dos Fields ficam no dict `__defaults`, que aqui não é criado
+            raise TypeError(f"{cls.__name__}: FatoCompacto não aceita Fields declarados.")
+
+    def __init__(self, *args, **kwargs):
+        # Mesmo que Fact.__init__, sem criar o dict de valores padrão
+        for chave, valor in chain(enumerate(args), kwargs.items()):
+            self[chave] = valor
+
+
+class Vocabulario:
+    """Cópia única das chaves e dos textos conhecidos (os da base de regras)."""
+
+    def __init__(self, textos=()):
+        self._textos = {}
+        for texto in textos:
+            self._textos.setdefault(texto, texto)
+
+    @classmethod
+    def da_base(cls, base):
+        """Vocabulário com todas as strings (chaves e valores) de uma base de regras."""
+        textos = []
+        pendentes = [base]
+        while pendentes:
+            item = pendentes.pop()
+            if isinstance(item, str):
+                textos.append(item)
+            elif isinstance(item, dict):
+                textos.extend(item)
+                pendentes.extend(item.values())
+            elif isinstance(item, list):
+                pendentes.extend(item)
+        return cls(textos)
+
+    def compactar(self, dados):
+        """Os dados de um fato com chaves e textos conhecidos trocados pela cópia única."""
+        textos = self._textos
+        return {textos.get(chave, chave): textos.get(valor, valor) if isinstance(valor, str) else valor
+                for chave, valor in dados.items()}
+
+    def __len__(self):
+        return len(self._textos)
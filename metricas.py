@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Métricas no formato texto do Prometheus (sem dependências externas).
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LIMITES_QUANTIDADE = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ''
+    texto = ','.join('{}="{}"'.format(nome, str(valor).replace('\\', '\\\\').replace('"', '\\"'))
+                     for nome, valor in pares)
+    return '{' + texto + '}'
+
+
+def _formatar_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _somar(a, b):
+    if isinstance(a, list):  # Série de histograma: [contagens por faixa, soma, total]
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+    return a + b
+
+
+def somar_estados(estado, outro):
+    """Soma a `estado` ({nome: {rótulos: valor}}, de RegistroMetricas.estado) o de outro processo."""
+    for nome, series in outro.items():
+        destino = estado.setdefault(nome, {})
+        for rotulos, valor in series.items():
+            destino[rotulos] = _somar(destino[rotulos], valor) if rotulos in destino else valor
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor=1, *rotulos):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def estado(self):
+        """{rótulos: valor}, uma cópia que pode ser somada à de outros processos."""
+        with self._lock:
+            return dict(self._valores)
+
+    def exportar(self, valores=None):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        for rotulos, valor in sorted((self.estado() if valores is None else valores).items()):
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(valor)}")
+        return linhas
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, limites=LIMITES_SEGUNDOS, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        self.rotulos = tuple(rotulos)
+        self._series = {}  # rótulos -> [contagens por faixa (+Inf no fim), soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *rotulos):
+        faixa = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][faixa] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def estado(self):
+        """{rótulos: [contagens por faixa, soma, total]}, uma cópia."""
+        with self._lock:
+            return {rotulos: [list(contagens), soma, total]
+                    for rotulos, (contagens, soma, total) in self._series.items()}
+
+    def exportar(self, valores=None):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for rotulos, (contagens, soma, total) in sorted((self.estado() if valores is None else valores).items()):
+            acumulado = 0
+            for limite, contagem in zip(self.limites + ('+Inf',), contagens):
+                acumulado += contagem
+                le = limite if limite == '+Inf' else _formatar_numero(float(limite))
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, rotulos, ('le', le))} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas exportadas juntas em /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+
+    def contador(self, nome, ajuda, rotulos=()):
+        metrica = Contador(nome, ajuda, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome, ajuda, limites=LIMITES_SEGUNDOS, rotulos=()):
+        metrica = Histograma(nome, ajuda, limites, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def estado(self):
+        """Valores de todas as métricas deste processo: {nome: {rótulos: valor}}."""
+        return {metrica.nome: metrica.estado() for metrica in self._metricas}
+
+    def exportar(self, outros=()):
+        """Texto do /metrics; `outros` são estados de outros processos, somados aos deste."""
+        estado = self.estado()
+        for outro in outros:
+            somar_estados(estado, outro)
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.exportar(estado[metrica.nome]))
+        return '\n'.join(linhas) + '\n'
+
+
+class MetricasMotor:
+    """
+    Instrumentação do motor: disparos e tempo de RHS por regra, duração do
+    run, fatos declarados por run, maior tamanho da agenda e execuções
+    interrompidas pelo orçamento.
+    """
+
+    def __init__(self, registro):
+        self.disparos = registro.contador(
+            'diagnostico_regra_disparos_total', 'Ativações executadas por regra.', ('regra',))
+        self.tempo_regras = registro.contador(
+            'diagnostico_regra_tempo_segundos_total', 'Tempo acumulado no lado direito (RHS) de cada regra.', ('regra',))
+        self.tempo_run = registro.histograma(
+            'diagnostico_motor_run_segundos', 'Duração de engine.run().')
+        self.fatos_declarados = registro.histograma(
+            'diagnostico_fatos_declarados', 'Fatos declarados por execução do motor.', LIMITES_QUANTIDADE)
+        self.tamanho_agenda = registro.histograma(
+            'diagnostico_agenda_tamanho_maximo', 'Maior tamanho da agenda durante uma execução.', LIMITES_QUANTIDADE)
+        self.interrupcoes = registro.contador(
+            'diagnostico_motor_interrupcoes_total', 'Execuções interrompidas pelo orçamento do motor.', ('motivo',))
+
+    def registrar_disparo(self, regra, segundos):
+        self.disparos.incrementar(1, regra)
+        self.tempo_regras.incrementar(segundos, regra)
+
+    def registrar_run(self, segundos, fatos_declarados, maior_agenda):
+        self.tempo_run.observar(segundos)
+        self.fatos_declarados.observar(fatos_declarados)
+        self.tamanho_agenda.observar(maior_agenda)
+
+    def registrar_interrupcao(self, motivo):
+        self.interrupcoes.incrementar(1, motivo)
+
+
+# --- Métricas dos vários workers do servidor.py ---
+
+ARQUIVO_ENCERRADOS = 'encerrados.json'
+
+
+def _serializar(estado):
+    return {nome: [[list(rotulos), valor] for rotulos, valor in series.items()] for nome, series in estado.items()}
+
+
+def _desserializar(dados):
+    return {nome: {tuple(rotulos): valor for rotulos, valor in series} for nome, series in dados.items()}
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+def _gravar_json(caminho, dados):
+    # Arquivo temporário + rename: quem lê nunca vê um arquivo pela metade
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, caminho)
+
+
+def somar_estatisticas(por_worker, locais):
+    """
+    Junta as estatísticas (/estatisticas) de vários workers: inteiros
+    (contagens e capacidades) são somados; os demais valores (configuração,
+    versão das regras) são os de `locais`, o worker que responde.
+    """
+    total = {}
+    for secao, valores in locais.items():
+        total[secao] = dict(valores)
+        for chave, valor in valores.items():
+            if isinstance(valor, int) and not isinstance(valor, bool):
+                total[secao][chave] = sum(estatisticas.get(secao, {}).get(chave, 0) for estatisticas in por_worker)
+    return total
+
+
+class MetricasWorkers:
+    """
+    Soma as métricas dos workers do servidor.py no /metrics de qualquer um
+    deles. Cada worker grava o seu estado (e as suas estatísticas) em
+    `<diretorio>/<pid>-<partida>.json` a cada `intervalo` segundos e na
+    saída; quem responde soma o próprio estado, atual, ao dos arquivos dos
+    outros. O mestre junta os arquivos dos workers que saíram em
+    `encerrados.json`, e os contadores deles continuam na soma.
+    """
+
+    def __init__(self, diretorio, registro, estatisticas=None, intervalo=2.0):
+        self.diretorio = diretorio
+        self.registro = registro
+        self.intervalo = intervalo
+        self.arquivo = None
+        self._estatisticas = estatisticas
+
+    def iniciar(self):
+        """Começa a publicar o estado deste processo (no worker, depois do fork)."""
+        self.arquivo = os.path.join(self.diretorio, f"{os.getpid()}-{time.time_ns()}.json")
+        self.gravar()
+        threading.Thread(target=self._publicar, daemon=True).start()
+        atexit.register(self.gravar)
+
+    def _publicar(self):
+        while True:
+            time.sleep(self.intervalo)
+            self.gravar()
+
+    def gravar(self):
+        _gravar_json(self.arquivo, {
+            'pid': os.getpid(),
+            'metricas': _serializar(self.registro.estado()),
+            'estatisticas': self._estatisticas() if self._estatisticas else None,
+        })
+
+    def _arquivos_workers(self):
+        return [nome for nome in os.listdir(self.diretorio) if nome.endswith('.json') and nome != ARQUIVO_ENCERRADOS]
+
+    def _outros(self):
+        """(conteúdo dos arquivos dos outros workers, estado somado dos que saíram)."""
+        outros = {}
+        for nome in self._arquivos_workers():
+            caminho = os.path.join(self.diretorio, nome)
+            if caminho != self.arquivo:
+                dados = _ler_json(caminho)
+                if dados is not None:
+                    outros[nome] = dados
+        # Lido depois dos arquivos dos workers: quem o mestre juntou nesse meio-tempo não conta duas vezes
+        encerrados = _ler_json(os.path.join(self.diretorio, ARQUIVO_ENCERRADOS)) or {'arquivos': [], 'metricas': {}}
+        for nome in encerrados['arquivos']:
+            outros.pop(nome, None)
+        return list(outros.values()), _desserializar(encerrados['metricas'])
+
+    def exportar(self):
+        """Texto do /metrics com a soma de todos os workers (inclusive os que já saíram)."""
+        outros, encerrados = self._outros()
+        return self.registro.exportar([_desserializar(dados['metricas']) for dados in outros] + [encerrados])
+
+    def estatisticas(self):
+        """{pid: estatísticas} dos workers vivos; as deste worker são as atuais."""
+        outros, _ = self._outros()
+        por_worker = {dados['pid']: dados['estatisticas'] for dados in outros if dados['estatisticas'] is not None}
+        por_worker[os.getpid()] = self._estatisticas()
+        return por_worker
+
+    def juntar_encerrado(self, pid):
+        """No mestre, depois do waitpid: soma o último estado do worker aos encerrados e apaga o arquivo dele."""
+        nomes = [nome for nome in self._arquivos_workers() if nome.startswith(f"{pid}-")]
+        if not nomes:
+            return
+        caminho_encerrados = os.path.join(self.diretorio, ARQUIVO_ENCERRADOS)
+        encerrados = _ler_json(caminho_encerrados) or {'arquivos': [], 'metricas': {}}
+        metricas = _desserializar(encerrados['metricas'])
+        for nome in nomes:
+            dados = _ler_json(os.path.join(self.diretorio, nome))
+            if dados is not None:
+                somar_estados(metricas, _desserializar(dados['metricas']))
+        # Só ficam na lista os nomes cujo arquivo ainda existe (os apagados não são mais lidos)
+        existentes = set(self._arquivos_workers())
+        arquivos = [nome for nome in encerrados['arquivos'] if nome in existentes] + nomes
+        _gravar_json(caminho_encerrados, {'arquivos': arquivos, 'metricas': _serializar(metricas)})
+        for nome in nomes:
+            os.remove(os.path.join(self.diretorio, nome))
+
+    def limpar(self):
+        """Apaga os arquivos de uma execução anterior (na partida do mestre)."""
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(('.json', '.tmp')):
+                os.remove(os.path.join(self.diretorio, nome))
@@ -0,0 +1,616 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from experta import AS, Fact, InitialFact, Rule
+from experta.activation import Activation
+from experta.agenda import Agenda
+from experta.factlist import FactList
+from experta.matchers.rete.check import FactCapture
+from experta.matchers.rete.nodes import BusNode, FeatureTesterNode
+from experta.matchers.rete.token import TokenInfo
+
+import arquivo_campos
+from agregacao_sensores import AgregadorCampo, ConfigJanela
+from base_regras import SnapshotMotor
+from motor_diagnostico import (MotorDiagnosticoAgricola, Sintoma, Condicao, Diagnostico, Alerta, Resultado,
+                               VERSAO_BASE_REGRAS, VOCABULARIO, coletar_resultados_formatados)
+
+TIPOS_FATO = {'Sintoma': Sintoma, 'Condicao': Condicao}
+
+# Classes dos fatos que podem estar na memória de trabalho de um campo (restauradas pelo nome)
+_CLASSES_FATO = {'InitialFact': InitialFact, 'Fact': Fact, 'Sintoma': Sintoma, 'Condicao': Condicao,
+                 'Diagnostico': Diagnostico, 'Alerta': Alerta}
+
+# Versão do estado gravado por MotorCampo.estado()
+VERSAO_ESTADO = 1
+
+
+class _AgendaRastreada(Agenda):
+    """Agenda que guarda a ativação que está sendo executada no momento."""
+
+    def __init__(self):
+        super().__init__()
+        self.atual = None
+
+    def get_next(self):
+        self.atual = super().get_next()
+        return self.atual
+
+
+def _chave_ativacao(ativacao):
+    # Activation.__eq__ também compara a chave de ordenação da agenda, que
+    # ainda não existe nas ativações removidas; aqui vale só o casamento.
+    return (ativacao.rule, frozenset(ativacao.facts), frozenset(ativacao.context.items()))
+
+
+class MotorDiagnosticoIncremental(MotorDiagnosticoAgricola):
+    """
+    Motor de vida longa: os fatos podem ser trocados e o motor roda de novo
+    só sobre o que mudou (a rede Rete guarda o casamento dos demais fatos).
+
+    Cada resultado e cada Diagnostico declarado por uma regra fica ligado à
+    ativação que o produziu. Quando essa ativação deixa de valer (um fato
+    que a sustentava foi retirado), o resultado sai junto — e, no caso do
+    Diagnostico, as regras encadeadas a ele também deixam de valer.
+    """
+
+    def __init__(self):
+        self._limpar_suporte()
+        super().__init__()
+
+    def _limpar_suporte(self):
+        self._resultados_por_ativacao = {}
+        self._fatos_por_ativacao = {}
+        self._suporte_fatos = {}  # id canônico do fato -> [fato, {ativações}]
+
+    def reset(self, **kwargs):
+        self._limpar_suporte()
+        super().reset(**kwargs)
+        agenda = _AgendaRastreada()
+        agenda.activations = self.agenda.activations
+        self.agenda = agenda
+
+    def _ativacao_atual(self):
+        ativacao = getattr(self.agenda, 'atual', None) if self.running else None
+        return _chave_ativacao(ativacao) if ativacao is not None else None
+
+    def _adicionar_resultado(self, tipo, dados, regra=None):
+        super()._adicionar_resultado(tipo, dados, regra)
+        ativacao = self._ativacao_atual()
+        if ativacao is not None:
+            self._resultados_por_ativacao.setdefault(ativacao, []).append(self.resultados[-1])
+
+    def declare(self, *facts):
+        ativacao = self._ativacao_atual()
+        ultimo = super().declare(*facts)
+        if ativacao is not None:
+            for fato in facts:
+                chave = FactList._get_fact_id(fato)
+                suporte = self._suporte_fatos.get(chave)
+                if suporte is None:
+                    if '__factid__' not in fato:
+                        continue  # Duplicata de um fato declarado de fora: não é nosso
+                    suporte = self._suporte_fatos[chave] = [fato, set()]
+                suporte[1].add(ativacao)
+                self._fatos_por_ativacao.setdefault(ativacao, []).append(chave)
+        return ultimo
+
+    def get_activations(self):
+        added, removed = super().get_activations()
+        for ativacao in removed:
+            self._desfazer(_chave_ativacao(ativacao))
+        return added, removed
+
+    def _desfazer(self, ativacao):
+        """Retira o que a ativação produziu (ela não vale mais)."""
+        itens = self._resultados_por_ativacao.pop(ativacao, None)
+        if itens:
+            ids = {id(item) for item in itens}
+            self.resultados = [item for item in self.resultados if id(item) not in ids]
+
+        for chave in self._fatos_por_ativacao.pop(ativacao, ()):
+            suporte = self._suporte_fatos.get(chave)
+            if suporte is None:
+                continue
+            suporte[1].discard(ativacao)
+            if not suporte[1]:
+                del self._suporte_fatos[chave]
+                fato = suporte[0]
+                if fato['__factid__'] in self.facts:
+                    # Direto na lista de fatos: a rede processa na próxima rodada
+                    self.facts.retract(fato)
+
+    def executar(self):
+        """
+        Roda até estabilizar (retiradas em cascata geram novas rodadas) ou
+        até uma rodada ser interrompida pelo orçamento do motor.
+        """
+        while True:
+            self.run()
+            if self.interrupcao or not (self.facts.added or self.facts.removed):
+                break
+
+    # No modo contínuo não há relatório impresso: os resultados saem como deltas
+    @Rule(AS.f_acao << Fact(acao='buscar_solucao'),
+          salience=-100)
+    def coletar_resultados(self, f_acao):
+        self.retract(f_acao)
+
+
+def _chave_resultado(resultado):
+    return json.dumps(resultado, sort_keys=True, ensure_ascii=False)
+
+
+# Molde serializado do motor incremental: copiar é bem mais rápido que montar a rede Rete.
+# Junto vão os caminhos (índices dos filhos a partir da raiz) dos nós com memória, na ordem estável,
+# e os nomes estáveis das capturas anônimas de padrão (o experta as nomeia pelo id() do padrão).
+_molde_motor = None
+_caminhos_memorias = None
+_nomes_padroes = None  # nome no processo -> nome estável
+_padroes_locais = None  # nome estável -> nome no processo
+_assinatura_rede = None
+
+_PADRAO_ANONIMO = re.compile(r'__pattern_\d+__')
+
+
+def _preparar_molde():
+    global _molde_motor, _caminhos_memorias, _nomes_padroes, _padroes_locais, _assinatura_rede
+    if _molde_motor is None:
+        engine = MotorDiagnosticoIncremental()
+        chaves, caminhos, padroes = _estrutura_rede(engine.matcher)
+        _caminhos_memorias = [caminhos[i] for i in sorted(range(len(chaves)), key=chaves.__getitem__)]
+        _nomes_padroes = {nome: ('__pattern__', i)
+                          for i, nome in enumerate(sorted(padroes, key=padroes.__getitem__))}
+        _padroes_locais = {estavel: nome for nome, estavel in _nomes_padroes.items()}
+        _assinatura_rede = hashlib.blake2b(repr((sorted(chaves), sorted(padroes.values()))).encode(),
+                                           digest_size=8).hexdigest()
+        _molde_motor = SnapshotMotor.de_motor(engine)
+
+
+def _novo_motor_incremental():
+    _preparar_molde()
+    return _molde_motor.novo_motor()
+
+
+# --- Memórias da rede Rete ---
+#
+# A montagem da rede depende de hash() (muda a cada processo), então os nós
+# com memória são identificados por uma chave estável: o tipo e o teste do
+# nó, os nós de onde ele recebe tokens (até os testes alfa, sem ordem) e a
+# regra, no nó final.
+
+def _nos_da_rede(matcher):
+    """Nós em profundidade a partir da raiz (cada um uma vez, com o caminho até ele) e os pais de cada nó."""
+    nos, pais, vistos = [], {}, set()
+
+    def visitar(no, caminho):
+        vistos.add(id(no))
+        nos.append((no, caminho))
+        for i, filho in enumerate(no.children):
+            pais.setdefault(id(filho.node), []).append((filho.callback.__name__, no))
+            if id(filho.node) not in vistos:
+                visitar(filho.node, caminho + (i,))
+
+    visitar(matcher.root_node, ())
+    return nos, pais
+
+
+def _tem_memoria(no):
+    return hasattr(no, 'memory') or hasattr(no, 'left_memory')
+
+
+def _estrutura_rede(matcher):
+    """Chaves e caminhos dos nós com memória e a chave de cada captura anônima de padrão."""
+    nos, pais = _nos_da_rede(matcher)
+    assinaturas = {}
+
+    def assinatura(no):
+        if id(no) not in assinaturas:
+            if isinstance(no, BusNode):
+                valor = ()
+            elif isinstance(no, FeatureTesterNode):
+                testes, atual = set(), no
+                while isinstance(atual, FeatureTesterNode):
+                    testes.add(_PADRAO_ANONIMO.sub('__pattern__', str(atual.matcher)))
+                    atual = pais[id(atual)][0][1]
+                valor = tuple(sorted(testes))
+            else:
+                valor = (_PADRAO_ANONIMO.sub('__pattern__', str(no)),
+                         tuple(sorted((entrada, assinatura(pai)) for entrada, pai in pais.get(id(no), ()))))
+            assinaturas[id(no)] = valor
+        return assinaturas[id(no)]
+
+    chaves, caminhos, padroes, vistas = [], [], {}, {}
+    for no, caminho in nos:
+        if isinstance(getattr(no, 'matcher', None), FactCapture) and _PADRAO_ANONIMO.fullmatch(no.matcher.bind):
+            padroes[no.matcher.bind] = repr(assinatura(no))
+        elif _tem_memoria(no):
+            chave = repr((getattr(getattr(no, 'rule', None), '__name__', None), assinatura(no)))
+            # Nós com a mesma chave recebem os mesmos tokens: basta numerá-los
+            vistas[chave] = vistas.get(chave, -1) + 1
+            chaves.append(f"{chave}#{vistas[chave]}")
+            caminhos.append(caminho)
+    return chaves, caminhos, padroes
+
+
+def _memorias(engine):
+    """Nós com memória do motor (uma cópia do molde) na ordem estável."""
+    nos = []
+    for caminho in _caminhos_memorias:
+        no = engine.matcher.root_node
+        for i in caminho:
+            no = no.children[i].node
+        nos.append(no)
+    return nos
+
+
+# --- Estado de um campo em tipos básicos (fatos pelo __factid__, regras pelo nome) ---
+
+def _fato_para_estado(fato):
+    return (fato.get('__factid__'), type(fato).__name__,
+            tuple((k, v) for k, v in fato.items() if not fato.is_special(k)))
+
+
+def _fato_do_estado(estado):
+    indice, tipo, itens = estado
+    fato = _CLASSES_FATO[tipo].from_iter(VOCABULARIO.compactar(dict(itens)))
+    if indice is not None:
+        fato.__factid__ = indice
+    return fato
+
+
+def _casamento_para_estado(fatos, contexto):
+    return (tuple(sorted(f['__factid__'] for f in fatos)),
+            tuple((_nomes_padroes.get(k, k), True, v['__factid__']) if isinstance(v, Fact)
+                  else (_nomes_padroes.get(k, k), False, v) for k, v in contexto))
+
+
+def _casamento_do_estado(estado, fatos):
+    indices, contexto = estado
+    return ([fatos[i] for i in indices],
+            {_padroes_locais.get(k, k): fatos[v] if eh_fato else v for k, eh_fato, v in contexto})
+
+
+def _ativacao_para_estado(chave):
+    regra, fatos, contexto = chave
+    return (regra.__name__,) + _casamento_para_estado(fatos, contexto)
+
+
+def _ativacao_do_estado(estado, regras, fatos):
+    dados, contexto = _casamento_do_estado(estado[1:], fatos)
+    return (regras[estado[0]], frozenset(dados), frozenset(contexto.items()))
+
+
+def _memoria_para_estado(no):
+    estado = []
+    for nome in ('memory', 'left_memory', 'right_memory'):
+        memoria = getattr(no, nome, None)
+        if isinstance(memoria, dict):  # NotNode: token -> contagem
+            estado.append(tuple((_casamento_para_estado(*info), n) for info, n in memoria.items()))
+        elif memoria is not None:
+            estado.append(tuple(_casamento_para_estado(*info) for info in memoria))
+    return tuple(estado)
+
+
+def _memoria_do_estado(no, estado, fatos):
+    memorias = [getattr(no, nome) for nome in ('memory', 'left_memory', 'right_memory') if hasattr(no, nome)]
+    for memoria, itens in zip(memorias, estado):
+        if isinstance(memoria, dict):
+            for casamento, n in itens:
+                memoria[TokenInfo(*_casamento_do_estado(casamento, fatos))] = n
+        elif isinstance(memoria, set):
+            memoria.update(TokenInfo(*_casamento_do_estado(casamento, fatos)) for casamento in itens)
+        else:
+            memoria.extend(TokenInfo(*_casamento_do_estado(casamento, fatos)) for casamento in itens)
+
+
+class MotorCampo:
+    """Estado de um campo (talhão): motor incremental + fatos atuais por chave."""
+
+    agregador = None  # Janelas dos sensores do campo (criadas na primeira leitura de sensor)
+
+    def __init__(self, max_fatos=64):
+        self.max_fatos = max_fatos
+        self.engine = _novo_motor_incremental()
+        self.engine.reset()
+        self.engine.executar()
+        self.fatos = {}  # (tipo, campos) -> fato declarado
+        self.conclusoes = {}  # chave canônica -> resultado formatado
+        self.ultimo_acesso = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _remover(self, chave):
+        fato = self.fatos.pop(chave, None)
+        if fato is not None:
+            self.engine.retract(fato)
+
+    def atualizar(self, fatos=(), remover=()):
+        """
+        Troca apenas os fatos informados e roda o motor de novo.
+
+        fatos:   [{tipo, dados}] — substitui o fato de mesmo tipo e mesmos campos
+        remover: [{tipo, campos: [...]}] — retira o fato de mesmo tipo e campos
+        Retorna (novos, removidos): conclusões que surgiram e que deixaram de valer.
+        """
+        for item in remover:
+            self._remover((item.get('tipo'), frozenset(item.get('campos', ()))))
+
+        for fato_info in fatos:
+            tipo_fato = fato_info.get('tipo')
+            if tipo_fato not in TIPOS_FATO:
+                continue
+            # O fato e a chave ficam vivos com o campo: usam as strings do vocabulário da base
+            dados_fato = VOCABULARIO.compactar(fato_info.get('dados', {}))
+            chave = (tipo_fato, frozenset(dados_fato))
+            atual = self.fatos.get(chave)
+            if atual is not None and dict(atual.as_dict()) == dados_fato:
+                continue  # Mesmo valor: nada muda na rede
+            if atual is None and len(self.fatos) >= self.max_fatos:
+                raise ValueError(f"Limite de {self.max_fatos} fatos por campo atingido.")
+
+            self._remover(chave)
+            fato = TIPOS_FATO[tipo_fato](**dados_fato)
+            if self.engine.declare(fato) is not None:
+                self.fatos[chave] = fato
+
+        self.engine.executar()
+
+        conclusoes = {_chave_resultado(r): r for r in coletar_resultados_formatados(self.engine)}
+        novos = [r for chave, r in conclusoes.items() if chave not in self.conclusoes]
+        removidos = [r for chave, r in self.conclusoes.items() if chave not in conclusoes]
+        self.conclusoes = conclusoes
+        return novos, removidos
+
+    def estado(self):
+        """
+        Estado do campo só com tipos básicos: fatos, memórias da rede,
+        agenda pendente, resultados e os suportes do motor incremental.
+        """
+        engine = self.engine
+        posicao_resultado = {id(r): i for i, r in enumerate(engine.resultados)}
+        posicao_suporte = {chave: i for i, chave in enumerate(engine._suporte_fatos)}
+        return (
+            VERSAO_ESTADO,
+            self.max_fatos,
+            engine.facts.last_index,
+            tuple(_fato_para_estado(f) for f in engine.facts.values()),
+            tuple(_memoria_para_estado(no) for no in _memorias(engine)),
+            tuple(_ativacao_para_estado(_chave_ativacao(a)) for a in engine.agenda.activations),
+            tuple((getattr(r, 'regra', None), tuple(r.items())) for r in engine.resultados),
+            engine.marco_resultados,
+            tuple((_ativacao_para_estado(a), tuple(posicao_resultado[id(r)] for r in itens))
+                  for a, itens in engine._resultados_por_ativacao.items()),
+            tuple((_fato_para_estado(fato), tuple(_ativacao_para_estado(a) for a in ativacoes))
+                  for fato, ativacoes in engine._suporte_fatos.values()),
+            tuple((_ativacao_para_estado(a), tuple(posicao_suporte[c] for c in chaves))
+                  for a, chaves in engine._fatos_por_ativacao.items()),
+            tuple(f['__factid__'] for f in self.fatos.values()),
+        )
+
+    @classmethod
+    def restaurar(cls, estado):
+        """
+        Recria o campo a partir de `estado()` sem passar os fatos pela rede
+        nem disparar regras: as memórias dos nós e a agenda pendente voltam
+        como estavam.
+        """
+        (versao, max_fatos, ultimo_indice, fatos, memorias, agenda, resultados, marco,
+         resultados_por_ativacao, suportes, fatos_por_ativacao, fatos_do_campo) = estado
+        if versao != VERSAO_ESTADO:
+            raise ValueError(f"Estado de campo na versão {versao} (esperada {VERSAO_ESTADO}).")
+
+        campo = cls.__new__(cls)
+        campo.max_fatos = max_fatos
+        engine = campo.engine = _novo_motor_incremental()
+        engine.agenda = _AgendaRastreada()
+        engine.facts = lista = FactList()  # A rede do molde ainda está vazia
+
+        por_id = {}
+        for estado_fato in fatos:
+            fato = _fato_do_estado(estado_fato)
+            por_id[fato['__factid__']] = lista[fato['__factid__']] = fato
+            lista.reference_counter[FactList._get_fact_id(fato)] += 1
+        lista.last_index = ultimo_indice
+
+        nos = _memorias(engine)
+        for no, estado_memoria in zip(nos, memorias):
+            _memoria_do_estado(no, estado_memoria, por_id)
+
+        regras = {no.rule.__name__: no.rule for no in nos if hasattr(no, 'rule')}
+        engine.strategy.update_agenda(
+            engine.agenda, [Activation(*_ativacao_do_estado(a, regras, por_id)) for a in agenda], [])
+
+        engine.resultados = []
+        for regra, itens in resultados:
+            resultado = Resultado(VOCABULARIO.compactar(dict(itens)))
+            resultado.regra = regra
+            engine.resultados.append(resultado)
+        engine.marco_resultados = marco
+        engine._resultados_por_ativacao = {
+            _ativacao_do_estado(a, regras, por_id): [engine.resultados[i] for i in posicoes]
+            for a, posicoes in resultados_por_ativacao}
+        chaves_suporte = []
+        engine._suporte_fatos = {}
+        for estado_fato, ativacoes in suportes:
+            fato = por_id.get(estado_fato[0])
+            if fato is None:
+                fato = _fato_do_estado(estado_fato)
+            chave = FactList._get_fact_id(fato)
+            chaves_suporte.append(chave)
+            engine._suporte_fatos[chave] = [fato, {_ativacao_do_estado(a, regras, por_id) for a in ativacoes}]
+        engine._fatos_por_ativacao = {
+            _ativacao_do_estado(a, regras, por_id): [chaves_suporte[i] for i in posicoes]
+            for a, posicoes in fatos_por_ativacao}
+
+        campo.fatos = {}
+        for indice in fatos_do_campo:
+            fato = por_id[indice]
+            campo.fatos[(type(fato).__name__, frozenset(k for k in fato if not fato.is_special(k)))] = fato
+        campo.conclusoes = {_chave_resultado(r): r for r in coletar_resultados_formatados(engine)}
+        campo.ultimo_acesso = time.monotonic()
+        campo.lock = threading.Lock()
+        return campo
+
+
+def _identificacao_snapshot():
+    # Um snapshot só vale para a mesma base de regras e a mesma rede (regras e nós entram no estado)
+    _preparar_molde()
+    return {'formato': VERSAO_ESTADO, 'base': VERSAO_BASE_REGRAS, 'rede': _assinatura_rede}
+
+
+class MonitoramentoCampos:
+    """
+    Mantém um motor vivo por campo e devolve só o que mudou a cada leitura.
+
+    A memória é limitada pelo número máximo de campos (sai o menos usado)
+    e pelo número máximo de fatos por campo; campos sem leituras há mais de
+    `tempo_ocioso` segundos são descartados.
+
+    O estado de todos os campos pode ser gravado num arquivo único
+    (`gravar_snapshot`) e carregado de volta (`carregar_snapshot`): cada
+    campo só é restaurado quando recebe a próxima leitura.
+    """
+
+    def __init__(self, max_campos=1000, tempo_ocioso=900, max_fatos_por_campo=64,
+                 janelas=None, janela_padrao=ConfigJanela()):
+        self.max_campos = max_campos
+        self.tempo_ocioso = tempo_ocioso
+        self.max_fatos_por_campo = max_fatos_por_campo
+        self.janelas = janelas or {}  # sensor -> ConfigJanela
+        self.janela_padrao = janela_padrao
+        self.leituras_agregadas = 0
+        self.rediagnosticos_por_leituras = 0
+        self._campos = OrderedDict()  # campo_id -> MotorCampo (do menos ao mais usado)
+        self._pendentes = {}  # campo_id -> ArquivoCampos de onde o campo ainda não foi restaurado
+        self._lock = threading.Lock()
+        self.descartados_por_ociosidade = 0
+        self.descartados_por_limite = 0
+
+    def _descartar_ociosos(self, agora):
+        while self._campos:
+            campo_id, campo = next(iter(self._campos.items()))
+            if agora - campo.ultimo_acesso < self.tempo_ocioso:
+                break
+            del self._campos[campo_id]
+            self.descartados_por_ociosidade += 1
+
+    def _obter_campo(self, campo_id):
+        agora = time.monotonic()
+        with self._lock:
+            self._descartar_ociosos(agora)
+            campo = self._campos.get(campo_id)
+            if campo is None:
+                arquivo = self._pendentes.pop(campo_id, None)
+                if arquivo is not None:
+                    campo = MotorCampo.restaurar(pickle.loads(arquivo.ler(campo_id)))
+                else:
+                    campo = MotorCampo(self.max_fatos_por_campo)
+                self._campos[campo_id] = campo
+                while len(self._campos) > self.max_campos:
+                    self._campos.popitem(last=False)
+                    self.descartados_por_limite += 1
+            else:
+                self._campos.move_to_end(campo_id)
+            campo.ultimo_acesso = agora
+            return campo
+
+    def atualizar(self, campo_id, fatos=(), remover=()):
+        """Aplica uma atualização ao campo e retorna o delta."""
+        campo = self._obter_campo(campo_id)
+        with campo.lock:
+            novos, removidos = campo.atualizar(fatos, remover)
+        return {'campo': campo_id, 'novos': novos, 'removidos': removidos}
+
+    def registrar_leituras(self, campo_id, leituras):
+        """
+        Passa leituras brutas [{sensor, valor, momento}] pelas janelas do
+        campo e só roda o motor se algum agregado cruzou um limite das regras.
+        """
+        campo = self._obter_campo(campo_id)
+        with campo.lock:
+            if campo.agregador is None:
+                campo.agregador = AgregadorCampo(self.janelas, self.janela_padrao)
+            fatos = campo.agregador.registrar(leituras)
+            novos, removidos = campo.atualizar(fatos) if fatos else ([], [])
+            agregados = campo.agregador.resumo()
+        with self._lock:
+            self.leituras_agregadas += len(leituras)
+            self.rediagnosticos_por_leituras += bool(fatos)
+        return {'campo': campo_id, 'rediagnostico': bool(fatos), 'novos': novos, 'removidos': removidos,
+                'agregados': agregados}
+
+    def fluxo(self, atualizacoes):
+        """
+        Gerador: para cada atualização {campo, fatos, remover} emite o delta,
+        pulando as atualizações que não mudaram nenhuma conclusão.
+        """
+        for atualizacao in atualizacoes:
+            try:
+                delta = self.atualizar(atualizacao['campo'],
+                                       atualizacao.get('fatos', ()),
+                                       atualizacao.get('remover', ()))
+            except Exception as e:
+                yield {'campo': atualizacao.get('campo') if isinstance(atualizacao, dict) else None,
+                       'erro': str(e)}
+                continue
+            if delta['novos'] or delta['removidos']:
+                yield delta
+
+    def remover_campo(self, campo_id):
+        with self._lock:
+            pendente = self._pendentes.pop(campo_id, None) is not None
+            return self._campos.pop(campo_id, None) is not None or pendente
+
+    def gravar_snapshot(self, caminho):
+        """
+        Grava o estado de todos os campos (inclusive os ainda não restaurados)
+        num arquivo só. Retorna {'campos': n, 'bytes': tamanho do arquivo}.
+        """
+        with self._lock:
+            campos = list(self._campos.items())
+            pendentes = list(self._pendentes.items())
+        registros = {}
+        for campo_id, arquivo in pendentes:
+            registros[campo_id] = bytes(arquivo.ler(campo_id))
+        for campo_id, campo in campos:
+            with campo.lock:
+                registros[campo_id] = pickle.dumps(campo.estado(), protocol=pickle.HIGHEST_PROTOCOL)
+        tamanho = arquivo_campos.gravar(caminho, registros, _identificacao_snapshot())
+        return {'campos': len(registros), 'bytes': tamanho}
+
+    def carregar_snapshot(self, caminho):
+        """
+        Abre um arquivo de `gravar_snapshot`. Os campos que ainda não estão
+        em memória ficam pendentes e são restaurados na próxima leitura de
+        cada um. Retorna o número de campos pendentes.
+        """
+        arquivo = arquivo_campos.ArquivoCampos(caminho)
+        if arquivo.identificacao != _identificacao_snapshot():
+            raise ValueError(f"{caminho} foi gravado com outra base de regras ou outro formato "
+                             f"({arquivo.identificacao}).")
+        with self._lock:
+            for campo_id in arquivo.campos():
+                if campo_id not in self._campos:
+                    self._pendentes[campo_id] = arquivo
+            return len(self._pendentes)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'campos': len(self._campos),
+                'campos_pendentes': len(self._pendentes),
+                'max_campos': self.max_campos,
+                'tempo_ocioso': self.tempo_ocioso,
+                'descartados_por_ociosidade': self.descartados_por_ociosidade,
+                'descartados_por_limite': self.descartados_por_limite,
+                'leituras_agregadas': self.leituras_agregadas,
+                'rediagnosticos_por_leituras': self.rediagnosticos_por_leituras,
+            }
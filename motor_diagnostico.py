@@ -1,299 +1,156 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import threading
+import time
+
 from experta import *
+from experta import watchers
+
+import base_regras
+from faixas import INDICE_FAIXAS
+from fatos_compactos import FatoCompacto, Vocabulario
+from catalogo_resultados import CatalogoResultados, ResultadosFormatados, formatar_texto
+from dependencias_regras import IndiceDependencias
 
 # --- 1. Definição dos Fatos ---
-class Sintoma(Fact):
+# Compactos (sem o dict de valores padrão por instância e com o hash num slot);
+# as regras casam com eles como com qualquer Fact
+class Sintoma(FatoCompacto):
     pass
-class Condicao(Fact):
+class Condicao(FatoCompacto):
     pass
-class Diagnostico(Fact):
+class Diagnostico(FatoCompacto):
     pass
-class Alerta(Fact):
+class Alerta(FatoCompacto):
     pass
 
+TIPOS_FATO = {'Sintoma': Sintoma, 'Condicao': Condicao, 'Diagnostico': Diagnostico, 'Alerta': Alerta}
+
+
+# Orçamento de cada engine.run(): disparos de regra e segundos de relógio (0 desliga)
+LIMITE_CICLOS = int(os.environ.get('LIMITE_CICLOS_MOTOR', 1000))
+LIMITE_TEMPO = float(os.environ.get('LIMITE_TEMPO_MOTOR', 2.0))
+
+
+class Resultado(dict):
+    """Item de `engine.resultados`: o resultado e o nome da regra que o gerou."""
+    __slots__ = ('regra',)
+
+
 # --- 2. Criação do Motor e da Base de Conhecimento (Regras) ---
 class MotorDiagnosticoAgricola(KnowledgeEngine):
-    
+
+    # Atributos da classe (valem também para os motores do snapshot); podem ser trocados por motor
+    limite_ciclos = LIMITE_CICLOS
+    limite_tempo = LIMITE_TEMPO
+    interrupcao = None  # Motivo da última execução interrompida ('ciclos' ou 'tempo')
+
+    def __init__(self, metricas=None):
+        super().__init__()
+        # Instrumentação opcional (metricas.MetricasMotor); None desliga
+        self.metricas = metricas
+        self.fatos_declarados = 0
+        self._limpar_resultados()
+
     @DefFacts()
     def _fatos_iniciais(self):
         yield Fact(acao="buscar_solucao")
-        yield Fact(resultados=[]) # Lista para acumular nossos resultados
-
-    def _adicionar_resultado(self, tipo, dados):
-        """Helper para adicionar um resultado à nossa lista de fatos."""
-        for f in self.facts.values(): 
-            if 'resultados' in f: 
-                lista_resultados_antiga = f['resultados']
-                nova_lista = list(lista_resultados_antiga)
-                nova_lista.append({'tipo': tipo, **dados})
-                self.modify(f, resultados=nova_lista)
+
+    def reset(self, **kwargs):
+        self._limpar_resultados()
+        self.fatos_declarados = 0
+        super().reset(**kwargs)
+
+    def _limpar_resultados(self):
+        # Os resultados são acumulados FORA da memória de trabalho: uma lista
+        # comum (append em O(1)) em vez de um fato que era copiado e
+        # re-declarado (modify) a cada regra disparada.
+        self.resultados = []
+        # Índice do próximo fato na última adição; usado para manter a mesma
+        # ordem de saída de quando a lista era um fato na memória de trabalho.
+        self.marco_resultados = 0
+
+    def _adicionar_resultado(self, tipo, dados, regra=None):
+        """Helper para adicionar um resultado à nossa lista de resultados."""
+        resultado = Resultado(tipo=tipo, **dados)
+        resultado.regra = regra  # Chave do resultado já formatado no catálogo
+        self.resultados.append(resultado)
+        self.marco_resultados = self.facts.last_index
+
+    def declare(self, *facts):
+        if not self.running:
+            self.fatos_declarados += len(facts) # Só os declarados de fora (não pelas regras)
+        return super().declare(*facts)
+
+    def run(self, steps=float('inf')):
+        """
+        Mesmo laço do KnowledgeEngine.run, com orçamento: passando de
+        `limite_ciclos` disparos ou de `limite_tempo` segundos com regras
+        ainda na agenda, o motor para antes da próxima ativação e
+        `interrupcao` guarda o motivo (os resultados até ali continuam
+        válidos). Com a instrumentação ligada, mede cada disparo de regra.
+        """
+        metricas = self.metricas
+        inicio_run = time.perf_counter()
+        prazo = inicio_run + self.limite_tempo if self.limite_tempo else float('inf')
+        limite_ciclos = self.limite_ciclos or float('inf')
+        self.interrupcao = None
+        maior_agenda = 0
+        self.running = True
+        execution = 0
+        while steps > 0 and self.running:
+
+            added, removed = self.get_activations()
+            self.strategy.update_agenda(self.agenda, added, removed)
+            maior_agenda = max(maior_agenda, len(self.agenda.activations))
+
+            if not self.agenda.activations:
+                break
+            if execution >= limite_ciclos:
+                self.interrupcao = 'ciclos'
+                break
+            if time.perf_counter() >= prazo:
+                self.interrupcao = 'tempo'
                 break
 
-    # --- GRUPO 1: GESTÃO HÍDRICA ---
-
-    # 1
-    @Rule(Condicao(sensor_umidade_solo=P(lambda x: x < 30)), 
-          Condicao(tipo_solo='arenoso'))
-    def regra_irrigacao_solo_arenoso(self):
-        self._adicionar_resultado('Diagnostico', {'causa': 'baixa_umidade_em_solo_arenoso','recomendacao': 'irrigar_agora_ciclo_curto'})
-
-    # 2
-    @Rule(Condicao(sensor_umidade_solo=P(lambda x: x < 40)), 
-          Condicao(tipo_solo='argiloso'))
-    def regra_irrigacao_solo_argiloso(self):
-        self._adicionar_resultado('Diagnostico', {'causa': 'baixa_umidade_em_solo_argiloso','recomendacao': 'irrigar_agora_ciclo_longo'})
-
-    # 3
-    @Rule(Sintoma(planta_aparencia='murcha_pela_manha'), 
-          Condicao(solo_umido='seco'))
-    def regra_estresse_hidrico_severo(self):
-        self._adicionar_resultado('Diagnostico', {'causa': 'estresse_hidrico_severo', 'recomendacao': 'irrigar_imediatamente'})
-
-    # 4
-    @Rule(Sintoma(planta_aparencia='murcha_pela_tarde'), 
-          Condicao(solo_umido='umido'), 
-          Condicao(temperatura_ar=P(lambda x: x > 30)))
-    def regra_estresse_termico(self):
-        self._adicionar_resultado('Diagnostico', {'causa': 'estresse_termico', 'recomendacao': 'nao_irrigar_agora_verificar_sombreamento'})
-
-    # 5
-    @Rule(Condicao(solo_umido='encharcado'), 
-          Sintoma(planta_folhas_baixas='amareladas'))
-    def regra_excesso_agua(self):
-        self._adicionar_resultado('Diagnostico', {'causa': 'excesso_de_agua_asfixia_radicular', 'recomendacao': 'suspender_irrigacao_e_checar_drenagem'})
-
-    # 6
-    @Rule(Condicao(ph_solo=P(lambda x: x > 7.5)))
-    def regra_solo_alcalino(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'solo_alcalino_(pH_alto)',
-            'recomendacao': 'pH alto detectado. Isso pode travar a absorcao de micronutrientes (como Ferro). Aplicar enxofre elementar ou sulfato de amonio para reduzir o pH.'
-        })
-
-   # 7
-    @Rule(OR(Diagnostico(causa='deficiencia_de_calcio_(Ca)'),
-             Diagnostico(causa='deficiencia_de_magnesio_(Mg)')),
-          Condicao(ph_solo=P(lambda x: x < 5.5)))
-    def regra_corrigir_ph_para_Ca_Mg(self):
-        self._adicionar_resultado('Diagnostico', {
-            'recomendacao_corretiva': 'pH baixo detectado. Aplicar calcário dolomítico (corrige pH e fornece Ca/Mg).'
-        })
-
-    # --- GRUPO 2: DIAGNÓSTICO NUTRICIONAL ---
-    
-    # 8
-    @Rule(Sintoma(local='folhas_velhas', 
-                  cor='amarelada_uniforme'))
-    def regra_deficiencia_nitrogenio(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'deficiencia_de_nitrogenio_(N)',
-            'recomendacao': 'Aplicar fertilizante nitrogenado (ex: ureia, nitrato de amônio).' 
-        })
-
-    # 9
-    @Rule(Sintoma(local='folhas_velhas', 
-                  cor='verde_escura_com_tons_arroxeados'))
-    def regra_deficiencia_fosforo(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'deficiencia_de_fosforo_(P)',
-            'recomendacao': 'Aplicar fertilizante fosfatado (ex: superfosfato simples/triplo).'
-        })
-
-    # 10
-    @Rule(Sintoma(local='folhas_velhas', 
-                  aspecto='bordas_queimadas_e_secas'))
-    def regra_deficiencia_potassio(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'deficiencia_de_potassio_(K)',
-            'recomendacao': 'Aplicar fertilizante potássico (ex: cloreto de potássio).'
-        })
-
-    # 11
-    @Rule(Sintoma(local='folhas_velhas', 
-                  cor='amarelada_entre_nervuras'))
-    def regra_deficiencia_magnesio(self):
-        # Esta regra declara um Fato, pois ela pode ser usada
-        # pela regra de correção de pH (encadeamento)
-        self.declare(Diagnostico(
-            causa='deficiencia_de_magnesio_(Mg)',
-            recomendacao='Aplicar sulfato de magnésio ou calcário dolomítico (se pH baixo).'
-        ))
-
-    # 12
-    @Rule(Sintoma(local='folhas_novas', 
-                  cor='amarelada_entre_nervuras'))
-    def regra_deficiencia_ferro(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'deficiencia_de_ferro_(Fe)',
-            'recomendacao': 'Aplicar quelato de ferro (Fe-EDTA) no solo ou via foliar.' 
-        })
-
-    # 13
-    @Rule(Sintoma(local='folhas_novas', 
-                  aspecto='deformadas_ou_retorcidas', 
-                  ponto_crescimento='morto'))
-    def regra_deficiencia_calcio(self):
-        self.declare(Diagnostico(
-            causa='deficiencia_de_calcio_(Ca)',
-            recomendacao='Aplicar gesso agrícola ou nitrato de cálcio.' 
-        ))
-
-    # 14
-    @Rule(Sintoma(local='folhas_novas', 
-                  cor='amarelada_uniforme_completa'))
-    def regra_deficiencia_enxofre(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'deficiencia_de_enxofre_(S)',
-            'recomendacao': 'Aplicar sulfato de amônio ou gesso agrícola (fontes de enxofre).' 
-        })
-
- 
-
-    # --- GRUPO 3: DIAGNÓSTICO DE DOENÇAS E PRAGAS ---
-
-    # 15
-    @Rule(Sintoma(observacao='po_branco_nas_folhas'))
-    def regra_oidio(self):
-        self.declare(Diagnostico(
-            causa='infeccao_fungica_oidio',
-            recomendacao='Aplicar fungicida à base de enxofre ou bicarbonato de potássio.'
-        ))
-
-    # 16
-    @Rule(Sintoma(observacao='po_branco_nas_folhas'),
-          Sintoma(observacao_inseto='pequenos_insetos_verdes_ou_pretos_agrupados'),
-          salience=5)
-    def regra_co_infeccao_oidio_pulgoes(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'co_infeccao_severa_(oidio_e_pulgoes)',
-            'recomendacao': 'ATAQUE COMBINADO: A planta está sendo atacada por fungos (Oídio) e pragas (Pulgões). Trate os Pulgões (sabão inseticida) PRIMEIRO, pois eles sugam a seiva e enfraquecem a planta. Em seguida, trate o Oídio (fungicida).'
-        })
-
-    # 17
-    @Rule(Sintoma(observacao_inseto='pequenos_insetos_verdes_ou_pretos_agrupados'),
-          Condicao(previsao_tempo='geada_iminente'),
-          salience=5)
-    def alerta_geada_em_planta_enfraquecida(self):
-        self._adicionar_resultado('Alerta', {
-            'risco': 'Risco Critico: Geada em planta enfraquecida por pragas',
-            'recomendacao': 'A infestação de pulgões/afídeos já enfraqueceu a planta. A geada iminente tem alta probabilidade de ser letal. A prioridade máxima é proteger a planta fisicamente (com manta térmica) ANTES de controlar a praga.'
-        })
-
-    # 18
-    @Rule(Sintoma(observacao='substancia_pegajosa_escura_nas_folhas', 
-                  observacao_inseto='pequenos_insetos_verdes_ou_pretos_agrupados'))
-    def regra_pulgoes(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'infestacao_de_pulgoes_(afideos)',
-            'recomendacao_controle': 'aplicar_oleo_de_neem_ou_sabao_inseticida'
-        })
-
-    # 19
-    @Rule(Sintoma(observacao='furos_irregulares_nas_folhas', 
-                  detalhe='presenca_de_lagartas_ou_fezes_escuras'))
-    def regra_lagartas(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'ataque_de_lagartas',
-            'recomendacao_controle': 'aplicar_bacillus_thuringiensis_(BT)'
-        })
-
-    # 20
-    @Rule(Sintoma(observacao='folhas_com_pontilhados_prateados_ou_amarelados', 
-                  detalhe='teias_finas_sob_as_folhas'), 
-          Condicao(clima='seco_e_quente'))
-    def regra_acaro_rajado(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'infestacao_de_acaro_rajado',
-            'recomendacao_controle': 'aumentar_umidade_relativa_e_aplicar_acaricida'
-        })
-
-    # 21
-    @Rule(Sintoma(observacao='furos_irregulares_nas_folhas'),
-          Condicao(solo_umido='encharcado'),
-          salience=5)
-    def alerta_risco_infeccao_dupla(self):
-        self._adicionar_resultado('Alerta', {
-            'risco': 'Risco Alto de Infecção Secundária (Raiz e Folha)',
-            'recomendacao': 'A planta está sofrendo estresse duplo: as raízes estão asfixiadas (solo encharcado) e as folhas estão danificadas (lagartas). A prioridade é suspender a irrigação e checar a drenagem. Os furos das lagartas são uma porta de entrada para fungos/bactérias.'
-        })
-
-    # --- GRUPO 4: ALERTAS AMBIENTAIS E PREVENTIVOS ---
-
-    # 22
-    @Rule(Condicao(temperatura_ar=P(lambda x: x > 35)), 
-          Condicao(previsao_tempo='calor_iminente'))
-    def alerta_escaldadura(self):
-        self._adicionar_resultado('Alerta', {'risco': 'Risco alto de escaldadura (queima solar)', 'recomendacao': 'Ativar sombrite ou nebulização'})
-
-    # 23
-    @Rule(Condicao(previsao_tempo='geada_iminente'), 
-          Condicao(temperatura_ar=P(lambda x: x < 3)))
-    def alerta_geada(self):
-        self._adicionar_resultado('Alerta', {'risco': 'Risco iminente de geada', 'recomendacao': 'Cobrir plantas com manta térmica ou irrigar por aspersão na madrugada'})
-
-    # 24
-    @Rule(Condicao(velocidade_vento=P(lambda x: x > 60)))
-    def alerta_acamamento(self):
-        self._adicionar_resultado('Alerta', {'risco': 'Risco de acamamento (tombamento) pelo vento', 'recomendacao': 'Reforçar estacas ou quebra-ventos'})
-
-    # 25
-    @Rule(Condicao(umidade_ar=P(lambda x: x > 85)), 
-          Condicao(periodo_chuvoso=True), 
-          Condicao(historico_area='alta_incidencia_fungica'))
-    def recomendacao_preventiva_fungo(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'condicoes_favoraveis_a_fungos_(alta_umidade_e_chuva)',
-            'recomendacao': '[PREVENTIVO] Aplicar fungicida a base de cobre devido à alta umidade.'
-        })
-    # 26
-    @Rule(Condicao(estacao_ano='inicio_primavera'), 
-          Condicao(temperatura_solo=P(lambda x: x > 18)))
-    def recomendacao_monitoramento_pragas_solo(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'risco_de_eclosao_de_pragas_de_solo_(primavera_e_solo_quente)',
-            'recomendacao': '[MONITORAMENTO] Iniciar monitoramento de pragas de solo (ex: larvas).'
-        })
-    # 27
-    @Rule(Condicao(cultura_estagio='floracao'), 
-          Condicao(previsao_tempo='chuva_forte_ou_granizo'))
-    def alerta_perda_floracao(self):
-        self._adicionar_resultado('Alerta', {'risco': 'Risco de perda de flores e falha na polinização', 'recomendacao': 'Se possível, proteger estruturas (ex: estufas)'})
-
-    # 28
-    @Rule(Condicao(umidade_ar=P(lambda x: x > 80)),
-          Condicao(temperatura_ar=P(lambda x: 15 < x < 25)))
-    def alerta_risco_mildio(self):
-        self._adicionar_resultado('Alerta', {
-            'risco': 'Risco alto de Míldio (Downy Mildew)',
-            'recomendacao': 'Condições (alta umidade e temperatura amena) são ideais para Míldio. Aumente a ventilação/espaçamento e prepare fungicida protetor (ex: cúprico).'
-        })
-
-    # 29
-    @Rule(Condicao(cultura_estagio='floracao'),
-          Condicao(temperatura_ar=P(lambda x: x > 38)))
-    def alerta_abortamento_calor(self):
-        self._adicionar_resultado('Alerta', {
-            'risco': 'Risco de abortamento floral por calor extremo',
-            'recomendacao': 'Temperaturas acima de 38°C podem esterilizar o pólen e causar a queda de flores. Aumente a frequência de irrigação para resfriar a planta e, se possível, ative o sombreamento.'
-        })
-
-    # 30
-    @Rule(Condicao(temperatura_ar=P(lambda x: 5 < x < 12)),
-          Condicao(temperatura_solo=P(lambda x: x < 15)))
-    def diagnostico_estresse_frio(self):
-        self._adicionar_resultado('Diagnostico', {
-            'causa': 'estresse_por_frio_e_solo_frio_(crescimento_lento)',
-            'recomendacao': 'O frio no ar e no solo reduz o metabolismo da planta e a absorção de nutrientes (especialmente Fósforo). Considere usar cobertura de solo (mulching) para aquecer o solo ou aplicar fertilizante foliar.'
-        })
+            activation = self.agenda.get_next()
+            steps -= 1
+            execution += 1
+
+            watchers.RULES.info(
+                "FIRE %s %s: %s",
+                execution,
+                activation.rule.__name__,
+                ", ".join(str(f) for f in activation.facts))
+
+            argumentos = {k: v
+                          for k, v in activation.context.items()
+                          if not k.startswith('__')}
+            if metricas is None:
+                activation.rule(self, **argumentos)
+            else:
+                inicio_regra = time.perf_counter()
+                activation.rule(self, **argumentos)
+                metricas.registrar_disparo(activation.rule.__name__, time.perf_counter() - inicio_regra)
+
+        self.running = False
+        if metricas is not None:
+            metricas.registrar_run(time.perf_counter() - inicio_run, self.fatos_declarados, maior_agenda)
+            if self.interrupcao:
+                metricas.registrar_interrupcao(self.interrupcao)
+        self.fatos_declarados = 0
+
+    # As regras do domínio vêm do arquivo da base de regras (ver base_regras.py)
+
     # --- REGRA FINAL: COLETA DE RESULTADOS ---
     
     @Rule(AS.f_acao << Fact(acao='buscar_solucao'),
-          Fact(resultados=MATCH.r), 
           salience=-100) 
-    def coletar_resultados(self, f_acao, r):
+    def coletar_resultados(self, f_acao):
         self.retract(f_acao) 
+        r = self.resultados
         
         print("\n--- RELATÓRIO DO SISTEMA ESPECIALISTA ---")
         
@@ -328,4 +185,201 @@ class MotorDiagnosticoAgricola(KnowledgeEngine):
                 if d.get('recomendacao_corretiva'):
                     print(f"    Correção Específica: {d.get('recomendacao_corretiva')}")
 
-        print("\n--- Fim do Relatório ---")
\ No newline at end of file
+        print("\n--- Fim do Relatório ---")
+
+
+# Carrega a base de regras (BASE_REGRAS aponta para outro arquivo .json/.yaml)
+CAMINHO_BASE_REGRAS = os.environ.get('BASE_REGRAS', base_regras.CAMINHO_BASE_PADRAO)
+VERSAO_BASE_REGRAS = base_regras.versao_base(CAMINHO_BASE_REGRAS)
+_base = base_regras.ler_base(CAMINHO_BASE_REGRAS)
+REGRAS_DA_BASE = base_regras.compilar_regras(_base, TIPOS_FATO)
+# Chaves e textos da base: os fatos recebidos passam a compartilhar essas strings
+VOCABULARIO = Vocabulario.da_base(_base)
+# Padrões das regras indexados por campo e valor (poda dos fatos e próximas perguntas)
+INDICE_DEPENDENCIAS = IndiceDependencias(_base)
+del _base
+
+# Resultados das regras já formatados (e serializados), por regra
+CATALOGO = CatalogoResultados(REGRAS_DA_BASE)
+for _nome, _regra in REGRAS_DA_BASE.items():
+    if hasattr(MotorDiagnosticoAgricola, _nome):
+        raise ValueError(f"A regra '{_nome}' da base conflita com um atributo do motor.")
+    setattr(MotorDiagnosticoAgricola, _nome, _regra)
+
+# Compila as faixas usadas pelas regras no índice de intervalos (uma vez, na importação)
+INDICE_FAIXAS.compilar()
+
+# Snapshot pré-compilado do motor (SNAPSHOT_REGRAS), carregado na primeira vez que for usado
+CAMINHO_SNAPSHOT_REGRAS = os.environ.get('SNAPSHOT_REGRAS')
+_snapshot = None
+
+
+def criar_motor(metricas=None):
+    """
+    Constrói um motor pronto para uso: a partir do snapshot, se houver um
+    configurado (sem montar a rede Rete de novo), ou construindo do zero.
+    """
+    global _snapshot
+    if not CAMINHO_SNAPSHOT_REGRAS:
+        return MotorDiagnosticoAgricola(metricas=metricas)
+    if _snapshot is None:
+        _snapshot = base_regras.carregar_snapshot(CAMINHO_SNAPSHOT_REGRAS, VERSAO_BASE_REGRAS)
+    return _snapshot.novo_motor(metricas=metricas)
+
+
+# --- 3. Execução do Motor e Formatação dos Resultados ---
+
+def novo_fato(classe, dados):
+    """Cria um fato a partir dos dados recebidos, com as strings do vocabulário da base."""
+    return classe(**VOCABULARIO.compactar(dados))
+
+
+def declarar_fatos(engine, fatos_json):
+    """Declara no motor os fatos no formato [{tipo, dados}] vindo do frontend."""
+    for fato_info in fatos_json:
+        tipo_fato = fato_info.get('tipo')
+        dados_fato = fato_info.get('dados', {})
+        
+        if tipo_fato == 'Sintoma':
+            engine.declare(novo_fato(Sintoma, dados_fato))
+        elif tipo_fato == 'Condicao':
+            engine.declare(novo_fato(Condicao, dados_fato))
+
+
+def coletar_resultados_formatados(engine):
+    """
+    Coleta os resultados do motor (de AMBAS as fontes) já formatados
+    para o frontend, a partir das entradas do catálogo.
+    """
+    causas_ja_adicionadas = set()
+    entradas = []
+
+    def adicionar_lista_de_resultados():
+        # Fonte 1: Pega a lista principal de resultados (de _adicionar_resultado)
+        for res in engine.resultados:
+            entrada = CATALOGO.resultado(res)
+            entradas.append(entrada)
+            if entrada.causa:
+                causas_ja_adicionadas.add(entrada.causa)
+
+    lista_adicionada = False
+    for idx, f in engine.facts.items():
+
+        # A lista entra na posição em que estaria na memória de trabalho
+        # (logo após os fatos existentes na última adição)
+        if not lista_adicionada and idx >= engine.marco_resultados:
+            adicionar_lista_de_resultados()
+            lista_adicionada = True
+
+        # Fonte 2: Pega os diagnósticos de encadeamento (de self.declare)
+        if isinstance(f, Diagnostico):
+            entrada = CATALOGO.diagnostico(f)
+
+            # Adiciona só se essa causa ainda não foi adicionada pela Fonte 1
+            if entrada is not None and entrada.causa not in causas_ja_adicionadas:
+                entradas.append(entrada)
+                causas_ja_adicionadas.add(entrada.causa) # Marca como adicionada
+
+    if not lista_adicionada:
+        adicionar_lista_de_resultados()
+
+    return ResultadosFormatados(entradas, interrupcao=engine.interrupcao)
+
+
+def diagnosticar_fatos(engine, fatos_json):
+    """
+    Executa um diagnóstico completo num motor já resetado:
+    declara os fatos, roda o motor e devolve os resultados formatados.
+    Só são declarados os fatos que alimentam alguma regra que pode disparar
+    com eles (pelo índice de dependências): as demais regras ficam de fora
+    da execução, e o resultado é o mesmo.
+    """
+    declarar_fatos(engine, INDICE_DEPENDENCIAS.alcance(fatos_json).fatos)
+    engine.run()
+    return coletar_resultados_formatados(engine)
+
+
+# --- 4. Diagnóstico em Lote (vários talhões em paralelo) ---
+
+# Motor próprio de cada thread (construído uma única vez por thread). Nos
+# processos do pool é o motor do processo; lotes pequenos rodam na thread da
+# requisição, e requisições simultâneas não podem dividir o mesmo motor.
+_motores_locais = threading.local()
+
+def _inicializar_processo():
+    _motores_locais.motor = criar_motor()
+
+def _diagnosticar_no_processo(fatos_json):
+    """Roda um talhão no motor da thread atual. Erros voltam como resultado."""
+    if getattr(_motores_locais, 'motor', None) is None:
+        _inicializar_processo()
+
+    engine = _motores_locais.motor
+    engine.reset()
+    try:
+        return diagnosticar_fatos(engine, fatos_json)
+    except Exception as e:
+        return {"erro": str(e)}
+
+
+class DiagnosticoLote:
+    """
+    Diagnostica vários talhões de uma vez, distribuindo-os entre os
+    núcleos da CPU num pool de processos que fica vivo entre chamadas.
+
+    Entrada: lista de {'talhao': <id>, 'fatos': [{tipo, dados}, ...]}
+    Saída:   {<id>: [resultados formatados]} (ou {'erro': ...} por talhão)
+    """
+
+    def __init__(self, processos=None, minimo_para_paralelizar=8):
+        self.processos = processos or os.cpu_count() or 1
+        # Lotes pequenos rodam no próprio processo (não compensa o IPC)
+        self.minimo_para_paralelizar = minimo_para_paralelizar
+        self._executor = None
+
+    def _obter_executor(self):
+        if self._executor is None:
+            # Importado só aqui: o pool de processos não faz parte da partida do motor
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=self.processos,
+                                                 initializer=_inicializar_processo)
+        return self._executor
+
+    def diagnosticar(self, talhoes):
+        ids = []
+        ids_vistos = set()
+        lista_fatos = []
+        for talhao in talhoes:
+            talhao_id = talhao.get('talhao')
+            if talhao_id is None:
+                raise ValueError("Todo talhão do lote precisa de um campo 'talhao'.")
+            if talhao_id in ids_vistos:
+                raise ValueError(f"Talhão repetido no lote: {talhao_id}")
+            ids.append(talhao_id)
+            ids_vistos.add(talhao_id)
+            lista_fatos.append(talhao.get('fatos', []))
+
+        if self.processos == 1 or len(lista_fatos) < self.minimo_para_paralelizar:
+            resultados = map(_diagnosticar_no_processo, lista_fatos)
+        else:
+            # Agrupa os talhões para reduzir a troca de mensagens entre processos
+            chunksize = max(1, len(lista_fatos) // (self.processos * 4))
+            resultados = self._obter_executor().map(_diagnosticar_no_processo,
+                                                    lista_fatos,
+                                                    chunksize=chunksize)
+
+        return dict(zip(ids, resultados))
+
+    def encerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def diagnosticar_lote(talhoes, processos=None):
+    """Atalho para um diagnóstico em lote avulso (cria e encerra o pool)."""
+    lote = DiagnosticoLote(processos=processos)
+    try:
+        return lote.diagnosticar(talhoes)
+    finally:
+        lote.encerrar()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+from contextlib import contextmanager
+
+from motor_diagnostico import MotorDiagnosticoAgricola
+
+
+class PoolOcupado(Exception):
+    """Nenhum motor livre: fila de espera cheia ou tempo de espera esgotado."""
+
+
+class PoolMotores:
+    """
+    Pool de motores já construídos (rede Rete pronta) para reaproveitar
+    entre requisições. Cada motor sai do pool já no estado de
+    `_fatos_iniciais` e volta a ele ao ser devolvido.
+
+    O tamanho do pool limita os diagnósticos simultâneos. Com `max_espera`,
+    no máximo essa quantidade de requisições espera por um motor (as demais
+    são recusadas na hora) e cada uma espera até `tempo_espera` segundos.
+    """
+
+    def __init__(self, tamanho=4, fabrica=MotorDiagnosticoAgricola, max_espera=None, tempo_espera=None):
+        if tamanho < 1:
+            raise ValueError("O pool precisa de pelo menos 1 motor.")
+
+        self.tamanho = tamanho
+        self.max_espera = max_espera
+        self.tempo_espera = tempo_espera
+        self._fabrica = fabrica
+        self._livres = queue.LifoQueue(maxsize=tamanho)  # LIFO: reusa o motor mais "quente"
+        self._lock = threading.Lock()
+
+        # Contadores de uso
+        self.retiradas = 0
+        self.esperas = 0
+        self.recusadas = 0
+        self._aguardando = 0
+
+        for _ in range(tamanho):
+            self._livres.put(self._novo_motor())
+
+    def _novo_motor(self):
+        """Constrói um motor (a parte cara) e já o deixa resetado."""
+        engine = self._fabrica()
+        engine.reset()
+        return engine
+
+    def retirar(self, timeout=None):
+        """
+        Pega um motor livre; se todos estiverem em uso, espera na fila (até
+        `timeout` ou `tempo_espera` segundos). Levanta PoolOcupado se a fila
+        de espera estiver cheia ou se o tempo acabar.
+        """
+        try:
+            engine = self._livres.get_nowait()
+            esperou = False
+        except queue.Empty:
+            esperou = True
+            with self._lock:
+                if self.max_espera is not None and self._aguardando >= self.max_espera:
+                    self.recusadas += 1
+                    raise PoolOcupado("Todos os motores estão em uso e a fila de espera está cheia.")
+                self._aguardando += 1
+            try:
+                engine = self._livres.get(timeout=self.tempo_espera if timeout is None else timeout)
+            except queue.Empty:
+                with self._lock:
+                    self.recusadas += 1
+                raise PoolOcupado("Nenhum motor ficou livre a tempo.") from None
+            finally:
+                with self._lock:
+                    self._aguardando -= 1
+
+        with self._lock:
+            self.retiradas += 1
+            if esperou:
+                self.esperas += 1
+        return engine
+
+    def devolver(self, engine):
+        """Reseta o motor para os fatos iniciais e o devolve ao pool."""
+        try:
+            engine.reset()
+        except Exception:
+            # Motor ficou inconsistente: troca por um novo
+            engine = self._novo_motor()
+        self._livres.put_nowait(engine)
+
+    @contextmanager
+    def motor(self, timeout=None):
+        """
+        Uso:
+            with pool.motor() as engine:
+                engine.declare(...)
+                engine.run()
+        """
+        engine = self.retirar(timeout=timeout)
+        try:
+            yield engine
+        finally:
+            self.devolver(engine)
+
+    def estatisticas(self):
+        """Resumo do uso do pool."""
+        with self._lock:
+            return {
+                'tamanho': self.tamanho,
+                'livres': self._livres.qsize(),
+                'retiradas': self.retiradas,
+                'esperas': self.esperas,
+                'aguardando': self._aguardando,
+                'max_espera': self.max_espera,
+                'recusadas': self.recusadas,
+            }
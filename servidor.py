@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Servidor de produção com vários processos (pre-fork).
+
+O processo mestre importa o app uma única vez (motor_diagnostico, a base de
+regras e o pool de motores com a rede Rete já construída), congela o coletor
+de lixo e só então cria os workers com fork: o estado pré-carregado fica
+compartilhado copy-on-write. Cada worker roda um diagnóstico de aquecimento
+em todos os motores do seu pool antes de aceitar conexões no socket
+compartilhado.
+
+Sinais (enviados ao mestre):
+    SIGHUP          reinício gracioso: o mestre confere se o código novo
+                    importa, se reexecuta (recarregando código e regras),
+                    sobe os workers novos e só então encerra os antigos
+    SIGTERM/SIGINT  encerramento gracioso
+
+Um worker que recebe SIGTERM para de aceitar conexões e termina as
+requisições em andamento antes de sair.
+
+Uso:
+    python servidor.py [--workers 4] [--host 0.0.0.0] [--porta 8000]
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Variáveis usadas para passar o socket e os workers antigos ao mestre reexecutado
+_AMBIENTE_SOCKET = 'SERVIDOR_SOCKET_FD'
+_AMBIENTE_ANTIGOS = 'SERVIDOR_WORKERS_ANTIGOS'
+# Com ela o app não carrega nem grava o estado dos campos no import (app.AMBIENTE_ESTADO_NOS_WORKERS):
+# cada worker carrega ao subir e grava ao sair, e o mestre nunca toca no arquivo
+_AMBIENTE_ESTADO_CAMPOS = 'ESTADO_CAMPOS_NOS_WORKERS'
+
+# Marca o DIRETORIO_METRICAS criado pelo próprio servidor (apagado no encerramento, mantido nos reinícios)
+_AMBIENTE_METRICAS_TEMPORARIAS = 'SERVIDOR_METRICAS_TEMPORARIAS'
+
+# Diagnóstico de aquecimento: passa por faixas numéricas, encadeamento e alertas
+FATOS_AQUECIMENTO = [
+    {'tipo': 'Sintoma', 'dados': {'local': 'folhas_velhas', 'cor': 'amarelada_entre_nervuras'}},
+    {'tipo': 'Sintoma', 'dados': {'observacao': 'po_branco_nas_folhas'}},
+    {'tipo': 'Condicao', 'dados': {'ph_solo': 5.0}},
+    {'tipo': 'Condicao', 'dados': {'temperatura_ar': 20}},
+    {'tipo': 'Condicao', 'dados': {'umidade_ar': 90}},
+    {'tipo': 'Condicao', 'dados': {'sensor_umidade_solo': 20}},
+    {'tipo': 'Condicao', 'dados': {'tipo_solo': 'arenoso'}},
+    {'tipo': 'Condicao', 'dados': {'previsao_tempo': 'geada_iminente'}},
+]
+
+
+class _Requisicao(WSGIRequestHandler):
+    # Conexões keep-alive ociosas são fechadas: sem isso um worker em
+    # encerramento esperaria indefinidamente por clientes parados
+    timeout = 5
+
+
+def _log(mensagem):
+    print(f"[servidor {os.getpid()}] {mensagem}", file=sys.stderr, flush=True)
+
+
+def aquecer(aplicacao):
+    """Roda o diagnóstico de aquecimento em todos os motores do pool."""
+    from motor_diagnostico import diagnosticar_fatos
+
+    pool = aplicacao.pool_motores
+    motores = [pool.retirar() for _ in range(pool.tamanho)]
+    try:
+        for engine in motores:
+            metricas, engine.metricas = engine.metricas, None  # Aquecimento não entra no /metrics
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    diagnosticar_fatos(engine, FATOS_AQUECIMENTO)
+            finally:
+                engine.metricas = metricas
+    finally:
+        for engine in motores:
+            pool.devolver(engine)
+
+
+def _servir(aplicacao, sock, args, aviso_pronto=None):
+    """
+    Laço de um worker: carrega o estado dos campos, aquece, passa a publicar
+    as métricas, avisa o mestre e atende até receber SIGTERM.
+    """
+    aplicacao.iniciar_estado_campos()
+    aquecer(aplicacao)
+    if aplicacao.metricas_workers is not None:
+        aplicacao.metricas_workers.iniciar()
+    servidor = make_server(args.host, args.porta, aplicacao.app, threaded=True,
+                           request_handler=_Requisicao, fd=sock.fileno())
+    servidor.daemon_threads = False  # server_close() espera as requisições em andamento
+
+    def parar(*_):
+        # shutdown() espera o serve_forever terminar: não pode rodar na mesma thread
+        threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, parar)
+    if aviso_pronto is not None:
+        os.write(aviso_pronto, b'1')
+        os.close(aviso_pronto)
+
+    servidor.serve_forever()
+    servidor.server_close()
+
+
+class Mestre:
+    """Cria, acompanha e substitui os workers."""
+
+    def __init__(self, aplicacao, sock, args, antigos=()):
+        self.aplicacao = aplicacao
+        self.sock = sock
+        self.args = args
+        self.workers = set()
+        self.antigos = set(antigos)  # Workers da geração anterior (antes do SIGHUP)
+        self._recarregar = False
+        self._encerrar = False
+
+    def _iniciar_worker(self):
+        leitura, escrita = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                os.close(leitura)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C é tratado pelo mestre
+                signal.signal(signal.SIGHUP, signal.SIG_DFL)
+                _servir(self.aplicacao, self.sock, self.args, escrita)
+            except BaseException as e:
+                _log(f"worker falhou: {e!r}")
+                codigo = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            sys.exit(codigo)  # sys.exit (e não os._exit): a auditoria pendente é gravada no atexit
+        os.close(escrita)
+        self.workers.add(pid)
+        return pid, leitura
+
+    def _iniciar_workers(self, quantidade, timeout=120):
+        """
+        Inicia `quantidade` workers e espera (até `timeout` segundos no total)
+        que terminem o aquecimento. Quem não avisar a tempo é morto (SIGKILL;
+        o _recolher cuida dele). Retorna quantos ficaram prontos.
+        """
+        avisos = {leitura: pid for pid, leitura in (self._iniciar_worker() for _ in range(quantidade))}
+        limite = time.monotonic() + timeout
+        prontos = 0
+        while avisos:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            legiveis, _, _ = select.select(list(avisos), [], [], restante)
+            for leitura in legiveis:
+                # Fim do pipe sem aviso: o worker saiu durante o aquecimento
+                if os.read(leitura, 1):
+                    prontos += 1
+                os.close(leitura)
+                del avisos[leitura]
+        for leitura, pid in avisos.items():
+            _log(f"worker {pid} não ficou pronto em {timeout} s; encerrando")
+            os.close(leitura)
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+        return prontos
+
+    def _recolher(self):
+        """Recolhe os workers que saíram e repõe os da geração atual."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.antigos.discard(pid)
+            metricas_workers = getattr(self.aplicacao, 'metricas_workers', None)
+            if metricas_workers is not None:
+                metricas_workers.juntar_encerrado(pid)  # Os contadores do worker continuam no /metrics
+            if pid in self.workers:
+                self.workers.discard(pid)
+                if not self._encerrar:
+                    _log(f"worker {pid} saiu (status {status}); iniciando outro")
+                    time.sleep(0.5)  # Evita laço de reinício se o worker falha logo ao subir
+                    self._iniciar_workers(1)
+
+    def _reexecutar(self):
+        """Reinício gracioso: novo código no mesmo pid, herdando socket e workers."""
+        # Sem ARQUIVO_ESTADO_CAMPOS: a verificação não pode gravar o arquivo dos campos ao sair
+        verificacao = subprocess.run([sys.executable, '-c', 'import app'], cwd=os.getcwd(),
+                                     capture_output=True, text=True, env=dict(os.environ, ARQUIVO_ESTADO_CAMPOS=''))
+        if verificacao.returncode != 0:
+            _log("reinício cancelado: o código novo não importa\n" + verificacao.stderr[-2000:])
+            return
+        _log("reiniciando (os workers atuais atendem até os novos ficarem prontos)")
+        self.sock.set_inheritable(True)
+        os.environ[_AMBIENTE_SOCKET] = str(self.sock.fileno())
+        os.environ[_AMBIENTE_ANTIGOS] = ','.join(map(str, self.workers | self.antigos))
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def _encerrar_workers(self, pids, timeout=30):
+        for pid in pids:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        limite = time.monotonic() + timeout
+        while (self.workers or self.antigos) and time.monotonic() < limite:
+            self._recolher()
+            time.sleep(0.1)
+        for pid in self.workers | self.antigos:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+
+    def executar(self):
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, '_recarregar', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, '_encerrar', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, '_encerrar', True))
+
+        if self.antigos and getattr(self.aplicacao, 'ARQUIVO_ESTADO_CAMPOS', None):
+            # Os workers novos só podem carregar o estado dos campos depois que os antigos o gravaram:
+            # os antigos saem primeiro (as conexões esperam no socket, que continua aberto no mestre)
+            _log("estado dos campos: encerrando os workers antigos antes de subir os novos")
+            self._encerrar_workers(self.antigos)
+
+        prontos = self._iniciar_workers(self.args.workers)
+        _log(f"{prontos}/{self.args.workers} workers prontos em http://{self.args.host}:{self.args.porta}")
+
+        if prontos < self.args.workers:
+            if not self.antigos:
+                _log("falha na partida: nem todos os workers ficaram prontos")
+                self._encerrar = True
+                self._encerrar_workers(self.workers)
+                sys.exit(1)
+            # Reinício: a geração nova é descartada e a anterior continua atendendo
+            _log("reinício falhou: nem todos os workers novos ficaram prontos; a geração anterior continua")
+            for pid in self.workers:
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(pid, signal.SIGTERM)
+            self.workers, self.antigos = self.antigos, set()
+
+        if self.antigos:
+            # Os novos já aceitam conexões: os antigos terminam o que estão atendendo e saem
+            for pid in self.antigos:
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(pid, signal.SIGTERM)
+
+        while not self._encerrar:
+            if self._recarregar:
+                self._recarregar = False
+                self._reexecutar()
+            self._recolher()
+            time.sleep(0.2)
+
+        _log("encerrando")
+        self._encerrar = True
+        self._encerrar_workers(self.workers | self.antigos)
+        if os.environ.get(_AMBIENTE_METRICAS_TEMPORARIAS):
+            shutil.rmtree(os.environ['DIRETORIO_METRICAS'], ignore_errors=True)
+
+
+def _socket_de_escuta(host, porta):
+    herdado = os.environ.pop(_AMBIENTE_SOCKET, None)
+    if herdado is not None:
+        return socket.socket(fileno=int(herdado))
+    familia = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, porta))
+    sock.listen(1024)
+    return sock
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de produção (vários processos)")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--porta', type=int, default=int(os.environ.get('PORTA', 8000)))
+    parser.add_argument('--silencioso', action='store_true', help="Não registra cada requisição no log")
+    args = parser.parse_args()
+
+    if args.silencioso:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    sock = _socket_de_escuta(args.host, args.porta)
+    antigos = [int(pid) for pid in os.environ.pop(_AMBIENTE_ANTIGOS, '').split(',') if pid]
+
+    # Pré-carga: motor, base de regras e pool de motores montados uma vez no mestre
+    os.environ[_AMBIENTE_ESTADO_CAMPOS] = '1'
+    if hasattr(os, 'fork') and not os.environ.get('DIRETORIO_METRICAS'):
+        # Cada worker publica as suas métricas aqui; o /metrics de qualquer um soma as de todos
+        os.environ['DIRETORIO_METRICAS'] = tempfile.mkdtemp(prefix='metricas-servidor-')
+        os.environ[_AMBIENTE_METRICAS_TEMPORARIAS] = '1'
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as aplicacao
+    if not antigos and aplicacao.metricas_workers is not None:
+        aplicacao.metricas_workers.limpar()  # Partida do zero: nada de uma execução anterior
+
+    if not hasattr(os, 'fork'):
+        # Sem fork (Windows): um único processo com threads, já aquecido
+        _log(f"fork indisponível: um processo em http://{args.host}:{args.porta}")
+        _servir(aplicacao, sock, args)
+        return
+
+    # Objetos pré-carregados saem da coleta de lixo: o GC não escreve neles e
+    # as páginas continuam compartilhadas entre os workers
+    gc.collect()
+    gc.freeze()
+    Mestre(aplicacao, sock, args, antigos).executar()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,17 +14,62 @@ document.addEventListener("DOMContentLoaded", () => {
   const modalTitle = document.getElementById("modal-title");
   const modalOptions = document.getElementById("modal-options");
 
+  // Campos que cada menu pergunta ("Tipo.campo")
+  const camposDosMenus = [
+    [btnFolha, ["Sintoma.local", "Sintoma.cor", "Sintoma.aspecto", "Sintoma.ponto_crescimento"]],
+    [btnPraga, ["Sintoma.observacao", "Sintoma.observacao_inseto", "Sintoma.detalhe", "Condicao.clima"]],
+    [btnSolo, ["Condicao.solo_umido", "Condicao.ph_solo", "Condicao.tipo_solo", "Condicao.sensor_umidade_solo",
+               "Sintoma.planta_aparencia", "Sintoma.planta_folhas_baixas"]],
+    [btnClima, ["Condicao.previsao_tempo", "Condicao.temperatura_ar", "Condicao.velocidade_vento",
+                "Condicao.umidade_ar", "Condicao.temperatura_solo", "Condicao.estacao_ano",
+                "Condicao.periodo_chuvoso", "Condicao.cultura_estagio", "Condicao.historico_area",
+                "Condicao.tipo_cultura"]],
+  ];
+
+  // Número da última consulta a /proximas-perguntas: respostas de consultas anteriores são descartadas
+  let consultaPerguntas = 0;
+
+  /**
+   * Desabilita os menus cujas perguntas não podem mais mudar o diagnóstico
+   * (segundo /proximas-perguntas). Se a consulta falhar, tudo fica habilitado.
+   */
+  async function atualizarPerguntas() {
+    const consulta = ++consultaPerguntas;
+    let pendentes = null;
+    try {
+      const resposta = await fetch("/proximas-perguntas", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(fatosAcumulados),
+      });
+      if (resposta.ok) {
+        const { perguntas } = await resposta.json();
+        pendentes = new Set(perguntas.map((p) => `${p.tipo}.${p.campo}`));
+      }
+    } catch (erro) {
+      pendentes = null;
+    }
+    if (consulta !== consultaPerguntas) {
+      return; // Chegou fora de ordem: os fatos já mudaram e outra consulta está a caminho
+    }
+    camposDosMenus.forEach(([botao, campos]) => {
+      botao.disabled = pendentes !== null && !campos.some((campo) => pendentes.has(campo));
+    });
+  }
+
   function adicionarFato(tipo, dados, descricao) {
     fatosAcumulados.push({ tipo: tipo, dados: dados });
     const li = document.createElement("li");
     li.textContent = `[${tipo}] ${descricao}`;
     listaFatosUI.appendChild(li);
+    atualizarPerguntas();
   }
 
   function limparSessao() {
     fatosAcumulados = [];
     listaFatosUI.innerHTML = "";
     resultadosUI.innerHTML = "";
+    atualizarPerguntas();
   }
 
   /**
@@ -491,8 +536,12 @@ document.addEventListener("DOMContentLoaded", () => {
       const resultados = await resposta.json();
 
       resultadosUI.innerHTML = "";
-      if (resultados.length === 0) {
+      if (resposta.headers.get("X-Diagnostico-Interrompido")) {
         resultadosUI.innerHTML =
+          '<div class="alerta">Diagnóstico interrompido pelo limite de processamento: os resultados podem estar incompletos.</div>';
+      }
+      if (resultados.length === 0) {
+        resultadosUI.innerHTML +=
           "<div>Nenhuma conclusão pôde ser determinada.</div>";
         return;
       }
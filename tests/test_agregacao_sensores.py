@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Histerese das janelas de sensores nos limites das faixas (inclusive um
+valor exatamente no limite de `abaixo_de`/`acima_de`) e leituras com um
+sensor desconhecido rejeitadas sem mexer nas janelas. Mínimo, máximo,
+média e tempo acima/abaixo de cada limite iguais aos recalculados do zero
+sobre as leituras da janela.
+"""
+
+import random
+
+import pytest
+
+from agregacao_sensores import AgregadorCampo, ConfigJanela, JanelaSensor
+from faixas import IndiceFaixas, abaixo_de, acima_de, entre
+
+
+def _agregador(*faixas):
+    indice = IndiceFaixas()
+    for faixa in faixas:
+        indice.teste('t', faixa)
+    return AgregadorCampo({'t': ConfigJanela(100, 'ultimo', 0.6)}, indice=indice)
+
+
+def _ler(agregador, momento, valor):
+    return agregador.registrar([{'sensor': 't', 'valor': valor, 'momento': momento}])
+
+
+@pytest.mark.parametrize('faixa, fora, limite', [(abaixo_de(30), 20, 30), (acima_de(30), 40, 30)])
+def test_valor_exatamente_no_limite_respeita_a_histerese(faixa, fora, limite):
+    agregador = _agregador(faixa)
+    for momento in range(0, 60, 10):
+        _ler(agregador, momento, fora)
+    assert agregador.declarados['t'] == fora
+
+    # Chega exatamente no limite (fora da faixa aberta): ainda sem tempo suficiente do lado novo
+    assert _ler(agregador, 60, limite) == []
+    momento = 60
+    while agregador.declarados['t'] == fora:
+        momento += 10
+        fatos = _ler(agregador, momento, limite)
+        janela = agregador._sensores['t']
+        no_limite = janela.tempo_na_faixa(0, dentro=False)
+        if fatos:
+            assert fatos == [{'tipo': 'Condicao', 'dados': {'t': limite}}]
+            assert no_limite >= 0.6 * janela.tempo_total()
+        else:
+            assert no_limite < 0.6 * janela.tempo_total()
+    assert momento > 70
+
+
+def test_sem_fracao_minima_o_limite_muda_na_hora():
+    agregador = _agregador(abaixo_de(30))
+    agregador.janelas['t'] = ConfigJanela(100, 'ultimo')
+    _ler(agregador, 0, 20)
+    assert _ler(agregador, 1, 30) == [{'tipo': 'Condicao', 'dados': {'t': 30.0}}]
+
+
+def test_sensor_desconhecido_nao_altera_as_janelas():
+    agregador = _agregador(abaixo_de(30))
+    _ler(agregador, 0, 20)
+    resumo = agregador.resumo()
+    with pytest.raises(ValueError):
+        agregador.registrar([{'sensor': 't', 'valor': 40, 'momento': 10},
+                             {'sensor': 'desconhecido', 'valor': 1, 'momento': 10}])
+    assert agregador.resumo() == resumo
+    assert set(agregador._sensores) == {'t'}
+
+
+def _janela_recalculada(leituras, segundos, capacidade):
+    """As leituras que ficam na janela, recalculadas do zero a cada leitura nova (o modelo da JanelaSensor)."""
+    janela = []
+    for momento, valor in leituras:
+        if janela:
+            momento = max(momento, janela[-1][0])  # Fora de ordem conta como o último
+        janela = (janela + [(momento, valor)])[-capacidade:]
+        while len(janela) > 1 and janela[0][0] < momento - segundos:
+            janela.pop(0)
+    return janela
+
+
+@pytest.mark.parametrize('semente', range(8))
+def test_janela_igual_ao_recalculo_da_forca_bruta(semente):
+    rng = random.Random(semente)
+    indice = IndiceFaixas()
+    for faixa in (acima_de(30), abaixo_de(10), entre(15, 25)):
+        indice.teste('t', faixa)
+    segundos, capacidade = rng.choice([(50, 1024), (200, 16), (30, 4)])
+    janela = JanelaSensor(indice.campo('t'), segundos, capacidade)
+    limites = indice.campo('t').pontos
+
+    leituras = []
+    momento = 0.0
+    for _ in range(400):
+        momento += rng.choice([0, 0.5, 1, 3, 10, -2])  # Inclui leituras simultâneas e fora de ordem
+        # Valores sorteados em volta dos limites, inclusive exatamente neles
+        valor = rng.choice([rng.uniform(0, 40), rng.choice(limites)])
+        leituras.append((momento, valor))
+        janela.adicionar(momento, valor)
+
+        esperada = _janela_recalculada(leituras, segundos, capacidade)
+        valores = [v for _, v in esperada]
+        assert len(janela) == len(esperada)
+        assert janela.minimo == min(valores)
+        assert janela.maximo == max(valores)
+        assert janela.media == pytest.approx(sum(valores) / len(valores))
+        assert janela.tempo_total() == pytest.approx(esperada[-1][0] - esperada[0][0])
+        trechos = list(zip(esperada, esperada[1:]))  # Cada leitura vale até a próxima
+        for limite in limites:
+            acima = sum(m2 - m1 for (m1, v), (m2, _) in trechos if v > limite)
+            abaixo = sum(m2 - m1 for (m1, v), (m2, _) in trechos if v < limite)
+            assert janela.tempo_acima(limite) == pytest.approx(acima, abs=1e-6)
+            assert janela.tempo_abaixo(limite) == pytest.approx(abaixo, abs=1e-6)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Rotação do arquivo de auditoria com vários processos escrevendo (workers
+do servidor.py): nenhum registro se perde, se mistura com outro ou vai
+parar no arquivo de outra data. O escritor em segundo plano tem fila
+limitada (e conta os descartes), grava em lotes, esvazia a fila ao
+encerrar e recria a thread num processo criado por fork.
+"""
+
+import datetime
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from auditoria import ArquivoRotativo, EscritorAuditoria
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROCESSOS = 4
+REGISTROS = 300
+
+
+def _linhas(diretorio):
+    linhas = []
+    for caminho in glob.glob(os.path.join(diretorio, 'auditoria*.json')):
+        with open(caminho, encoding='utf-8') as arquivo:
+            linhas += arquivo.read().splitlines()
+    return linhas
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="sem fork")
+def test_varios_processos_rotacionando_o_mesmo_arquivo(tmp_path):
+    caminho = str(tmp_path / 'auditoria.json')
+    pids = []
+    for p in range(PROCESSOS):
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                arquivo = ArquivoRotativo(caminho, tamanho_maximo=4096)
+                for i in range(REGISTROS):
+                    arquivo.escrever(json.dumps({'p': p, 'i': i, 'carga': 'x' * (i % 50)}) + "\n")
+            except BaseException:
+                codigo = 1
+            os._exit(codigo)
+        pids.append(pid)
+    for pid in pids:
+        assert os.WEXITSTATUS(os.waitpid(pid, 0)[1]) == 0
+
+    registros = [json.loads(linha) for linha in _linhas(str(tmp_path))]
+    assert sorted((r['p'], r['i']) for r in registros) == [(p, i) for p in range(PROCESSOS) for i in range(REGISTROS)]
+    assert len(glob.glob(str(tmp_path / 'auditoria.*.*.json'))) > 1
+
+
+def test_virada_do_dia_rotaciona_uma_vez_so(tmp_path):
+    caminho = str(tmp_path / 'auditoria.json')
+    ontem = datetime.date.today() - datetime.timedelta(days=1)
+    # Dois workers que abriram o arquivo ontem
+    primeiro = ArquivoRotativo(caminho)
+    segundo = ArquivoRotativo(caminho)
+    primeiro.escrever('ontem\n')
+    momento = time.mktime(ontem.timetuple()) + 12 * 3600
+    os.utime(caminho, (momento, momento))
+
+    primeiro.escrever('hoje 1\n')
+    segundo.escrever('hoje 2\n')  # Não pode rotacionar o arquivo que o primeiro acabou de abrir
+
+    with open(str(tmp_path / f'auditoria.{ontem.isoformat()}.1.json'), encoding='utf-8') as arquivo:
+        assert arquivo.read() == 'ontem\n'
+    with open(caminho, encoding='utf-8') as arquivo:
+        assert arquivo.read() == 'hoje 1\nhoje 2\n'
+    assert not os.path.exists(str(tmp_path / f'auditoria.{ontem.isoformat()}.2.json'))
+
+
+def _escritor(tmp_path, **opcoes):
+    return EscritorAuditoria(str(tmp_path / 'auditoria.txt'), str(tmp_path / 'auditoria.json'), **opcoes)
+
+
+def _registros_json(tmp_path):
+    return _linhas(str(tmp_path))
+
+
+def _esperar(condicao, timeout=5):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+
+def test_fila_cheia_descarta_e_conta(tmp_path):
+    escritor = _escritor(tmp_path, capacidade=5, tamanho_lote=1, intervalo=60)
+    gravando = threading.Event()
+    liberar = threading.Event()
+    gravar = escritor._gravar
+
+    def gravar_bloqueado(registros):
+        gravando.set()
+        liberar.wait(10)
+        gravar(registros)
+
+    escritor._gravar = gravar_bloqueado
+    escritor.registrar([{'causa': 'primeiro'}])
+    assert gravando.wait(5)  # A thread está presa gravando o primeiro: a fila só enche
+    inicio = time.monotonic()
+    for i in range(19):
+        escritor.registrar([{'causa': f'r{i}'}])
+    assert time.monotonic() - inicio < 1  # registrar nunca espera
+    assert escritor.estatisticas()['fila'] == 5
+    assert escritor.estatisticas()['descartados'] == 14
+
+    liberar.set()
+    escritor.encerrar()
+    estatisticas = escritor.estatisticas()
+    assert (estatisticas['gravados'], estatisticas['descartados'], estatisticas['fila']) == (6, 14, 0)
+    assert len(_registros_json(tmp_path)) == 6
+
+
+def test_grava_em_lotes_e_esvazia_a_fila_ao_encerrar(tmp_path):
+    escritor = _escritor(tmp_path, tamanho_lote=10, intervalo=60)
+    for i in range(25):
+        escritor.registrar([{'causa': f'r{i}'}])
+    _esperar(lambda: escritor.estatisticas()['gravados'] == 20)  # Dois lotes cheios, sem esperar o intervalo
+    time.sleep(0.1)
+    assert escritor.estatisticas()['lotes_gravados'] == 2
+    assert len(_registros_json(tmp_path)) == 20
+
+    escritor.encerrar()
+    assert escritor.estatisticas()['lotes_gravados'] == 3
+    assert len(_registros_json(tmp_path)) == 25
+
+
+def test_registros_pendentes_gravados_na_saida_do_processo(tmp_path):
+    codigo = (
+        "import sys\n"
+        "from auditoria import EscritorAuditoria\n"
+        f"escritor = EscritorAuditoria({str(tmp_path / 'auditoria.txt')!r}, {str(tmp_path / 'auditoria.json')!r},"
+        " intervalo=60)\n"
+        "for i in range(3):\n"
+        "    escritor.registrar([{'causa': i}])\n"
+        "sys.exit(0)\n")  # Sem encerrar(): quem grava é o atexit
+    subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, check=True, timeout=60)
+    assert len(_registros_json(tmp_path)) == 3
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="sem fork")
+def test_thread_recriada_no_processo_filho(tmp_path):
+    escritor = _escritor(tmp_path, intervalo=60)
+    thread_do_pai = escritor._thread
+    pid = os.fork()
+    if pid == 0:
+        codigo = 1
+        try:
+            escritor.registrar([{'causa': 'filho'}])
+            if escritor._thread is not thread_do_pai and escritor._thread.is_alive():
+                escritor.encerrar()
+                if escritor.estatisticas()['gravados'] == 1:
+                    codigo = 0
+        finally:
+            os._exit(codigo)
+    assert os.WEXITSTATUS(os.waitpid(pid, 0)[1]) == 0
+    assert [json.loads(linha)['resultados'] for linha in _registros_json(tmp_path)] == [[{'causa': 'filho'}]]
+
+    # O pai continua com a sua própria thread
+    escritor.registrar([{'causa': 'pai'}])
+    escritor.encerrar()
+    assert escritor.estatisticas()['gravados'] == 1
+    assert len(_registros_json(tmp_path)) == 2
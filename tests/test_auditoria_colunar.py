@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Compactação incremental da auditoria: depois de várias execuções (com
+rotação do arquivo e momentos fora de ordem) as consultas dão as mesmas
+contagens que uma leitura direta do JSONL, e cada execução só grava as
+linhas novas. Um arquivo truncado volta a ser lido do início.
+"""
+
+import collections
+import datetime
+import json
+import os
+import random
+import time
+
+import pytest
+
+from auditoria import formatar_registro_json
+from auditoria_colunar import ArmazemAuditoria, compactar, interpretar_momento
+
+CAUSAS = ['Deficiência de Magnésio', 'Oídio', 'Geada', 'Ferrugem']
+RISCOS = ['Alto', 'Médio', None]
+INICIO = datetime.datetime(2026, 10, 11, 8, 0)
+
+
+def _resultado(rng):
+    return {'tipo': rng.choice(['Diagnostico', 'Alerta']), 'causa': rng.choice(CAUSAS), 'risco': rng.choice(RISCOS)}
+
+
+def _registro(rng, i):
+    momento = INICIO + datetime.timedelta(seconds=30 * i + rng.randint(-90, 90))  # Fora de ordem às vezes
+    if rng.random() < 0.2:
+        resultados = {f"talhao-{t}": [_resultado(rng) for _ in range(rng.randint(0, 2))] for t in range(2)}
+    else:
+        resultados = [_resultado(rng) for _ in range(rng.randint(0, 3))]
+    return momento, resultados
+
+
+def _direto(registros, inicio, fim, agrupar, tipo=None, busca=None):
+    """Contagens calculadas direto dos registros (a referência)."""
+    grupos = collections.Counter()
+    contados = set()
+    for numero, (momento, resultados) in enumerate(registros):
+        segundos = interpretar_momento(momento.isoformat())
+        if (inicio is not None and segundos < inicio) or (fim is not None and segundos >= fim):
+            continue
+        if isinstance(resultados, dict):
+            itens = [(talhao, item) for talhao, lista in resultados.items() for item in lista or [None]]
+        else:
+            itens = [(None, item) for item in resultados or [None]]
+        for talhao, item in itens:
+            item = dict(item or {}, talhao=talhao)
+            if tipo is not None and item.get('tipo') != tipo:
+                continue
+            valor = item.get(agrupar)
+            if busca and (valor is None or busca.casefold() not in valor.casefold()):
+                continue
+            contados.add(numero)
+            if valor is not None:
+                grupos[valor] += 1
+    return len(contados), dict(grupos)
+
+
+def _escrever(caminho, registros):
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        for momento, resultados in registros:
+            arquivo.write(formatar_registro_json(momento, resultados))
+
+
+def _conferir(destino, registros):
+    armazem = ArmazemAuditoria(destino)
+    intervalos = [(None, None)] + [
+        (interpretar_momento((INICIO + datetime.timedelta(minutes=a)).isoformat()),
+         interpretar_momento((INICIO + datetime.timedelta(minutes=b)).isoformat()))
+        for a, b in [(0, 5), (3, 47), (20, 21), (-10, 0), (60, 600)]]
+    for inicio, fim in intervalos:
+        for agrupar, tipo, busca in [('causa', None, None), ('risco', 'Alerta', None),
+                                     ('talhao', None, None), ('causa', None, 'ge')]:
+            resultado = armazem.consultar(inicio=inicio, fim=fim, agrupar=agrupar, tipo=tipo, busca=busca)
+            assert (resultado['registros'], resultado['grupos']) == _direto(registros, inicio, fim, agrupar, tipo, busca)
+
+
+def test_compactacao_incremental_igual_a_leitura_direta(tmp_path):
+    rng = random.Random(12)
+    origem = str(tmp_path / 'auditoria.json')
+    destino = str(tmp_path / 'colunar')
+    registros = []
+    for execucao in range(6):
+        novos = [_registro(rng, len(registros) + i) for i in range(rng.randint(0, 40))]
+        _escrever(origem, novos)
+        registros += novos
+        if execucao == 3:
+            os.replace(origem, str(tmp_path / 'auditoria.2026-10-11.1.json'))
+        compactar(origem, destino, linhas_por_bloco=8)
+        _conferir(destino, registros)
+
+
+def test_cada_execucao_grava_so_as_linhas_novas(tmp_path):
+    rng = random.Random(3)
+    origem = str(tmp_path / 'auditoria.json')
+    destino = str(tmp_path / 'colunar')
+    _escrever(origem, [_registro(rng, i) for i in range(50)])
+    compactar(origem, destino, linhas_por_bloco=8)
+    antes = ArmazemAuditoria(destino).manifesto['segmentos']
+
+    um_resultado = [(INICIO + datetime.timedelta(minutes=30 + i), [_resultado(rng)]) for i in range(4)]
+    _escrever(origem, um_resultado[:3])
+    resumo = compactar(origem, destino, linhas_por_bloco=8)
+    depois = ArmazemAuditoria(destino).manifesto['segmentos']
+    assert depois[:-1] == antes  # O segmento que já tinha blocos cheios não é regravado
+    assert depois[-1]['linhas'] == resumo['linhas_novas']
+
+    # Um último segmento menor que um bloco vai junto com as linhas seguintes
+    _escrever(origem, um_resultado[3:])
+    compactar(origem, destino, linhas_por_bloco=8)
+    final = ArmazemAuditoria(destino).manifesto['segmentos']
+    assert final[:-1] == antes and len(final) == len(depois)
+    assert sorted(os.listdir(destino)) == sorted(['compactacao.lock', 'manifesto.json']
+                                                 + [segmento['diretorio'] for segmento in final])
+
+
+def test_arquivo_truncado_e_lido_do_inicio(tmp_path):
+    rng = random.Random(8)
+    origem = str(tmp_path / 'auditoria.json')
+    destino = str(tmp_path / 'colunar')
+    registros = [_registro(rng, i) for i in range(30)]
+    _escrever(origem, registros)
+    compactar(origem, destino, linhas_por_bloco=8)
+
+    # Truncado no lugar (mesmo inode) e reescrito com menos bytes do que já tinham sido lidos
+    inode = os.stat(origem).st_ino
+    with open(origem, 'w', encoding='utf-8'):
+        pass
+    novos = [_registro(rng, 30 + i) for i in range(5)]
+    _escrever(origem, novos)
+    assert os.stat(origem).st_ino == inode
+    resumo = compactar(origem, destino, linhas_por_bloco=8)
+    assert resumo['linhas_novas'] > 0
+    _conferir(destino, registros + novos)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="sem fork")
+def test_compactacoes_simultaneas_nao_duplicam_linhas(tmp_path):
+    rng = random.Random(5)
+    origem = str(tmp_path / 'auditoria.json')
+    destino = str(tmp_path / 'colunar')
+    registros = [_registro(rng, i) for i in range(2000)]
+    _escrever(origem, registros)
+    pids = []
+    for _ in range(3):
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                compactar(origem, destino, linhas_por_bloco=64)
+            except BaseException:
+                codigo = 1
+            os._exit(codigo)
+        pids.append(pid)
+    for pid in pids:
+        assert os.WEXITSTATUS(os.waitpid(pid, 0)[1]) == 0
+    _conferir(destino, registros)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="sem fork")
+def test_compactacao_espera_a_trava(tmp_path):
+    import fcntl
+
+    rng = random.Random(8)
+    origem = str(tmp_path / 'auditoria.json')
+    destino = str(tmp_path / 'colunar')
+    registros = [_registro(rng, i) for i in range(20)]
+    _escrever(origem, registros)
+    os.makedirs(destino)
+    with open(os.path.join(destino, 'compactacao.lock'), 'a') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                trava.close()  # O descritor herdado seguraria a trava do pai
+                compactar(origem, destino, linhas_por_bloco=8)
+            except BaseException:
+                codigo = 1
+            os._exit(codigo)
+        time.sleep(0.5)
+        assert os.waitpid(pid, os.WNOHANG) == (0, 0)  # Parado na trava
+        assert not os.path.exists(os.path.join(destino, 'manifesto.json'))
+    assert os.WEXITSTATUS(os.waitpid(pid, 0)[1]) == 0
+    _conferir(destino, registros)
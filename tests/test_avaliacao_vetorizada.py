@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+O avaliador vetorizado tem que concordar com o motor experta nos limites
+das faixas. tests/dados/limites_sensores.csv cruza, dois a dois, os campos
+numéricos das regras de sensores com cada limite, 0.01 abaixo e 0.01
+acima, e alterna os campos categóricos para que toda regra possa disparar.
+"""
+
+import math
+import os
+
+from avaliacao_vetorizada import (AvaliadorVetorizado, TIPOS_CAMPOS, carregar_colunas,
+                                  conferir_com_motor)
+from faixas import INDICE_FAIXAS
+
+CAMINHO_LIMITES = os.path.join(os.path.dirname(__file__), 'dados', 'limites_sensores.csv')
+DELTA = 0.01
+
+
+def test_dados_cobrem_todos_os_limites():
+    colunas = carregar_colunas(CAMINHO_LIMITES)
+    for campo, tipo in TIPOS_CAMPOS.items():
+        if tipo is not float:
+            continue
+        valores = {round(v, 6) for v in colunas[campo].tolist() if not math.isnan(v)}
+        for ponto in INDICE_FAIXAS.campo(campo).pontos:
+            for valor in (ponto - DELTA, ponto, ponto + DELTA):
+                assert round(valor, 6) in valores, (campo, valor)
+
+
+def test_toda_regra_de_sensor_dispara_e_deixa_de_disparar():
+    avaliador = AvaliadorVetorizado()
+    disparos = avaliador.avaliar(carregar_colunas(CAMINHO_LIMITES))
+    for nome, linha in zip(avaliador.regras, disparos):
+        assert 0 < linha.sum() < len(linha), nome
+
+
+def test_vetorizado_igual_ao_motor_nos_limites():
+    assert conferir_com_motor(carregar_colunas(CAMINHO_LIMITES)) == []
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+A base compilada (regras/agricola.json) e o snapshot do motor disparam
+exatamente as regras que o arquivo descreve, inclusive em cima dos limites
+de cada faixa (`acima_de`/`abaixo_de`/`entre` são estritos). Um snapshot de
+outra versão da base é recusado. Os gatilhos dos benchmarks, tirados da
+base, disparam cada regra.
+"""
+
+import contextlib
+import io
+
+import pytest
+
+import base_regras
+from benchmarks.geradores import GATILHOS_POR_REGRA, fatos_todas_as_regras
+from metricas import MetricasMotor, RegistroMetricas
+from motor_diagnostico import CAMINHO_BASE_REGRAS, VERSAO_BASE_REGRAS, MotorDiagnosticoAgricola, diagnosticar_fatos
+
+BASE = base_regras.ler_base(CAMINHO_BASE_REGRAS)
+PASSOS = (-0.5, -1e-6, 0, 1e-6, 0.5)
+NOMES = {regra['nome'] for regra in BASE['regras']}  # O motor tem também regras internas
+
+
+# --- Referência: as regras avaliadas direto do arquivo, sem o experta ---
+
+def _casa(restricao, valor):
+    if not isinstance(restricao, dict):
+        return valor == restricao
+    (faixa, limite), = restricao.items()
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return False
+    if faixa == 'acima_de':
+        return valor > limite
+    if faixa == 'abaixo_de':
+        return valor < limite
+    return limite[0] < valor < limite[1]
+
+
+def _padrao_casa(padrao, fatos):
+    (tipo, campos), = padrao.items()
+    if tipo == 'ou':
+        return any(_padrao_casa(alternativa, fatos) for alternativa in campos)
+    return any(tipo_fato == tipo and all(campo in dados and _casa(restricao, dados[campo])
+                                         for campo, restricao in campos.items())
+               for tipo_fato, dados in fatos)
+
+
+def _regras_esperadas(fatos_json):
+    fatos = [(fato['tipo'], fato['dados']) for fato in fatos_json]
+    disparam = set()
+    mudou = True
+    while mudou:
+        mudou = False
+        for regra in BASE['regras']:
+            if regra['nome'] not in disparam and all(_padrao_casa(padrao, fatos) for padrao in regra['se']):
+                disparam.add(regra['nome'])
+                if 'declarar' in regra:
+                    fatos.extend(regra['declarar'].items())
+                mudou = True
+    return disparam
+
+
+# --- Casos: cada limite de faixa da base, um pouco abaixo, em cima e um pouco acima ---
+
+def _limites():
+    limites = set()
+
+    def percorrer(padrao):
+        (tipo, campos), = padrao.items()
+        if tipo == 'ou':
+            for alternativa in campos:
+                percorrer(alternativa)
+            return
+        for campo, valor in campos.items():
+            if isinstance(valor, dict):
+                (_, limite), = valor.items()
+                for extremo in (limite if isinstance(limite, list) else [limite]):
+                    limites.add((tipo, campo, extremo))
+
+    for regra in BASE['regras']:
+        for padrao in regra['se']:
+            percorrer(padrao)
+    return sorted(limites)
+
+
+def _casos():
+    todos = fatos_todas_as_regras()
+    for tipo, campo, limite in _limites():
+        # Todos os gatilhos da base, com o campo da faixa trocado por um único valor perto do limite
+        outros = [fato for fato in todos if not (fato['tipo'] == tipo and campo in fato['dados'])]
+        for passo in PASSOS:
+            yield outros + [{'tipo': tipo, 'dados': {campo: limite + passo}}]
+
+
+def _regras_disparadas(engine, fatos):
+    metricas = MetricasMotor(RegistroMetricas())
+    engine.metricas = metricas
+    engine.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        diagnosticar_fatos(engine, fatos)
+    return {regra for (regra,), disparos in metricas.disparos.estado().items() if disparos and regra in NOMES}
+
+
+@pytest.fixture(scope='module')
+def snapshot(tmp_path_factory):
+    caminho = str(tmp_path_factory.mktemp('snapshot') / 'agricola.snapshot')
+    base_regras.gravar_snapshot(MotorDiagnosticoAgricola(), caminho, VERSAO_BASE_REGRAS)
+    return base_regras.carregar_snapshot(caminho, VERSAO_BASE_REGRAS)
+
+
+def test_limites_das_faixas_iguais_a_base(snapshot):
+    assert len(_limites()) >= 15
+    motores = {'base': MotorDiagnosticoAgricola(), 'snapshot': snapshot.novo_motor()}
+    for fatos in _casos():
+        esperado = _regras_esperadas(fatos)
+        for origem, engine in motores.items():
+            assert _regras_disparadas(engine, fatos) == esperado, (origem, fatos[-1])
+
+
+def test_snapshot_de_outra_base_e_recusado(tmp_path):
+    caminho = str(tmp_path / 'antigo.snapshot')
+    base_regras.gravar_snapshot(MotorDiagnosticoAgricola(), caminho, 'outra-versao-da-base')
+    with pytest.raises(ValueError, match='desatualizado'):
+        base_regras.carregar_snapshot(caminho, VERSAO_BASE_REGRAS)
+
+
+def test_gatilhos_dos_benchmarks_disparam_cada_regra():
+    assert set(GATILHOS_POR_REGRA) == NOMES
+    engine = MotorDiagnosticoAgricola()
+    for nome, fatos in GATILHOS_POR_REGRA.items():
+        assert nome in _regras_esperadas(fatos)
+        assert nome in _regras_disparadas(engine, fatos)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de resultados: a chave não depende da ordem nem de fatos repetidos,
+muda com a versão da base de regras, e TTL e LRU contam nas estatísticas.
+"""
+
+import random
+import types
+
+import pytest
+
+import cache_resultados
+from benchmarks.geradores import fatos_aleatorios
+from cache_resultados import CacheResultados
+
+
+class _Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = _Relogio()
+    monkeypatch.setattr(cache_resultados, 'time', types.SimpleNamespace(monotonic=relogio.monotonic))
+    return relogio
+
+
+def test_chave_independe_da_ordem_e_de_repeticoes():
+    cache = CacheResultados()
+    rng = random.Random(5)
+    for _ in range(50):
+        fatos = fatos_aleatorios(rng)
+        embaralhados = fatos + [dict(fato) for fato in rng.sample(fatos, len(fatos) // 2)]
+        rng.shuffle(embaralhados)
+        assert cache.chave(embaralhados) == cache.chave(fatos)
+
+
+def test_chave_muda_com_os_fatos_e_ignora_tipos_nao_declarados():
+    cache = CacheResultados()
+    fatos = [{'tipo': 'Condicao', 'dados': {'temperatura_ar': 20}}]
+    assert cache.chave(fatos) != cache.chave([{'tipo': 'Condicao', 'dados': {'temperatura_ar': 21}}])
+    assert cache.chave(fatos) == cache.chave(fatos + [{'tipo': 'Diagnostico', 'dados': {'causa': 'x'}}])
+
+
+def test_outra_versao_da_base_nao_acerta():
+    fatos = [{'tipo': 'Sintoma', 'dados': {'observacao': 'po_branco_nas_folhas'}}]
+    cache = CacheResultados(versao_regras='versao-a')
+    cache.guardar(cache.chave(fatos), ['resultado'])
+    assert cache.obter(cache.chave(fatos)) == ['resultado']
+    cache.versao_regras = 'versao-b'
+    assert cache.obter(cache.chave(fatos)) is None
+
+
+def test_ttl_expira_e_conta(relogio):
+    cache = CacheResultados(ttl=10)
+    cache.guardar('a', ['a'])
+    relogio.agora += 9.9
+    assert cache.obter('a') == ['a']
+    relogio.agora += 0.1
+    assert cache.obter('a') is None
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['acertos'], estatisticas['faltas'], estatisticas['expiracoes']) == (1, 1, 1)
+    assert estatisticas['itens'] == 0
+
+
+def test_lru_remove_o_menos_usado_e_conta(relogio):
+    cache = CacheResultados(tamanho=2)
+    cache.guardar('a', ['a'])
+    cache.guardar('b', ['b'])
+    assert cache.obter('a') == ['a']  # 'b' passa a ser o menos usado
+    cache.guardar('c', ['c'])
+    assert cache.obter('b') is None
+    assert cache.obter('a') == ['a'] and cache.obter('c') == ['c']
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['remocoes'], estatisticas['expiracoes'], estatisticas['itens']) == (1, 0, 2)
+    assert (estatisticas['acertos'], estatisticas['faltas']) == (3, 1)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+As respostas montadas com os fragmentos do catálogo (`responder_resultados`)
+têm que ter os mesmos bytes que o `jsonify` da mesma lista, nos dois
+formatos (compacto e indentado).
+"""
+
+import random
+
+import pytest
+from flask import jsonify
+
+import app as modulo_app
+from benchmarks.geradores import CENARIOS
+from motor_diagnostico import CATALOGO, MotorDiagnosticoAgricola, ResultadosFormatados, diagnosticar_fatos
+
+# Todas as entradas do catálogo: resultados acumulados e diagnósticos declarados
+ENTRADAS = sorted(list(CATALOGO._por_regra.values()) + list(CATALOGO._por_diagnostico.values()),
+                  key=lambda entrada: entrada.chave)
+
+
+def _diagnosticos():
+    rng = random.Random(7)
+    engine = MotorDiagnosticoAgricola()
+    for nome, gerador in sorted(CENARIOS.items()):
+        for _ in range(5 if nome == 'realista' else 1):
+            engine.reset()
+            yield diagnosticar_fatos(engine, gerador(rng))
+
+
+def _conjuntos():
+    yield ResultadosFormatados(())
+    for entrada in ENTRADAS:
+        yield ResultadosFormatados((entrada,))
+    yield ResultadosFormatados(ENTRADAS)
+    yield ResultadosFormatados(ENTRADAS[::-1])
+    yield from _diagnosticos()
+
+
+@pytest.fixture(params=[True, False, None], ids=['compacto', 'indentado', 'padrao'])
+def formato(request):
+    provedor = modulo_app.app.json
+    anterior = provedor.compact
+    provedor.compact = request.param
+    yield
+    provedor.compact = anterior
+
+
+def test_catalogo_tem_todas_as_regras_com_resultado():
+    assert len(ENTRADAS) == len(CATALOGO) > 0
+
+
+def test_resposta_do_catalogo_igual_ao_jsonify(formato):
+    with modulo_app.app.test_request_context('/diagnosticar', method='POST'):
+        for resultados in _conjuntos():
+            resposta = modulo_app.responder_resultados(resultados)
+            esperado = jsonify(list(resultados))
+            assert resposta.status_code == 200
+            assert resposta.get_data() == esperado.get_data()
+            assert resposta.mimetype == esperado.mimetype
+
+
+def test_etag_devolve_304(formato):
+    resultados = ResultadosFormatados(ENTRADAS[:3])
+    with modulo_app.app.test_request_context('/diagnosticar', method='POST'):
+        etag = modulo_app.responder_resultados(resultados).get_etag()[0]
+    with modulo_app.app.test_request_context('/diagnosticar', method='POST',
+                                             headers={'If-None-Match': f'"{etag}"'}):
+        resposta = modulo_app.responder_resultados(resultados)
+        assert resposta.status_code == 304 and resposta.get_data() == b''
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+O motor declara só os fatos do `alcance`: o resultado tem que ser o mesmo
+de declarar todos, inclusive com regras encadeadas por Diagnostico. E o
+`proximas_perguntas` não pergunta de novo um campo de Condicao respondido.
+"""
+
+import contextlib
+import io
+import json
+import random
+
+import pytest
+
+from benchmarks.geradores import GATILHOS_POR_REGRA, fatos_aleatorios, fatos_encadeados
+from motor_diagnostico import (INDICE_DEPENDENCIAS, coletar_resultados_formatados, criar_motor, declarar_fatos,
+                               diagnosticar_fatos)
+
+CONJUNTOS = 300
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return criar_motor()
+
+
+def _conjunto(rng):
+    """Fatos aleatórios, às vezes com os gatilhos de algumas regras (e do encadeamento)."""
+    fatos = fatos_aleatorios(rng)
+    if rng.random() < 0.5:
+        for regra in rng.sample(sorted(GATILHOS_POR_REGRA), rng.randint(1, 4)):
+            fatos += GATILHOS_POR_REGRA[regra]
+    if rng.random() < 0.2:
+        fatos += fatos_encadeados()
+    rng.shuffle(fatos)
+    return fatos
+
+
+def _resultados(engine, fatos, podar):
+    engine.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if podar:
+            resultados = diagnosticar_fatos(engine, fatos)
+        else:
+            declarar_fatos(engine, fatos)
+            engine.run()
+            resultados = coletar_resultados_formatados(engine)
+    return sorted(json.dumps(r, sort_keys=True, ensure_ascii=False) for r in resultados)
+
+
+def test_alcance_nao_muda_o_resultado(engine):
+    rng = random.Random(11)
+    encadeados = 0
+    for _ in range(CONJUNTOS):
+        fatos = _conjunto(rng)
+        podado = _resultados(engine, fatos, podar=True)
+        assert podado == _resultados(engine, fatos, podar=False), fatos
+        encadeados += 'regra_corrigir_ph_para_Ca_Mg' in INDICE_DEPENDENCIAS.alcance(fatos).regras
+    assert encadeados  # A regra que depende de um Diagnostico declarado foi exercitada
+
+
+def _campos(perguntas, tipo):
+    return {p['campo'] for p in perguntas if p['tipo'] == tipo}
+
+
+def test_condicao_respondida_sai_das_perguntas():
+    perguntas, _, _ = INDICE_DEPENDENCIAS.proximas_perguntas([])
+    condicoes = _campos(perguntas, 'Condicao')
+    assert condicoes
+    for pergunta in perguntas:
+        if pergunta['tipo'] != 'Condicao':
+            continue
+        # Um valor que não casa com nenhum padrão: o campo está respondido mesmo assim
+        for valor in pergunta['valores'][:1] + ['valor_que_nenhuma_regra_usa']:
+            fatos = [{'tipo': 'Condicao', 'dados': {pergunta['campo']: valor}}]
+            seguintes, _, _ = INDICE_DEPENDENCIAS.proximas_perguntas(fatos)
+            assert pergunta['campo'] not in _campos(seguintes, 'Condicao')
+
+
+def test_fato_malformado_e_ignorado_nas_perguntas():
+    fatos = ['nao_e_um_fato', None, {'tipo': 'Condicao', 'dados': {'tipo_solo': 'arenoso'}}]
+    perguntas, _, _ = INDICE_DEPENDENCIAS.proximas_perguntas(fatos)
+    assert 'tipo_solo' not in _campos(perguntas, 'Condicao')
+    assert perguntas
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Lotes pequenos rodam na thread da requisição: requisições simultâneas
+têm que dar o mesmo resultado que um diagnóstico em motor novo.
+"""
+
+import contextlib
+import io
+import random
+import threading
+
+from benchmarks.geradores import CENARIOS, fatos_aleatorios
+from motor_diagnostico import DiagnosticoLote, criar_motor, diagnosticar_fatos
+
+THREADS = 6
+LOTES_POR_THREAD = 15
+
+
+def _esperado(fatos):
+    return list(diagnosticar_fatos(criar_motor(), fatos))
+
+
+def test_lotes_pequenos_simultaneos_iguais_a_motores_novos():
+    rng = random.Random(3)
+    cenarios = [CENARIOS['todas_as_regras'](), CENARIOS['encadeado']()]
+    lotes = [[{'talhao': i, 'fatos': rng.choice(cenarios) if rng.random() < 0.3 else fatos_aleatorios(rng)}
+              for i in range(rng.randint(1, 4))]
+             for _ in range(THREADS * LOTES_POR_THREAD)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        esperados = [{t['talhao']: _esperado(t['fatos']) for t in lote} for lote in lotes]
+
+    lote = DiagnosticoLote(processos=4)  # Todos abaixo de minimo_para_paralelizar: nenhum processo
+    barreira = threading.Barrier(THREADS)
+    obtidos = [None] * len(lotes)
+
+    def rodar(inicio):
+        barreira.wait()
+        for i in range(inicio, len(lotes), THREADS):
+            obtidos[i] = {talhao: list(r) for talhao, r in lote.diagnosticar(lotes[i]).items()}
+
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(THREADS)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert lote._executor is None
+    assert obtidos == esperados
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+O índice de intervalos (busca binária nos pontos de corte + memória por
+valor) tem que dar o mesmo resultado que a comparação direta de cada
+faixa, inclusive exatamente nos limites.
+"""
+
+import math
+
+from faixas import INDICE_FAIXAS, IndiceFaixas, Intervalo, abaixo_de, acima_de, entre
+
+# Faixas sobrepostas, encostadas e com pontos compartilhados (como nas regras)
+FAIXAS_TESTE = {
+    'temperatura': [abaixo_de(3), entre(5, 12), entre(12, 15), entre(15, 25), acima_de(30), acima_de(35),
+                    acima_de(38), abaixo_de(15)],
+    'umidade': [acima_de(80), acima_de(85)],
+    'ph': [abaixo_de(5.5), acima_de(7.5), entre(5.5, 7.5)],
+    'vento': [acima_de(60)],
+    'fechadas': [Intervalo(10, 20, inclui_minimo=True), Intervalo(20, 30, inclui_maximo=True),
+                 Intervalo(10, 30, True, True), Intervalo(maximo=10, inclui_maximo=True)],
+}
+
+
+def _direto(intervalo, valor):
+    """A comparação que as regras escreviam à mão (`a < x < b`, `x > a`...); lado infinito não compara."""
+    acima = (intervalo.minimo == -math.inf
+             or (valor >= intervalo.minimo if intervalo.inclui_minimo else valor > intervalo.minimo))
+    abaixo = (intervalo.maximo == math.inf
+              or (valor <= intervalo.maximo if intervalo.inclui_maximo else valor < intervalo.maximo))
+    return acima and abaixo
+
+
+def _valores_de_teste(pontos):
+    valores = [-math.inf, math.inf, math.nan, 0, -1e9, 1e9]
+    for ponto in pontos:
+        valores += [ponto, float(ponto), ponto - 0.01, ponto + 0.01,
+                    math.nextafter(ponto, -math.inf), math.nextafter(ponto, math.inf)]
+        if float(ponto).is_integer():
+            valores.append(int(ponto))
+    return valores
+
+
+def _conferir(indice, campo, intervalos):
+    testes = [indice.teste(campo, intervalo) for intervalo in intervalos]
+    for valor in _valores_de_teste(indice.campo(campo).pontos):
+        for _ in range(2):  # A segunda volta passa pela memória do campo
+            for intervalo, teste in zip(intervalos, testes):
+                assert teste(valor) == _direto(intervalo, valor), (campo, intervalo, valor)
+
+
+def test_faixas_iguais_a_comparacao_direta_nos_limites():
+    indice = IndiceFaixas()
+    for campo, intervalos in FAIXAS_TESTE.items():
+        for intervalo in intervalos:
+            indice.teste(campo, intervalo)
+    indice.compilar()
+    for campo, intervalos in FAIXAS_TESTE.items():
+        _conferir(indice, campo, intervalos)
+
+
+def test_faixas_das_regras_iguais_a_comparacao_direta():
+    import motor_diagnostico  # noqa: F401  (registra as faixas das regras no índice global)
+
+    for campo in INDICE_FAIXAS.campos():
+        _conferir(INDICE_FAIXAS, campo, INDICE_FAIXAS.campo(campo).intervalos)
+
+
+def test_faixa_igual_no_mesmo_campo_e_o_mesmo_teste():
+    indice = IndiceFaixas()
+    assert indice.teste('t', entre(1, 2)) is indice.teste('t', entre(1, 2))
+    assert indice.teste('t', entre(1, 2)) is not indice.teste('u', entre(1, 2))
+
+
+def test_registrar_faixa_nova_recompila_o_indice():
+    indice = IndiceFaixas()
+    menor = indice.teste('t', abaixo_de(10))
+    assert menor(5) and not menor(10)
+    maior = indice.teste('t', acima_de(20))  # Depois de já ter usado o índice
+    assert maior(21) and not maior(20) and menor(5)
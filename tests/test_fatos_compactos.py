@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from experta import Fact
+
+from fatos_compactos import FatoCompacto, Vocabulario
+from motor_diagnostico import Condicao, Sintoma
+
+
+def test_fato_compacto_nao_guarda_nada_no_dict_da_instancia():
+    fato = Sintoma(local='folhas_velhas', cor='amarelada_uniforme')
+    hash(fato)
+    # O Fact não usa __slots__: o __dict__ existe, mas fica vazio (nem __defaults nem o hash)
+    assert vars(fato) == {}
+    assert '_Fact__defaults' in vars(Fact(local='folhas_velhas'))
+
+
+def test_fato_compacto_casa_como_fact():
+    class Comum(Fact):
+        pass
+
+    compacto = Condicao(temperatura_ar=20, previsao_tempo='geada_iminente')
+    comum = Comum(temperatura_ar=20, previsao_tempo='geada_iminente')
+    assert dict(compacto) == dict(comum)
+    assert hash(compacto) == hash(comum)
+    assert compacto.copy() == compacto and type(compacto.copy()) is Condicao
+
+
+def test_fato_compacto_recusa_fields():
+    from experta import Field
+    try:
+        class ComField(FatoCompacto):
+            local = Field(str, default='folhas_velhas')
+    except TypeError:
+        return
+    raise AssertionError("FatoCompacto aceitou Fields declarados")
+
+
+def test_vocabulario_compartilha_as_strings_da_base():
+    padrao = {'local': 'folhas_velhas'}
+    vocabulario = Vocabulario.da_base({'regras': [{'se': [{'Sintoma': padrao}]}]})
+    (chave_base, valor_base), = padrao.items()
+    recebido = {''.join(['lo', 'cal']): ''.join(['folhas_', 'velhas']), 'outro': 1}
+    (chave, valor), outro = vocabulario.compactar(recebido).items()
+    assert chave is chave_base and valor is valor_base
+    assert outro == ('outro', 1)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Formato do /metrics (buckets `le` acumulados, contadores por regra, sem o
+aquecimento dos workers) e métricas de vários workers: o /metrics de
+qualquer um deles é igual ao de um processo só que tivesse recebido todas
+as observações, inclusive as dos workers que já saíram.
+"""
+
+import contextlib
+import io
+import os
+import random
+import types
+from functools import partial
+
+import pytest
+
+import servidor
+from metricas import LIMITES_SEGUNDOS, MetricasMotor, MetricasWorkers, RegistroMetricas
+from motor_diagnostico import criar_motor, diagnosticar_fatos
+from pool_motores import PoolMotores
+
+PROCESSOS = 3
+FATOS_OIDIO = [{'tipo': 'Sintoma', 'dados': {'observacao': 'po_branco_nas_folhas'}}]
+
+
+def _series(texto):
+    """{nome com rótulos: valor} das linhas de amostra do texto do /metrics."""
+    series = {}
+    for linha in texto.splitlines():
+        if linha and not linha.startswith('#'):
+            nome, valor = linha.rsplit(' ', 1)
+            series[nome] = float(valor)
+    return series
+
+
+def test_buckets_do_histograma_sao_acumulados():
+    registro = RegistroMetricas()
+    histograma = registro.histograma('teste_segundos', 'Duração.', rotulos=('rota',))
+    rng = random.Random(1)
+    valores = [rng.uniform(0, 3) for _ in range(200)] + list(LIMITES_SEGUNDOS)  # Inclusive em cima dos limites
+    for valor in valores:
+        histograma.observar(valor, '/x')
+
+    series = _series(registro.exportar())
+    anterior = 0
+    for limite in LIMITES_SEGUNDOS:
+        contagem = series[f'teste_segundos_bucket{{rota="/x",le="{float(limite)!r}"}}']
+        assert contagem == sum(valor <= limite for valor in valores)  # le: menor ou igual
+        assert contagem >= anterior
+        anterior = contagem
+    assert series['teste_segundos_bucket{rota="/x",le="+Inf"}'] == len(valores)
+    assert series['teste_segundos_count{rota="/x"}'] == len(valores)
+    assert series['teste_segundos_sum{rota="/x"}'] == pytest.approx(sum(valores))
+
+
+def test_disparos_por_regra_e_aquecimento_fora_das_metricas():
+    registro = RegistroMetricas()
+    metricas = MetricasMotor(registro)
+    pool = PoolMotores(tamanho=2, fabrica=partial(criar_motor, metricas=metricas))
+
+    servidor.aquecer(types.SimpleNamespace(pool_motores=pool))
+    series = _series(registro.exportar())
+    assert not any(nome.startswith(('diagnostico_regra_', 'diagnostico_motor_run_segundos')) for nome in series)
+
+    with pool.motor() as engine, contextlib.redirect_stdout(io.StringIO()):
+        diagnosticar_fatos(engine, FATOS_OIDIO)
+    series = _series(registro.exportar())
+    assert series['diagnostico_regra_disparos_total{regra="regra_oidio"}'] == 1
+    assert series['diagnostico_regra_tempo_segundos_total{regra="regra_oidio"}'] > 0
+    assert series['diagnostico_motor_run_segundos_count'] == 1
+    assert series['diagnostico_fatos_declarados_count'] == 1
+
+
+def _registro():
+    registro = RegistroMetricas()
+    contador = registro.contador('teste_disparos_total', 'Disparos.', ('regra',))
+    histograma = registro.histograma('teste_run_segundos', 'Duração.')
+    return registro, contador, histograma
+
+
+def _observar(contador, histograma, semente):
+    rng = random.Random(semente)
+    for _ in range(50):
+        contador.incrementar(1, rng.choice(['a', 'b', 'c']))
+        histograma.observar(rng.uniform(0, 0.2))
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="sem fork")
+def test_workers_somados_no_metrics(tmp_path):
+    registro, contador, histograma = _registro()
+    metricas = MetricasWorkers(str(tmp_path), registro)
+
+    pids = []
+    for semente in range(PROCESSOS):
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                metricas.arquivo = os.path.join(metricas.diretorio, f"{os.getpid()}-0.json")
+                _observar(contador, histograma, semente)
+                metricas.gravar()
+            except BaseException:
+                codigo = 1
+            finally:
+                os._exit(codigo)
+        pids.append(pid)
+    for pid in pids:
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+
+    # Dois saíram (o mestre junta os arquivos deles); o outro continua com o seu arquivo
+    for pid in pids[:2]:
+        metricas.juntar_encerrado(pid)
+    assert len(os.listdir(str(tmp_path))) == 2
+    _observar(contador, histograma, PROCESSOS)  # O worker que responde
+
+    esperado, contador_esperado, histograma_esperado = _registro()
+    for semente in range(PROCESSOS + 1):
+        _observar(contador_esperado, histograma_esperado, semente)
+    assert _sem_soma(metricas.exportar()) == _sem_soma(esperado.exportar())
+
+
+def _sem_soma(texto):
+    """Linhas do texto, com as somas de ponto flutuante arredondadas (a ordem da soma muda o último dígito)."""
+    linhas = []
+    for linha in texto.splitlines():
+        if '_sum' in linha:
+            nome, valor = linha.rsplit(' ', 1)
+            linha = f"{nome} {float(valor):.9f}"
+        linhas.append(linha)
+    return linhas
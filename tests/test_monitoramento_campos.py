@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+O motor incremental de cada campo tem que concluir o mesmo que um
+diagnóstico completo dos fatos atuais, depois de qualquer sequência de
+trocas e retiradas, e um campo restaurado de `estado()` tem que seguir
+igual ao campo original (inclusive depois de vários ciclos de gravação).
+"""
+
+import contextlib
+import io
+import pickle
+import random
+
+import pytest
+
+from benchmarks.geradores import fatos_aleatorios
+from monitoramento_campos import MonitoramentoCampos, MotorCampo, _chave_resultado
+from motor_diagnostico import MotorDiagnosticoAgricola, diagnosticar_fatos
+
+SEMENTES = range(6)
+
+
+@pytest.fixture(scope='module')
+def referencia():
+    return MotorDiagnosticoAgricola()
+
+
+def _esperado(engine, fatos):
+    """Conclusões de um diagnóstico completo (motor limpo) dos fatos atuais do campo."""
+    engine.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {_chave_resultado(r) for r in diagnosticar_fatos(engine, list(fatos.values()))}
+
+
+def _atualizacao(rng, atuais):
+    """Fatos novos (alguns trocando o valor de um fato atual) e fatos a retirar."""
+    fatos = fatos_aleatorios(rng)
+    remover = []
+    for chave in list(atuais):
+        if rng.random() < 0.3:
+            remover.append({'tipo': chave[0], 'campos': sorted(chave[1])})
+    return fatos, remover
+
+
+def _aplicar(atuais, fatos, remover):
+    """O que o campo deve conter depois da atualização (retiradas primeiro, depois as trocas)."""
+    for item in remover:
+        atuais.pop((item['tipo'], frozenset(item['campos'])), None)
+    for fato in fatos:
+        atuais[(fato['tipo'], frozenset(fato['dados']))] = fato
+
+
+def _restaurado(campo):
+    return MotorCampo.restaurar(pickle.loads(pickle.dumps(campo.estado(), protocol=pickle.HIGHEST_PROTOCOL)))
+
+
+@pytest.mark.parametrize('semente', SEMENTES)
+def test_atualizacoes_aleatorias_iguais_ao_diagnostico_completo(semente, referencia):
+    rng = random.Random(semente)
+    campo = MotorCampo()
+    atuais = {}
+    for _ in range(25):
+        fatos, remover = _atualizacao(rng, atuais)
+        anteriores = set(campo.conclusoes)
+        novos, removidos = campo.atualizar(fatos, remover)
+        _aplicar(atuais, fatos, remover)
+
+        esperado = _esperado(referencia, atuais)
+        assert set(campo.conclusoes) == esperado
+        assert {_chave_resultado(r) for r in novos} == esperado - anteriores
+        assert {_chave_resultado(r) for r in removidos} == anteriores - esperado
+
+
+@pytest.mark.parametrize('semente', SEMENTES)
+def test_campo_restaurado_igual_ao_reproduzido(semente, referencia):
+    rng = random.Random(100 + semente)
+    original = MotorCampo()
+    atuais = {}
+    for _ in range(rng.randint(1, 5)):
+        fatos, remover = _atualizacao(rng, atuais)
+        original.atualizar(fatos, remover)
+        _aplicar(atuais, fatos, remover)
+
+    restaurado = _restaurado(original)
+    assert restaurado.conclusoes.keys() == original.conclusoes.keys()
+    for ciclo in range(8):
+        fatos, remover = _atualizacao(rng, atuais)
+        delta_original = original.atualizar(fatos, remover)
+        delta_restaurado = restaurado.atualizar(fatos, remover)
+        _aplicar(atuais, fatos, remover)
+
+        assert [sorted(map(_chave_resultado, lado)) for lado in delta_restaurado] == \
+               [sorted(map(_chave_resultado, lado)) for lado in delta_original]
+        assert set(restaurado.conclusoes) == set(original.conclusoes) == _esperado(referencia, atuais)
+        assert len(restaurado.engine.facts) == len(original.engine.facts)
+        if ciclo % 2:
+            restaurado = _restaurado(restaurado)  # Gravar e restaurar de novo no meio da sequência
+
+
+def test_snapshot_em_arquivo_restaura_os_campos(tmp_path, referencia):
+    rng = random.Random(7)
+    original = MonitoramentoCampos()
+    atuais = {}
+    for campo_id in ('norte', 'sul', 'leste'):
+        atuais[campo_id] = {}
+        for _ in range(3):
+            fatos, remover = _atualizacao(rng, atuais[campo_id])
+            original.atualizar(campo_id, fatos, remover)
+            _aplicar(atuais[campo_id], fatos, remover)
+
+    caminho = str(tmp_path / 'campos.bin')
+    assert original.gravar_snapshot(caminho)['campos'] == 3
+    restaurado = MonitoramentoCampos()
+    assert restaurado.carregar_snapshot(caminho) == 3
+
+    for campo_id in ('norte', 'sul', 'leste'):
+        fatos, remover = _atualizacao(rng, atuais[campo_id])
+        delta_original = original.atualizar(campo_id, fatos, remover)
+        delta_restaurado = restaurado.atualizar(campo_id, fatos, remover)
+        _aplicar(atuais[campo_id], fatos, remover)
+        for chave in ('novos', 'removidos'):
+            assert sorted(map(_chave_resultado, delta_restaurado[chave])) == \
+                   sorted(map(_chave_resultado, delta_original[chave]))
+        assert set(restaurado._campos[campo_id].conclusoes) == _esperado(referencia, atuais[campo_id])
+    assert restaurado.estatisticas()['campos_pendentes'] == 0
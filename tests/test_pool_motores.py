@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de motores: fila de espera limitada (503 em vez de fila crescendo),
+troca de motores que não resetam, e o orçamento do motor: resultados
+interrompidos vão com X-Diagnostico-Interrompido e não entram no cache.
+"""
+
+import threading
+import time
+
+import pytest
+
+import app as aplicacao
+from benchmarks.geradores import fatos_todas_as_regras
+from motor_diagnostico import MotorDiagnosticoAgricola
+from pool_motores import PoolMotores, PoolOcupado
+
+
+class _Motor:
+    """Motor falso: só o reset importa para o pool."""
+
+    def __init__(self):
+        self.falhar = False
+
+    def reset(self):
+        if self.falhar:
+            raise RuntimeError("motor inconsistente")
+
+
+def _esperar(condicao, timeout=5):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+
+def test_fila_de_espera_cheia_recusa_na_hora():
+    pool = PoolMotores(tamanho=1, fabrica=_Motor, max_espera=1, tempo_espera=10)
+    engine = pool.retirar()
+    obtidos = []
+    esperando = threading.Thread(target=lambda: obtidos.append(pool.retirar()))
+    esperando.start()
+    _esperar(lambda: pool.estatisticas()['aguardando'] == 1)
+
+    inicio = time.monotonic()
+    with pytest.raises(PoolOcupado):
+        pool.retirar()
+    assert time.monotonic() - inicio < 1  # Não esperou o tempo_espera
+
+    pool.devolver(engine)
+    esperando.join(timeout=5)
+    assert obtidos == [engine]
+    estatisticas = pool.estatisticas()
+    assert (estatisticas['recusadas'], estatisticas['esperas'], estatisticas['aguardando']) == (1, 1, 0)
+
+
+def test_tempo_de_espera_esgotado():
+    pool = PoolMotores(tamanho=1, fabrica=_Motor, max_espera=4, tempo_espera=0.1)
+    pool.retirar()
+    inicio = time.monotonic()
+    with pytest.raises(PoolOcupado):
+        pool.retirar()
+    assert 0.1 <= time.monotonic() - inicio < 2
+    assert pool.estatisticas()['recusadas'] == 1
+    assert pool.estatisticas()['aguardando'] == 0
+
+
+def test_motor_que_nao_reseta_e_trocado():
+    pool = PoolMotores(tamanho=1, fabrica=_Motor)
+    engine = pool.retirar()
+    engine.falhar = True
+    pool.devolver(engine)
+    novo = pool.retirar()
+    assert novo is not engine
+    assert not novo.falhar
+
+
+# --- Pelo app: 503 com o pool ocupado e o orçamento do motor ---
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(aplicacao.auditoria, 'registrar', lambda resultados: None)
+    aplicacao.cache_resultados.limpar()
+    return aplicacao.app.test_client()
+
+
+def test_pool_ocupado_responde_503(cliente, monkeypatch):
+    pool = PoolMotores(tamanho=1, max_espera=0)
+    monkeypatch.setattr(aplicacao, 'pool_motores', pool)
+    pool.retirar()
+    resposta = cliente.post('/diagnosticar', json=[{'tipo': 'Condicao', 'dados': {'temperatura_ar': 123.4}}])
+    assert resposta.status_code == 503
+    assert resposta.headers['Retry-After'] == '1'
+
+
+@pytest.mark.parametrize('atributo, valor, motivo', [('limite_ciclos', 2, 'ciclos'),
+                                                     ('limite_tempo', 1e-9, 'tempo')])
+def test_resultado_interrompido_avisa_e_nao_entra_no_cache(cliente, monkeypatch, atributo, valor, motivo):
+    fatos = fatos_todas_as_regras()
+    completo = cliente.post('/diagnosticar', json=fatos)
+    assert 'X-Diagnostico-Interrompido' not in completo.headers
+
+    monkeypatch.setattr(MotorDiagnosticoAgricola, atributo, valor)
+    fatos_novos = fatos + [{'tipo': 'Condicao', 'dados': {'umidade_ar': 12.3}}]  # Fora do cache
+    chave = aplicacao.cache_resultados.chave(fatos_novos)
+    for _ in range(2):
+        resposta = cliente.post('/diagnosticar', json=fatos_novos)
+        assert resposta.status_code == 200
+        assert resposta.headers['X-Diagnostico-Interrompido'] == motivo
+        assert len(resposta.get_json()) < len(completo.get_json())
+        assert aplicacao.cache_resultados.obter(chave) is None
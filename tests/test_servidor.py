@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+O mestre espera o aquecimento dos workers com prazo: um worker que trava
+não segura a partida e é morto quando o prazo acaba. O estado dos campos
+é carregado e gravado só pelos workers e sobrevive a reinícios. O
+/metrics e o /estatisticas de qualquer worker somam os de todos.
+"""
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import servidor
+from arquivo_campos import ArquivoCampos
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="sem fork")
+
+
+def _pronto(aplicacao, sock, args, aviso_pronto=None):
+    os.write(aviso_pronto, b'1')
+    time.sleep(60)
+    os._exit(0)
+
+
+def _travado(aplicacao, sock, args, aviso_pronto=None):
+    time.sleep(60)  # Aquecimento que nunca termina
+    os._exit(0)
+
+
+def _falha(aplicacao, sock, args, aviso_pronto=None):
+    os._exit(1)  # Sai no aquecimento sem avisar
+
+
+def _iniciar(monkeypatch, servir, quantidade=1, timeout=1):
+    monkeypatch.setattr(servidor, '_servir', servir)
+    mestre = servidor.Mestre(None, None, None)
+    inicio = time.monotonic()
+    prontos = mestre._iniciar_workers(quantidade, timeout=timeout)
+    return mestre, prontos, time.monotonic() - inicio
+
+
+def _status(pid):
+    _, status = os.waitpid(pid, 0)
+    return status
+
+
+def test_worker_pronto_e_contado(monkeypatch):
+    mestre, prontos, _ = _iniciar(monkeypatch, _pronto, quantidade=2)
+    try:
+        assert prontos == 2
+    finally:
+        for pid in mestre.workers:
+            os.kill(pid, signal.SIGKILL)
+            _status(pid)
+
+
+def test_worker_travado_no_aquecimento_e_morto_no_prazo(monkeypatch):
+    mestre, prontos, duracao = _iniciar(monkeypatch, _travado, timeout=0.5)
+    assert prontos == 0
+    assert duracao < 5
+    pid, = mestre.workers
+    status = _status(pid)
+    assert os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL
+
+
+def test_worker_que_sai_no_aquecimento_nao_espera_o_prazo(monkeypatch):
+    mestre, prontos, duracao = _iniciar(monkeypatch, _falha, timeout=30)
+    assert prontos == 0
+    assert duracao < 5
+    pid, = mestre.workers
+    assert os.WEXITSTATUS(_status(pid)) == 1
+
+
+# --- Estado dos campos entre reinícios do servidor.py ---
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FATOS_CAMPO = [{'tipo': 'Sintoma', 'dados': {'observacao': 'po_branco_nas_folhas'}}]
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _requisitar(porta, metodo, caminho, corpo=None, tentativas=1):
+    dados = None if corpo is None else json.dumps(corpo).encode()
+    pedido = urllib.request.Request(f"http://127.0.0.1:{porta}{caminho}", data=dados, method=metodo,
+                                    headers={'Content-Type': 'application/json'})
+    for tentativa in range(tentativas):
+        try:
+            with urllib.request.urlopen(pedido, timeout=30) as resposta:
+                return json.loads(resposta.read())
+        except (ConnectionError, urllib.error.URLError):
+            if tentativa == tentativas - 1:
+                raise
+            time.sleep(0.2)
+
+
+class _Servidor:
+    """servidor.py num subprocesso, com ARQUIVO_ESTADO_CAMPOS num diretório temporário."""
+
+    def __init__(self, tmp_path, workers=1, **ambiente):
+        self.porta = _porta_livre()
+        self.workers = workers
+        self.arquivo = str(tmp_path / 'campos.bin')
+        self.ambiente = dict(os.environ, ARQUIVO_ESTADO_CAMPOS=self.arquivo, TAMANHO_POOL_MOTORES='1', **ambiente)
+        self.processo = None
+
+    def iniciar(self):
+        self.processo = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, 'servidor.py'), '--workers', str(self.workers), '--host', '127.0.0.1',
+             '--porta', str(self.porta), '--silencioso'],
+            cwd=RAIZ, env=self.ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _requisitar(self.porta, 'GET', '/estatisticas', tentativas=300)
+
+    def encerrar(self):
+        self.processo.send_signal(signal.SIGTERM)
+        assert self.processo.wait(timeout=60) == 0
+
+    def campos_gravados(self):
+        if not os.path.exists(self.arquivo):
+            return []
+        return sorted(ArquivoCampos(self.arquivo).campos())
+
+    def campo(self, campo_id, **atualizacao):
+        return _requisitar(self.porta, 'POST', f'/campos/{campo_id}', atualizacao, tentativas=300)
+
+
+def test_estado_dos_campos_sobrevive_a_reinicios(tmp_path):
+    servidor_teste = _Servidor(tmp_path)
+    servidor_teste.iniciar()
+    try:
+        assert servidor_teste.campo('A', fatos=FATOS_CAMPO)['novos']
+
+        # Reinício gracioso: o worker antigo grava ao sair e só então o novo carrega o arquivo
+        servidor_teste.processo.send_signal(signal.SIGHUP)
+        limite = time.monotonic() + 60
+        while servidor_teste.campos_gravados() != ['A']:
+            assert time.monotonic() < limite
+            time.sleep(0.1)
+        assert servidor_teste.campo('B', fatos=FATOS_CAMPO)['novos']
+        estatisticas = _requisitar(servidor_teste.porta, 'GET', '/estatisticas')['monitoramento_campos']
+        assert estatisticas['campos_pendentes'] == 1  # A, vindo do arquivo
+    finally:
+        servidor_teste.encerrar()
+
+    # Quem grava na saída é o worker; o mestre (sem campos) não sobrescreve o arquivo
+    assert servidor_teste.campos_gravados() == ['A', 'B']
+
+    servidor_teste.iniciar()
+    try:
+        for campo_id in ('A', 'B'):
+            # Retirar o sintoma tira a conclusão que ele sustentava: só acontece se o campo voltou
+            delta = servidor_teste.campo(campo_id, remover=[{'tipo': 'Sintoma', 'campos': ['observacao']}])
+            assert delta['removidos']
+    finally:
+        servidor_teste.encerrar()
+
+
+def _contagem_diagnosticos(texto):
+    """Requisições ao /diagnosticar no histograma de latência do /metrics."""
+    return sum(int(linha.rsplit(' ', 1)[1]) for linha in texto.splitlines()
+               if linha.startswith('http_requisicao_segundos_count{rota="/diagnosticar"'))
+
+
+def _metrics(porta):
+    with urllib.request.urlopen(f"http://127.0.0.1:{porta}/metrics", timeout=30) as resposta:
+        return resposta.read().decode()
+
+
+def test_metricas_somadas_entre_os_workers(tmp_path):
+    servidor_teste = _Servidor(tmp_path, workers=2, INTERVALO_METRICAS='0.1')
+    servidor_teste.iniciar()
+    try:
+        requisicoes = 40
+        for i in range(requisicoes):
+            # Conexões novas a cada requisição: o kernel as distribui entre os dois workers
+            _requisitar(servidor_teste.porta, 'POST', '/diagnosticar',
+                        [{'tipo': 'Condicao', 'dados': {'temperatura_ar': i}}])
+        limite = time.monotonic() + 30
+        while _contagem_diagnosticos(_metrics(servidor_teste.porta)) != requisicoes:
+            assert time.monotonic() < limite
+            time.sleep(0.1)
+
+        estatisticas = _requisitar(servidor_teste.porta, 'GET', '/estatisticas')
+        assert len(estatisticas['workers']) == 2
+        cache = estatisticas['cache_resultados']
+        assert cache['faltas'] == sum(w['cache_resultados']['faltas'] for w in estatisticas['workers'].values())
+        assert estatisticas['pool_motores']['tamanho'] == 2  # Um motor por worker
+
+        # Os contadores de um worker que sai continuam na soma (o mestre junta o arquivo dele)
+        servidor_teste.processo.send_signal(signal.SIGHUP)
+        limite = time.monotonic() + 60
+        while set(_requisitar(servidor_teste.porta, 'GET', '/estatisticas', tentativas=300)['workers']) \
+                & set(estatisticas['workers']):
+            assert time.monotonic() < limite
+            time.sleep(0.2)
+        assert _contagem_diagnosticos(_metrics(servidor_teste.porta)) == requisicoes
+    finally:
+        servidor_teste.encerrar()